@@ -1,44 +1,462 @@
 from __future__ import annotations
+import asyncio
 import contextlib
-from typing import Generator, Optional
+import itertools
+import logging
+import re
+import uuid
+from typing import AsyncGenerator, Callable, Dict, Generator, Optional, Sequence
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, make_url, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session, DeclarativeBase
 
-from ..utils.config import PG_HOST, PG_PORT, PG_USER, PG_PASSWORD, PG_DBNAME
+from ..utils.config import (
+    PG_HOST, PG_PORT, PG_USER, PG_PASSWORD, PG_DBNAME,
+    VECTOR_INDEX, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, HNSW_ITERATIVE_SCAN,
+    IVFFLAT_LISTS, IVFFLAT_PROBES, EMBED_STORAGE, EMBED_PCA_FILE, FILTER_VECTOR_INDEXES,
+    RATING_PRIOR_MEAN, RATING_PRIOR_WEIGHT,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT_SECONDS, DB_POOL_RECYCLE_SECONDS,
+    DB_PRE_PING, DB_PRE_PING_IDLE_SECONDS, DB_STATEMENT_TIMEOUT_MS, DB_TRANSACTION_POOLER,
+    DB_REPLICA_URLS, DB_REPLICA_MAX_LAG_SECONDS, DB_REPLICA_CHECK_SECONDS,
+)
+from .pool import TimedAsyncQueuePool, TimedQueuePool, install_idle_ping, install_local_statement_timeout
+from ..utils.embedder import STORE_DIM
+
+logger = logging.getLogger(__name__)
 
 
 if not all([PG_HOST, PG_PORT, PG_USER, PG_PASSWORD, PG_DBNAME]):
     raise RuntimeError("PostgreSQL env vars are not fully set")
 
 DATABASE_URL = f"postgresql+psycopg2://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DBNAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DBNAME}"
+
+VECTOR_INDEX_NAME = "senior_abilities_embedding_idx"
+FILTER_INDEX_NAME = "senior_abilities_filters_idx"
+LEXICAL_INDEX_NAME = "senior_abilities_search_text_trgm_idx"
+
+def embedding_sql_type() -> str:
+    """ชนิด SQL ของ senior_abilities.embedding ตาม config เช่น vector(384), halfvec(256)"""
+    if EMBED_STORAGE not in ("vector", "halfvec"):
+        raise RuntimeError(f"Unknown EMBED_STORAGE: {EMBED_STORAGE}")
+    return f"{EMBED_STORAGE}({STORE_DIM})"
 
 class Base(DeclarativeBase):
     pass
 
+def _register_vector(dbapi_connection, connection_record) -> None:
+    # ให้ asyncpg รู้จักชนิด vector/halfvec ของ pgvector (extension ต้องถูกสร้างแล้ว: init_extensions ใช้ engine แบบ sync)
+    from pgvector.asyncpg import register_vector
+    dbapi_connection.run_async(register_vector)
+
 class DB:
     """
     จัดการ Engine/Session + ensure pgvector
     ใช้เป็น dependency และใน startup event
+    engine แบบ sync (psycopg2) ใช้กับ DDL/script/handler แบบเดิม; async_engine (asyncpg) ใช้กับ route ที่ไม่ควร block event loop
     """
-    def __init__(self, database_url: Optional[str] = None) -> None:
+    # hnsw.iterative_scan ที่ใช้จริง (init_extensions ปิดเมื่อ pgvector < 0.8)
+    iterative_scan: str = HNSW_ITERATIVE_SCAN
+
+    def __init__(self, database_url: Optional[str] = None, async_database_url: Optional[str] = None,
+                 replica_urls: Optional[Sequence[str]] = None) -> None:
         self.database_url = database_url or DATABASE_URL
-        self.engine = create_engine(self.database_url, pool_pre_ping=True, future=True)
-        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False, class_=Session, future=True)
+        self.engine, self.SessionLocal = self._make_engine(self.database_url)
+        self.async_database_url = async_database_url or ASYNC_DATABASE_URL
+        self.async_engine, self.AsyncSessionLocal = self._make_async_engine(self.async_database_url)
+        self.replicas = [Replica(url) for url in (DB_REPLICA_URLS if replica_urls is None else replica_urls)]
+        self._next_replica = itertools.count()
+        self._read_routes = {"replica": 0, "primary": 0}
+
+    @classmethod
+    def _make_engine(cls, url):
+        engine = create_engine(
+            url, poolclass=TimedQueuePool, future=True,
+            connect_args=cls._connect_args("psycopg2"), **cls._pool_args(),
+        )
+        cls._install_events(engine)
+        return engine, sessionmaker(bind=engine, autoflush=False, autocommit=False, class_=Session, future=True)
+
+    @classmethod
+    def _make_async_engine(cls, url):
+        engine = create_async_engine(
+            url, poolclass=TimedAsyncQueuePool,
+            connect_args=cls._connect_args("asyncpg"), **cls._pool_args(),
+        )
+        event.listen(engine.sync_engine, "connect", _register_vector)
+        cls._install_events(engine.sync_engine)
+        # expire_on_commit=False: อ่าน attribute หลัง commit ได้โดยไม่เกิด lazy load (ซึ่งทำไม่ได้ใน async)
+        return engine, async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+    @staticmethod
+    def _install_events(engine) -> None:
+        if DB_PRE_PING == "idle":
+            install_idle_ping(engine, DB_PRE_PING_IDLE_SECONDS)
+        if DB_STATEMENT_TIMEOUT_MS > 0 and DB_TRANSACTION_POOLER:
+            install_local_statement_timeout(engine, DB_STATEMENT_TIMEOUT_MS)
+
+    @staticmethod
+    def _pool_args() -> dict:
+        if DB_PRE_PING not in ("always", "idle", "off"):
+            raise RuntimeError(f"Unknown DB_PRE_PING: {DB_PRE_PING}")
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+            "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+            "pool_pre_ping": DB_PRE_PING == "always",
+        }
+
+    @staticmethod
+    def _connect_args(driver: str) -> dict:
+        """
+        statement_timeout เป็น startup parameter ของ connection (ไม่เสีย round trip ต่อ transaction)
+        โหมด transaction pooler: ปิด prepared statement cache ของ asyncpg และตั้งชื่อ statement ไม่ซ้ำ
+        เพราะ statement ที่ prepare ไว้บน backend หนึ่งอาจไม่อยู่บน backend ถัดไป
+        """
+        args: dict = {}
+        if driver == "asyncpg" and DB_TRANSACTION_POOLER:
+            args["statement_cache_size"] = 0
+            args["prepared_statement_cache_size"] = 0
+            args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+        if DB_STATEMENT_TIMEOUT_MS > 0 and not DB_TRANSACTION_POOLER:
+            if driver == "asyncpg":
+                args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            else:
+                args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+        return args
+
+    def pool_stats(self) -> dict:
+        """สถานะ pool ของทั้งสอง engine: checked-out/overflow และ histogram เวลารอ checkout (รวม replica)"""
+        stats = {"sync": self.engine.pool.stats(), "async": self.async_engine.sync_engine.pool.stats()}
+        if self.replicas:
+            stats["read_routes"] = dict(self._read_routes)
+            # ไม่เปิดเผย host:port ของ replica ใน payload ใช้ลำดับใน DB_REPLICA_URLS แทน
+            stats["replicas"] = {f"replica_{i}": r.stats() for i, r in enumerate(self.replicas)}
+        return stats
 
     def init_extensions(self) -> None:
         # เปิดใช้งาน pgvector หากยังไม่ได้เปิด
         with self.engine.begin() as conn:
             conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            version = conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+        if DB.iterative_scan and VECTOR_INDEX == "hnsw":
+            major_minor = tuple(int(x) for x in re.findall(r"\d+", version or "")[:2])
+            if major_minor < (0, 8):
+                logger.warning(f"pgvector {version} has no hnsw.iterative_scan; filtered searches may return fewer than k rows")
+                DB.iterative_scan = ""
 
     def create_all(self) -> None:
         from .models.users import Users, UserProfiles
         from .models.senior_users import SeniorUsers, SeniorProfiles, SeniorAbilities
         from .models.jobs import Jobs, Status
-        from .models.reviews import Reviews
+        from .models.reviews import Reviews, SeniorRatings
         from .models.files import Files
         from .models.chats import ChatRooms, ChatMessages
         Base.metadata.create_all(bind=self.engine)
+        self.check_embedding_storage()
+        self.ensure_lexical_column()
+        self.ensure_rating_summary()
+        self.check_indexes()
+
+    def ensure_rating_summary(self) -> None:
+        """
+        ดูแล senior_ratings แบบ incremental ด้วย trigger บน reviews (insert/update/delete)
+        - ครั้งแรกที่สร้าง trigger จะ backfill จาก reviews ที่มีอยู่
+        - prior ของ Bayesian score มาจาก config จึง CREATE OR REPLACE function และคำนวณ bayes ใหม่ทุก startup
+        - advisory lock กัน worker หลายตัว startup พร้อมกันแล้วสร้าง trigger/backfill ซ้ำ
+        """
+        w, m = float(RATING_PRIOR_WEIGHT), float(RATING_PRIOR_MEAN)
+        bayes = f"({w} * {m} + rating_sum) / ({w} + rating_count)"
+        with self.engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('senior_ratings_setup'))"))
+            conn.execute(text(f"""
+                CREATE OR REPLACE FUNCTION senior_ratings_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+                DECLARE
+                    sid text;
+                BEGIN
+                    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.rating IS NOT NULL THEN
+                        SELECT senior_id INTO sid FROM jobs WHERE id = OLD.job_id;
+                        UPDATE senior_ratings
+                           SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating, updated_at = now()
+                         WHERE senior_id = sid;
+                        UPDATE senior_ratings
+                           SET mean = CASE WHEN rating_count > 0 THEN rating_sum / rating_count END, bayes = {bayes}
+                         WHERE senior_id = sid;
+                    END IF;
+                    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.rating IS NOT NULL THEN
+                        SELECT senior_id INTO sid FROM jobs WHERE id = NEW.job_id;
+                        IF sid IS NOT NULL THEN
+                            INSERT INTO senior_ratings AS s (senior_id, rating_count, rating_sum, mean, bayes, updated_at)
+                            VALUES (sid, 1, NEW.rating, NEW.rating, ({w} * {m} + NEW.rating) / ({w} + 1), now())
+                            ON CONFLICT (senior_id) DO UPDATE
+                               SET rating_count = s.rating_count + 1,
+                                   rating_sum = s.rating_sum + NEW.rating,
+                                   mean = (s.rating_sum + NEW.rating) / (s.rating_count + 1),
+                                   bayes = ({w} * {m} + (s.rating_sum + NEW.rating)) / ({w} + (s.rating_count + 1)),
+                                   updated_at = now();
+                        END IF;
+                    END IF;
+                    RETURN NULL;
+                END $$
+            """))
+            exists = conn.execute(text(
+                "SELECT 1 FROM pg_trigger WHERE tgname = 'reviews_senior_ratings' AND tgrelid = 'reviews'::regclass"
+            )).scalar()
+            if not exists:
+                conn.execute(text(f"""
+                    INSERT INTO senior_ratings (senior_id, rating_count, rating_sum, mean, bayes)
+                    SELECT j.senior_id, count(*), sum(r.rating), avg(r.rating),
+                           ({w} * {m} + sum(r.rating)) / ({w} + count(*))
+                      FROM reviews r JOIN jobs j ON j.id = r.job_id
+                     WHERE r.rating IS NOT NULL AND j.senior_id IS NOT NULL
+                     GROUP BY j.senior_id
+                    ON CONFLICT (senior_id) DO NOTHING
+                """))
+                conn.execute(text(
+                    "CREATE TRIGGER reviews_senior_ratings AFTER INSERT OR UPDATE OF rating, job_id OR DELETE ON reviews "
+                    "FOR EACH ROW EXECUTE FUNCTION senior_ratings_apply()"
+                ))
+            # prior เปลี่ยน: คำนวณ bayes ใหม่ (ไม่มีผลถ้าค่าเท่าเดิม)
+            conn.execute(text(f"UPDATE senior_ratings SET bayes = {bayes} WHERE bayes IS DISTINCT FROM {bayes}"))
+
+    def ensure_lexical_column(self) -> None:
+        """
+        คอลัมน์ search_text (generated) สำหรับ lexical leg ของ hybrid search บนตารางที่สร้างไว้ก่อนมีคอลัมน์นี้
+        - เช็คจาก catalog ก่อน: startup ปกติไม่แตะ ALTER TABLE (ซึ่งล็อกทั้งตารางแม้จะมี IF NOT EXISTS)
+        - advisory lock กัน worker หลายตัว startup พร้อมกันแล้ว rewrite ตารางซ้ำ
+        GIN trigram index บนคอลัมน์นี้สร้างแบบ CONCURRENTLY ผ่าน scripts.build_indexes
+        """
+        from .models.senior_users import SEARCH_TEXT_SQL
+        exists_sql = text(
+            "SELECT 1 FROM pg_attribute WHERE attrelid = 'senior_abilities'::regclass "
+            "AND attname = 'search_text' AND NOT attisdropped"
+        )
+        with self.engine.connect() as conn:
+            if conn.execute(exists_sql).scalar():
+                return
+        with self.engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('senior_abilities_search_text'))"))
+            if conn.execute(exists_sql).scalar():
+                return
+            logger.info("adding senior_abilities.search_text (rewrites the table)")
+            conn.execute(text(
+                f"ALTER TABLE senior_abilities ADD COLUMN IF NOT EXISTS search_text text "
+                f"GENERATED ALWAYS AS ({SEARCH_TEXT_SQL}) STORED"
+            ))
+
+    @staticmethod
+    def _embedding_storage_change(conn) -> Optional[tuple]:
+        """
+        (ชนิดปัจจุบัน, ชนิดที่ config ต้องการ, USING) ของคอลัมน์ embedding หรือ None ถ้าตรงกันแล้ว
+        - dimension เท่าเดิม: cast ตรง (vector <-> halfvec)
+        - ลด dimension แบบตัดมิติแรก: subvector + l2_normalize ใน SQL
+        - PCA หรือเพิ่ม dimension: USING เป็น None ต้อง re-embed ด้วย scripts.reembed --column ... --swap
+        """
+        target = embedding_sql_type()
+        current = conn.execute(text(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = 'senior_abilities'::regclass AND attname = 'embedding' AND NOT attisdropped"
+        )).scalar()
+        if current is None or current == target:
+            return None
+        m = re.match(r"^\w+\((\d+)\)$", current)
+        current_dim = int(m.group(1)) if m else None
+        if current_dim == STORE_DIM:
+            using = f"embedding::{target}"
+        elif current_dim and STORE_DIM < current_dim and not EMBED_PCA_FILE:
+            using = f"l2_normalize(subvector(embedding, 1, {int(STORE_DIM)}))::{target}"
+        else:
+            using = None
+        return current, target, using
+
+    def check_embedding_storage(self) -> None:
+        """เรียกตอน startup: แค่เตือนถ้าชนิดคอลัมน์ embedding ไม่ตรง EMBED_STORAGE / EMBED_STORE_DIM ไม่ ALTER เอง"""
+        with self.engine.connect() as conn:
+            change = self._embedding_storage_change(conn)
+        if change is None:
+            return
+        current, target, using = change
+        fix = "python -m scripts.switch_embedding_storage" if using else "scripts.reembed --column <name> then --swap"
+        logger.warning(f"senior_abilities.embedding is {current}, config wants {target}; run {fix}")
+
+    def switch_embedding_storage(self) -> Optional[tuple]:
+        """
+        แปลงชนิดคอลัมน์ embedding ให้ตรง config แล้วสร้าง ANN index ใหม่ด้วย opclass ใหม่ใน transaction เดียวกัน
+        ALTER COLUMN TYPE rewrite ทั้งตารางใต้ ACCESS EXCLUSIVE อยู่แล้ว จึง build index แบบปกติในล็อกเดียวกันเลย
+        ไม่มีช่วงที่ตารางไม่มี ANN index; advisory lock กันรันซ้อนกัน
+        คืน (ชนิดเดิม, ชนิดใหม่, USING) หรือ None ถ้าตรงอยู่แล้ว
+        """
+        with self.engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('senior_abilities_embedding_storage'))"))
+            change = self._embedding_storage_change(conn)
+            if change is None:
+                return None
+            current, target, using = change
+            if using is None:
+                raise RuntimeError(
+                    f"senior_abilities.embedding is {current}, config wants {target}; "
+                    f"backfill a shadow column with scripts.reembed --column <name> and --swap it in"
+                )
+            conn.execute(text("SET LOCAL statement_timeout = 0"))
+            for name in self._vector_index_names(conn):
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            conn.execute(text(f"ALTER TABLE senior_abilities ALTER COLUMN embedding TYPE {target} USING {using}"))
+            for name, ddl_of in self._wanted_indexes(concurrently=False).items():
+                if name == VECTOR_INDEX_NAME or name.startswith(f"{VECTOR_INDEX_NAME}_where_"):
+                    logger.info(f"create index {name}")
+                    conn.execute(text(ddl_of(name)[0]))
+        return change
+
+    @staticmethod
+    def vector_index_ddl(name: str = VECTOR_INDEX_NAME, column: str = "embedding", concurrently: bool = False,
+                         where: Optional[str] = None):
+        """
+        DDL ของ ANN index ตาม VECTOR_INDEX และส่วนของ indexdef ที่ต้องมี
+        where ทำให้เป็น partial index (เช่น "vehicle")
+        คืน (None, ()) เมื่อ VECTOR_INDEX=none
+        """
+        create = "CREATE INDEX CONCURRENTLY IF NOT EXISTS" if concurrently else "CREATE INDEX IF NOT EXISTS"
+        ops = f"{EMBED_STORAGE}_cosine_ops"
+        suffix = (f" WHERE {where}", f"where{where}") if where else ("", "")
+        if VECTOR_INDEX == "hnsw":
+            ddl = (f"{create} {name} ON senior_abilities "
+                   f"USING hnsw ({column} {ops}) WITH (m = {int(HNSW_M)}, ef_construction = {int(HNSW_EF_CONSTRUCTION)}){suffix[0]}")
+            return ddl, ("using hnsw", ops, f"m='{int(HNSW_M)}'", f"ef_construction='{int(HNSW_EF_CONSTRUCTION)}'", suffix[1])
+        if VECTOR_INDEX == "ivfflat":
+            ddl = (f"{create} {name} ON senior_abilities "
+                   f"USING ivfflat ({column} {ops}) WITH (lists = {int(IVFFLAT_LISTS)}){suffix[0]}")
+            return ddl, ("using ivfflat", ops, f"lists='{int(IVFFLAT_LISTS)}'", suffix[1])
+        if VECTOR_INDEX == "none":
+            return None, ()
+        raise RuntimeError(f"Unknown VECTOR_INDEX: {VECTOR_INDEX}")
+
+    @staticmethod
+    def _vector_index_names(conn) -> list:
+        """ANN index ทั้งหมดบน embedding (index หลัก + partial index ของ filter)"""
+        return list(conn.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = 'senior_abilities' "
+                 "AND (indexname = :name OR indexname LIKE :partial)"),
+            {"name": VECTOR_INDEX_NAME, "partial": f"{VECTOR_INDEX_NAME}_where_%"},
+        ).scalars())
+
+    def _wanted_indexes(self, concurrently: bool = True) -> Dict[str, Callable[[str], tuple]]:
+        """
+        index ที่ config ต้องการบน senior_abilities: {ชื่อ: ฟังก์ชัน(ชื่อ) -> (ddl, expected)}
+        ddl เป็น CONCURRENTLY เว้นแต่ concurrently=False (build ภายใน transaction ที่ล็อกตารางอยู่แล้ว)
+        - composite B-tree (type, vehicle, offsite_work) สำหรับ exact scan ของ structured filter
+        - GIN trigram บน search_text สำหรับ lexical leg ของ hybrid search
+        - ANN index หลักตาม VECTOR_INDEX (ไม่มีเมื่อ VECTOR_INDEX=none)
+        - partial ANN index ต่อ boolean filter ใน FILTER_VECTOR_INDEXES (planner ใช้เมื่อ query มี vehicle = true)
+        """
+        create = "CREATE INDEX CONCURRENTLY IF NOT EXISTS" if concurrently else "CREATE INDEX IF NOT EXISTS"
+        wanted = {
+            FILTER_INDEX_NAME: lambda name: (
+                f"{create} {name} ON senior_abilities (type, vehicle, offsite_work)", ()
+            ),
+            LEXICAL_INDEX_NAME: lambda name: (
+                f"{create} {name} ON senior_abilities USING gin (search_text gin_trgm_ops)",
+                ("using gin", "gin_trgm_ops"),
+            ),
+        }
+        if VECTOR_INDEX != "none":
+            wanted[VECTOR_INDEX_NAME] = lambda name: self.vector_index_ddl(name=name, concurrently=concurrently)
+        for column in FILTER_VECTOR_INDEXES:
+            if column not in ("vehicle", "offsite_work"):
+                raise RuntimeError(f"Unknown FILTER_VECTOR_INDEXES column: {column}")
+            if VECTOR_INDEX != "none":
+                wanted[f"{VECTOR_INDEX_NAME}_where_{column}"] = (
+                    lambda name, column=column: self.vector_index_ddl(name=name, where=column, concurrently=concurrently)
+                )
+        return wanted
+
+    def index_plan(self, conn) -> Dict[str, list]:
+        """
+        เทียบ index บน senior_abilities กับ config
+        create: ยังไม่มี, rebuild: มีแต่ชนิด/พารามิเตอร์ไม่ตรง, drop: ไม่ต้องการแล้วหรือ build ค้างเป็น INVALID
+        """
+        wanted = self._wanted_indexes()
+        rows = conn.execute(
+            text("SELECT c.relname AS name, pg_get_indexdef(i.indexrelid) AS indexdef, i.indisvalid AS valid "
+                 "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                 "WHERE i.indrelid = 'senior_abilities'::regclass "
+                 "AND (c.relname = ANY(:names) OR c.relname LIKE :partial)"),
+            {"names": [FILTER_INDEX_NAME, LEXICAL_INDEX_NAME, VECTOR_INDEX_NAME], "partial": f"{VECTOR_INDEX_NAME}_where_%"},
+        ).all()
+        plan: Dict[str, list] = {"create": [], "rebuild": [], "drop": []}
+        existing = set()
+        for row in rows:
+            ddl_of = wanted.get(row.name)
+            if ddl_of is None or not row.valid:
+                plan["drop"].append(row.name)
+                continue
+            existing.add(row.name)
+            _, expected = ddl_of(row.name)
+            normalized = row.indexdef.lower().replace(" ", "").replace("(", "").replace(")", "")
+            if not all(e.replace(" ", "") in normalized for e in expected):
+                plan["rebuild"].append(row.name)
+        plan["create"] = [name for name in wanted if name not in existing]
+        return plan
+
+    def check_indexes(self) -> None:
+        """
+        เรียกตอน startup: แค่เตือนถ้า index ไม่ตรง config ไม่สร้างเอง
+        (CREATE INDEX แบบปกติล็อกการเขียนทั้งตารางระหว่าง build; ใช้ scripts.build_indexes ที่ build แบบ CONCURRENTLY)
+        """
+        with self.engine.connect() as conn:
+            plan = self.index_plan(conn)
+        if any(plan.values()):
+            logger.warning(
+                f"senior_abilities indexes differ from config (create={plan['create']}, rebuild={plan['rebuild']}, "
+                f"drop={plan['drop']}); run python -m scripts.build_indexes"
+            )
+
+    def build_indexes(self) -> None:
+        """
+        สร้าง/ปรับ index ตาม index_plan ด้วย CONCURRENTLY (AUTOCOMMIT) โดยไม่ล็อกการเขียน
+        rebuild: build ชื่อ <name>_new ให้เสร็จก่อนแล้วค่อย drop ตัวเดิมและ rename ระหว่างนั้น query ยังมี index ใช้
+        """
+        with self.engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            plan = self.index_plan(conn)
+            wanted = self._wanted_indexes()
+            for name in plan["drop"]:
+                logger.info(f"drop index {name}")
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            for name in plan["create"]:
+                logger.info(f"create index {name}")
+                conn.execute(text(wanted[name](name)[0]))
+            for name in plan["rebuild"]:
+                logger.info(f"rebuild index {name}")
+                tmp = f"{name}_new"
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {tmp}"))
+                conn.execute(text(wanted[name](tmp)[0]))
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                conn.execute(text(f"ALTER INDEX {tmp} RENAME TO {name}"))
+
+    @staticmethod
+    def apply_vector_search_settings(session: Session, k: int = 0) -> None:
+        """
+        ตั้งค่า ANN ต่อ query แบบ transaction-local (เทียบเท่า SET LOCAL) ใน statement เดียว
+        เรียกก่อน query ที่ ORDER BY cosine_distance ... LIMIT k
+        HNSW คืนได้ไม่เกิน ef_search แถวต่อการ scan และแถวที่ตกเงื่อนไข WHERE (senior ออนไลน์/filter) ถูกตัดทีหลัง
+        จึงตั้ง ef_search >= k (สูงสุด 1000) และใช้ iterative scan (pgvector >= 0.8) ให้ scan ต่อจนได้ครบ k
+        """
+        if VECTOR_INDEX == "hnsw":
+            settings = {"hnsw.ef_search": str(min(max(int(HNSW_EF_SEARCH), int(k)), 1000))}
+            if DB.iterative_scan:
+                settings["hnsw.iterative_scan"] = DB.iterative_scan
+        elif VECTOR_INDEX == "ivfflat":
+            settings = {"ivfflat.probes": str(int(IVFFLAT_PROBES))}
+        else:
+            return
+        params, calls = {}, []
+        for i, (name, value) in enumerate(settings.items()):
+            calls.append(f"set_config(:n{i}, :v{i}, true)")
+            params.update({f"n{i}": name, f"v{i}": value})
+        session.execute(text("SELECT " + ", ".join(calls)), params)
 
     @contextlib.contextmanager
     def session(self) -> Generator[Session, None, None]:
@@ -52,4 +470,113 @@ class DB:
         finally:
             db.close()
 
-db = DB()
\ No newline at end of file
+    @contextlib.asynccontextmanager
+    async def async_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """เหมือน session() แต่เป็น AsyncSession บน asyncpg; ฟังก์ชันที่รับ Session แบบ sync เรียกผ่าน session.run_sync()"""
+        db: AsyncSession = self.AsyncSessionLocal()
+        try:
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        finally:
+            await db.close()
+
+    def _replica(self) -> Optional["Replica"]:
+        """replica ถัดไปแบบ round-robin จากตัวที่ตรวจผ่านและ lag ไม่เกิน DB_REPLICA_MAX_LAG_SECONDS (None = ใช้ primary)"""
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            self._read_routes["primary"] += 1
+            return None
+        self._read_routes["replica"] += 1
+        return healthy[next(self._next_replica) % len(healthy)]
+
+    @contextlib.contextmanager
+    def read_session(self) -> Generator[Session, None, None]:
+        """
+        session สำหรับอ่านอย่างเดียว: ไป replica ถ้ามีตัวที่พร้อม ไม่งั้นใช้ primary
+        ไม่ commit (จบด้วย rollback) การเขียนใน request เดียวกันต้องใช้ session() แยก
+        """
+        replica = self._replica()
+        db: Session = (replica.SessionLocal if replica else self.SessionLocal)()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextlib.asynccontextmanager
+    async def async_read_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """read_session() แบบ AsyncSession"""
+        replica = self._replica()
+        db: AsyncSession = (replica.AsyncSessionLocal if replica else self.AsyncSessionLocal)()
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    async def check_replicas(self) -> None:
+        for replica in self.replicas:
+            await replica.check()
+
+    async def dispose(self) -> None:
+        await self.async_engine.dispose()
+        self.engine.dispose()
+        for replica in self.replicas:
+            await replica.async_engine.dispose()
+            replica.engine.dispose()
+
+# lag ของ replica ในหน่วยวินาที; replay ตามทัน WAL ที่รับมาแล้ว = 0 (primary เงียบไม่ถือว่า lag)
+# แต่ต้องมี WAL receiver ที่กำลัง streaming อยู่ด้วย ไม่งั้น receive = replay ตลอดไปทั้งที่ค้าง -> NULL (ไม่พร้อม)
+# (role ที่ใช้เชื่อมต่อต้องมี pg_read_all_stats จึงเห็น status ของ pg_stat_wal_receiver)
+_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class Replica:
+    """
+    read replica หนึ่งตัว: engine sync/async ของตัวเอง (ค่า pool เดียวกับ primary)
+    lag มาจาก check() ล่าสุด; None = ยังไม่ได้ตรวจหรือเชื่อมต่อไม่ได้ จึงไม่ถูกเลือก
+    """
+    def __init__(self, url: str) -> None:
+        u = make_url(url)
+        self.name = f"{u.host}:{u.port or 5432}"
+        self.engine, self.SessionLocal = DB._make_engine(u.set(drivername="postgresql+psycopg2"))
+        self.async_engine, self.AsyncSessionLocal = DB._make_async_engine(u.set(drivername="postgresql+asyncpg"))
+        self.lag: Optional[float] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.lag is not None and self.lag <= DB_REPLICA_MAX_LAG_SECONDS
+
+    async def check(self) -> None:
+        try:
+            async with self.async_engine.connect() as conn:
+                lag = await asyncio.wait_for(conn.scalar(_REPLICA_LAG_SQL), timeout=DB_REPLICA_CHECK_SECONDS)
+            if lag is None:
+                if self.lag is not None:
+                    logger.warning(f"Replica {self.name} WAL receiver is not streaming, routing reads to primary")
+                self.lag = None
+                return
+            self.lag = float(lag)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.lag is not None:
+                logger.warning(f"Replica {self.name} check failed, routing reads to primary: {e}")
+            self.lag = None
+
+    def stats(self) -> dict:
+        return {"lag_s": self.lag, "healthy": self.healthy, "sync": self.engine.pool.stats(),
+                "async": self.async_engine.sync_engine.pool.stats()}
+
+async def replica_monitor(interval: float = DB_REPLICA_CHECK_SECONDS) -> None:
+    """background task: ตรวจ lag ของทุก replica ทุก interval วินาที"""
+    while True:
+        await db.check_replicas()
+        await asyncio.sleep(interval)
+
+db = DB()
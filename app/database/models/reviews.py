@@ -1,5 +1,5 @@
 from __future__ import annotations
-from sqlalchemy import Column, Integer, Text, DateTime, func, ForeignKey, Float, Boolean
+from sqlalchemy import Column, Integer, Text, DateTime, func, ForeignKey, Float
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from ..db import Base
@@ -13,4 +13,18 @@ class Reviews(Base):
     comment: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
-    job = relationship("Jobs", back_populates="review", uselist=False)
\ No newline at end of file
+    job = relationship("Jobs", back_populates="review", uselist=False)
+
+class SeniorRatings(Base):
+    """
+    สรุปคะแนนรีวิวต่อ senior (materialized) ดูแลโดย trigger บน reviews (ดู DB.ensure_rating_summary)
+    bayes = (RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN + rating_sum) / (RATING_PRIOR_WEIGHT + rating_count)
+    """
+    __tablename__ = "senior_ratings"
+
+    senior_id: Mapped[str] = mapped_column(Text, ForeignKey("senior_users.id", ondelete="CASCADE"), primary_key=True)
+    rating_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    mean: Mapped[float | None] = mapped_column(Float, nullable=True)
+    bayes: Mapped[float | None] = mapped_column(Float, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
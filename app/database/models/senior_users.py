@@ -1,10 +1,18 @@
 from __future__ import annotations
-from sqlalchemy import Column, Integer, Text, DateTime, func, ForeignKey, Boolean, String, CheckConstraint
+from sqlalchemy import Column, Integer, Text, DateTime, func, ForeignKey, Boolean, String, CheckConstraint, Computed
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC, Vector
 import secrets
 
 from ..db import Base
+from ...utils.config import EMBED_STORAGE
+from ...utils.embedder import STORE_DIM
+
+# ชนิดคอลัมน์ embedding ตาม EMBED_STORAGE (halfvec = float16 ครึ่งหนึ่งของขนาด vector)
+EmbeddingType = HALFVEC if EMBED_STORAGE == "halfvec" else Vector
+
+# ข้อความสำหรับ lexical search (pg_trgm) รวม career + other_ability + type
+SEARCH_TEXT_SQL = "coalesce(career, '') || ' ' || coalesce(other_ability, '') || ' ' || coalesce(type, '')"
 
 # Generate a prefixed 8-hex-digit id like "s1a2b3c4"
 def gen_hex_id(prefix: str) -> str:
@@ -66,7 +74,8 @@ class SeniorAbilities(Base):
     other_ability: Mapped[str | None] = mapped_column(Text, nullable=True)
     vehicle: Mapped[bool | None] = mapped_column(Boolean, nullable=True)
     offsite_work: Mapped[bool | None] = mapped_column(Boolean, nullable=True)
-    # embedding vector(384)
-    embedding = Column(Vector(384), nullable=True)
+    # embedding vector(384) หรือ halfvec(STORE_DIM) ตาม config
+    embedding = Column(EmbeddingType(STORE_DIM), nullable=True)
+    search_text = Column(Text, Computed(SEARCH_TEXT_SQL, persisted=True))
 
     user = relationship("SeniorUsers", back_populates="ability", uselist=False)
\ No newline at end of file
@@ -0,0 +1,100 @@
+from __future__ import annotations
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+class PoolMetrics:
+    """เวลารอ checkout connection จาก pool เป็น histogram (ms) + จำนวนครั้งที่รอจน timeout"""
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self) -> None:
+        self._counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+        self._timeouts = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ms: float, timeout: bool = False) -> None:
+        i = next((i for i, b in enumerate(self.BUCKETS_MS) if elapsed_ms <= b), len(self.BUCKETS_MS))
+        with self._lock:
+            self._counts[i] += 1
+            self._total_ms += elapsed_ms
+            self._max_ms = max(self._max_ms, elapsed_ms)
+            self._timeouts += timeout
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            n = sum(self._counts)
+            labels = [f"le_{b}" for b in self.BUCKETS_MS] + ["inf"]
+            return {
+                "checkouts": n,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": self._total_ms / n if n else 0.0,
+                "max_wait_ms": self._max_ms,
+                "wait_ms_histogram": dict(zip(labels, self._counts)),
+            }
+
+class _TimedPool:
+    """จับเวลา Pool.connect() (รวมเวลารอเมื่อ pool เต็ม) ลง PoolMetrics"""
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record((time.perf_counter() - t0) * 1e3, timeout=True)
+            raise
+        self.metrics.record((time.perf_counter() - t0) * 1e3)
+        return conn
+
+    def stats(self) -> Dict:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": self.overflow(),
+            **self.metrics.snapshot(),
+        }
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+class TimedAsyncQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+def install_idle_ping(engine, idle_seconds: float) -> None:
+    """
+    pre-ping แบบ idle: ping เฉพาะ connection ที่ว่างใน pool นานกว่า idle_seconds แทนทุก checkout
+    ping ไม่ผ่าน = DisconnectionError ให้ pool ทิ้ง connection นั้นแล้วเปิดใหม่
+    engine: Engine แบบ sync (AsyncEngine ให้ส่ง .sync_engine)
+    """
+    dialect = engine.dialect
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record) -> None:
+        connection_record.info["checkin_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        last = connection_record.info.get("checkin_at")
+        if last is None or time.monotonic() - last < idle_seconds:
+            return
+        try:
+            dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            raise exc.DisconnectionError(str(e)) from e
+
+def install_local_statement_timeout(engine, timeout_ms: int) -> None:
+    """
+    statement_timeout ต่อ transaction (SET LOCAL) สำหรับโหมด transaction pooler
+    ที่ส่ง startup parameter/SET ระดับ session ไม่ได้ เพราะ backend ถูกสลับทุก transaction
+    """
+    @event.listens_for(engine, "begin")
+    def _begin(conn) -> None:
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
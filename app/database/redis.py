@@ -1,12 +1,24 @@
 from __future__ import annotations
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
 from redis.asyncio import Redis
 
-from ..utils.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD, PRESENCE_TTL_SECONDS
+from ..utils.config import (
+    REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD,
+    PRESENCE_TTL_KEYS, PRESENCE_TRIM_SECONDS, PRESENCE_MOVE_THRESHOLD_M,
+    SEARCH_CACHE_TTL_SECONDS, SEARCH_CACHE_PRECISION, SEARCH_CACHE_MAX_RANGE_M,
+)
+from ..utils.geohash import cells_within
 
+import asyncio
 import json
+import logging
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
 
 _redis: Redis | None = None
+_redis_raw: Redis | None = None
 
 def get_redis() -> Redis:
     global _redis
@@ -27,6 +39,21 @@ def get_redis() -> Redis:
         )
     return _redis
 
+def get_redis_raw() -> Redis:
+    """
+    client แยกสำหรับค่า binary (เช่น embedding แบบ float32 ที่ pack ไว้) จึงไม่ decode เป็น str
+    """
+    global _redis_raw
+    if _redis_raw is None:
+        _redis_raw = Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=REDIS_DB,
+            password=REDIS_PASSWORD,
+            decode_responses=False,
+        )
+    return _redis_raw
+
 # -------- Key design --------
 def _presence_key(pid: str) -> str:
     return f"senior:{pid}:presence"
@@ -34,23 +61,116 @@ def _presence_key(pid: str) -> str:
 def _loc_key(pid: str) -> str:
     return f"senior:{pid}:loc"
 
-async def set_presence(provider_id: str, ttl: int) -> None:
+# token ของ presence WebSocket ล่าสุดของ senior (เฉพาะ connection นี้ล้าง presence ตอนหลุดได้)
+def _conn_key(pid: str) -> str:
+    return f"senior:{pid}:conn"
+
+_CONN_KEY_TTL_SECONDS = 86400
+
+# ZSET ของ senior ที่ออนไลน์ (score = unix timestamp ที่ presence หมดอายุ)
+_ONLINE_KEY = "senior:online"
+
+# GEO set ของ senior ที่ออนไลน์ (member = provider_id) ใช้ดึงผู้สมัครตามรัศมีในคำสั่งเดียว
+_GEO_KEY = "senior:geo"
+
+# cache ผลค้นหาต่อ geohash cell (hash: field = query hash) ลบทั้ง key เมื่อ online set ของ cell เปลี่ยน
+def search_cell_key(cell: str) -> str:
+    return f"search:cell:{cell}"
+
+# snapshot ของผลค้นหาที่จัดอันดับแล้วสำหรับ cursor pagination
+def search_page_key(sid: str) -> str:
+    return f"search:page:{sid}"
+
+def _search_cell_keys(positions: List[tuple]) -> List[str]:
     """
-    เก็บสถานะออนไลน์ (presence) ไว้ใน Redis พร้อม TTL
+    key ของทุก cell ที่ผลค้นหาที่ cache ไว้อาจมี senior ที่พิกัดเหล่านี้ (ว่างถ้าปิด search cache)
+    cache รับ range ไม่เกิน SEARCH_CACHE_MAX_RANGE_M จึงล้างทุก cell ในรัศมีนั้น
     """
-    r = get_redis()
-    await r.setex(_presence_key(provider_id), ttl, "1")
+    if SEARCH_CACHE_TTL_SECONDS <= 0:
+        return []
+    cells = set()
+    for lat, lng in positions:
+        cells |= cells_within(lat, lng, SEARCH_CACHE_MAX_RANGE_M, SEARCH_CACHE_PRECISION)
+    return [search_cell_key(c) for c in sorted(cells)]
+
+# pub/sub channel แจ้ง worker อื่นเมื่อ presence เปลี่ยน: {"op": "up", "id", "lat", "lng"} | {"op": "down", "ids"}
+PRESENCE_CHANNEL = "senior:presence:events"
+
+def presence_event(op: str, **fields) -> str:
+    return json.dumps({"op": op, **fields})
+
+# Heartbeat แบบ atomic ใน round trip เดียว
+# KEYS: online zset, geo set, loc key, presence key, search cache cell keys...
+# ARGV: id, lat, lng, ttl, now, move threshold (m), ttl keys flag, channel, event json, loc payload
+# refresh TTL/expiry เสมอ แต่เขียนพิกัด/GEO/publish เฉพาะเมื่อเพิ่งออนไลน์หรือขยับเกิน threshold
+# คืน 0 = suppressed, 1 = เขียนพิกัด (ไม่มีพิกัดเดิม), {1, lng เดิม, lat เดิม} = เขียนพิกัดแทนที่พิกัดเดิม
+_HEARTBEAT_LUA = """
+local pid = ARGV[1]
+local lat = tonumber(ARGV[2])
+local lng = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local now = tonumber(ARGV[5])
+local threshold = tonumber(ARGV[6])
+local ttl_keys = ARGV[7] == '1'
+
+local prev = redis.call('ZSCORE', KEYS[1], pid)
+redis.call('ZADD', KEYS[1], now + ttl, pid)
+if ttl_keys then
+    redis.call('SET', KEYS[4], '1', 'EX', ttl)
+end
+
+local pos = redis.call('GEOPOS', KEYS[2], pid)[1]
+local moved = true
+if prev and tonumber(prev) > now then
+    if pos then
+        local r = math.pi / 180
+        local dlat = (lat - tonumber(pos[2])) * r
+        local dlng = (lng - tonumber(pos[1])) * r
+        local a = math.sin(dlat / 2) ^ 2 + math.cos(lat * r) * math.cos(tonumber(pos[2]) * r) * math.sin(dlng / 2) ^ 2
+        local dist = 2 * 6371008.8 * math.asin(math.sqrt(a))
+        moved = dist > threshold
+    end
+end
+
+if not moved then
+    if (not ttl_keys) or redis.call('EXPIRE', KEYS[3], ttl) == 1 then
+        return 0
+    end
+end
+
+redis.call('GEOADD', KEYS[2], ARGV[3], ARGV[2], pid)
+if ttl_keys then
+    redis.call('SET', KEYS[3], ARGV[10], 'EX', ttl)
+end
+redis.call('PUBLISH', ARGV[8], ARGV[9])
+if #KEYS > 4 then
+    redis.call('DEL', unpack(KEYS, 5))
+end
+if pos then
+    return {1, pos[1], pos[2]}
+end
+return 1
+"""
+
+_heartbeat_script = None
+_heartbeat_stats: Dict[str, int] = {"heartbeats": 0, "suppressed": 0}
 
 async def set_presence_and_loc(
     provider_id: str,
     lat: float,
     lng: float,
     ttl: int,
-) -> None:
+) -> bool:
     """
     เก็บสถานะออนไลน์ + พิกัดสดไว้ใน Redis พร้อม TTL
-    ใช้ pipeline ลด RTT; ไม่เก็บถาวร (privacy-first); payload ที่เก็บ: {"id", "lat", "lng"}
+    ใช้ Lua script ครั้งเดียว (1 RTT, atomic); ไม่เก็บถาวร (privacy-first); payload ที่เก็บ: {"id", "lat", "lng"}
+    presence อยู่ใน ZSET (_ONLINE_KEY) และตำแหน่งอยู่ใน GEO set (_GEO_KEY) สำหรับค้นหาตามรัศมี
+    TTL keys (presence/loc) เขียนเพิ่มเฉพาะเมื่อเปิด PRESENCE_TTL_KEYS
+    ถ้าขยับไม่เกิน PRESENCE_MOVE_THRESHOLD_M จะ refresh แค่ TTL ไม่เขียนพิกัดซ้ำ
+    search cache ของ cell รอบพิกัดใหม่ถูกล้างใน script; cell รอบพิกัดเดิมที่ไม่ทับกันล้างตามหลังเมื่อย้ายจริง
+    คืน True ถ้าเขียนพิกัด, False ถ้า suppressed
     """
+    global _heartbeat_script
     
     if lat is None or lng is None:
         raise ValueError("lat and lng are required")
@@ -60,67 +180,250 @@ async def set_presence_and_loc(
     
     payload = {"id": provider_id, "lat": float(lat), "lng": float(lng)}
     
-    await set_presence(provider_id, ttl)
-    
     r = get_redis()
-    pipe = r.pipeline()
-    await pipe.setex(_loc_key(provider_id), ttl, json.dumps(payload))
-    await pipe.execute()    
-    
-    
-    
-async def online_ids() -> List[str]:
+    if _heartbeat_script is None:
+        _heartbeat_script = r.register_script(_HEARTBEAT_LUA)
+    cell_keys = _search_cell_keys([(float(lat), float(lng))])
+    written = await _heartbeat_script(
+        keys=[_ONLINE_KEY, _GEO_KEY, _loc_key(provider_id), _presence_key(provider_id), *cell_keys],
+        args=[
+            provider_id, float(lat), float(lng), int(ttl), time.time(), PRESENCE_MOVE_THRESHOLD_M,
+            "1" if PRESENCE_TTL_KEYS else "0",
+            PRESENCE_CHANNEL, presence_event("up", **payload), json.dumps(payload),
+        ],
+    )
+    if isinstance(written, list):
+        old_keys = set(_search_cell_keys([(float(written[2]), float(written[1]))])) - set(cell_keys)
+        if old_keys:
+            await r.delete(*sorted(old_keys))
+    _heartbeat_stats["heartbeats"] += 1
+    if not written:
+        _heartbeat_stats["suppressed"] += 1
+    return bool(written)
+
+def presence_stats() -> Dict[str, float]:
+    total = _heartbeat_stats["heartbeats"]
+    return {**_heartbeat_stats, "suppressed_ratio": _heartbeat_stats["suppressed"] / total if total else 0.0}
+
+async def nearby_online(lat: float, lng: float, radius_m: float) -> List[Dict]:
     """
-    คืนรายการ provider_id ที่ยังออนไลน์ (presence key ยังไม่หมดอายุ)
-    ใช้ SCAN แทน KEYS สำหรับโปรดักชัน
+    คืน senior ที่ออนไลน์ภายในรัศมี radius_m (เมตร) เรียงจากใกล้ไปไกล
+    ใช้ GEOSEARCH ... BYRADIUS ... WITHDIST คำสั่งเดียว แทนการ SCAN + get_loc ทีละคน
+    member ที่ presence หมดอายุแล้วจะถูกลบออกจาก GEO set (lazy prune)
+    คืนค่าเป็น [{"id", "lat", "lng", "distance"}]
     """
     r = get_redis()
-    out: List[str] = []
-    async for key in r.scan_iter(match="senior:*:presence", count=500):
-        try:
-            out.append(key.split(":")[1])
-        except Exception:
+    rows = await r.geosearch(
+        _GEO_KEY,
+        longitude=lng,
+        latitude=lat,
+        radius=radius_m,
+        unit="m",
+        sort="ASC",
+        withdist=True,
+        withcoord=True,
+    )
+    if not rows:
+        return []
+
+    now = time.time()
+    expires = await r.zmscore(_ONLINE_KEY, [pid for pid, _, _ in rows])
+
+    out: List[Dict] = []
+    stale: List[str] = []
+    for (pid, dist, (g_lng, g_lat)), exp in zip(rows, expires):
+        if exp is None or exp <= now:
+            stale.append(pid)
             continue
+        out.append({"id": pid, "lat": float(g_lat), "lng": float(g_lng), "distance": float(dist)})
+    if stale:
+        await _expire_presence(r, stale, now)
     return out
 
+async def nearby_online_rings(lat: float, lng: float, radii: Sequence[float], k: int,
+                              keep: Optional[Callable[[List[str]], Awaitable[Set[str]]]] = None) -> Tuple[List[Dict], float, int]:
+    """
+    adaptive radius: GEOSEARCH ทีละ ring ตาม radii จนได้ senior ออนไลน์อย่างน้อย k คน หรือครบ ring สุดท้าย
+    keep: คืน id ที่ผ่าน filter ของการค้น (เช่น SearchFilters ใน SQL) ให้นับและคืนเฉพาะ id เหล่านี้
+    เหมือน OnlineIndex.ring_radius; แต่ละ id ถูกตรวจครั้งเดียวแม้อยู่หลาย ring
+    คืน (รายการแบบ nearby_online, รัศมีที่ใช้, จำนวน ring ที่ค้น)
+    """
+    out: List[Dict] = []
+    rings, radius = 0, 0.0
+    checked: Dict[str, bool] = {}
+    for radius in radii:
+        rings += 1
+        out = await nearby_online(lat, lng, radius)
+        if keep is not None:
+            new = [x["id"] for x in out if x["id"] not in checked]
+            if new:
+                passed = await keep(new)
+                checked.update((pid, pid in passed) for pid in new)
+            out = [x for x in out if checked[x["id"]]]
+        if len(out) >= k:
+            break
+    return out, radius, rings
+
+async def _remove_presence(r: Redis, pids: List[str]) -> None:
+    cell_keys: List[str] = []
+    if SEARCH_CACHE_TTL_SECONDS > 0:
+        positions = await r.geopos(_GEO_KEY, *pids)
+        cell_keys = _search_cell_keys([(float(p[1]), float(p[0])) for p in positions if p])
+    pipe = r.pipeline()
+    if cell_keys:
+        pipe.delete(*cell_keys)
+    pipe.zrem(_ONLINE_KEY, *pids)
+    pipe.zrem(_GEO_KEY, *pids)
+    if PRESENCE_TTL_KEYS:
+        pipe.delete(*[_presence_key(pid) for pid in pids], *[_loc_key(pid) for pid in pids])
+    pipe.publish(PRESENCE_CHANNEL, presence_event("down", ids=pids))
+    await pipe.execute()
+
+# ลบ presence ของ id ที่หมดอายุแล้วแบบ atomic: ตรวจ ZSCORE <= now ซ้ำใน script ก่อนลบ
+# (senior ที่ heartbeat เข้ามาหลังการอ่านรายการ stale จะไม่ถูกลบและไม่มี event "down" ปลอม)
+# KEYS: online zset, geo set, แล้ว key ของแต่ละ id ต่อกัน (presence/loc TTL keys + search cache cell keys)
+# ARGV: now, channel, แล้วคู่ (id, จำนวน key ของ id นั้น)
+# คืนรายการ id ที่ถูกลบจริง
+_EXPIRE_LUA = """
+local now = tonumber(ARGV[1])
+local removed = {}
+local k = 3
+for i = 3, #ARGV, 2 do
+    local pid = ARGV[i]
+    local n = tonumber(ARGV[i + 1])
+    local score = redis.call('ZSCORE', KEYS[1], pid)
+    if (not score) or tonumber(score) <= now then
+        redis.call('ZREM', KEYS[1], pid)
+        redis.call('ZREM', KEYS[2], pid)
+        if n > 0 then
+            redis.call('DEL', unpack(KEYS, k, k + n - 1))
+        end
+        removed[#removed + 1] = pid
+    end
+    k = k + n
+end
+if #removed > 0 then
+    redis.call('PUBLISH', ARGV[2], cjson.encode({op = 'down', ids = removed}))
+end
+return removed
+"""
+
+_expire_script = None
+
+async def _expire_presence(r: Redis, pids: List[str], now: float) -> List[str]:
+    """ลบ presence ของ pids ที่ยังหมดอายุ ณ now (ดู _EXPIRE_LUA) คืน id ที่ถูกลบ"""
+    global _expire_script
+    if _expire_script is None:
+        _expire_script = r.register_script(_EXPIRE_LUA)
+    positions = await r.geopos(_GEO_KEY, *pids) if SEARCH_CACHE_TTL_SECONDS > 0 else [None] * len(pids)
+    keys: List[str] = [_ONLINE_KEY, _GEO_KEY]
+    args: List = [now, PRESENCE_CHANNEL]
+    for pid, pos in zip(pids, positions):
+        own = [_presence_key(pid), _loc_key(pid)] if PRESENCE_TTL_KEYS else []
+        if pos:
+            own += _search_cell_keys([(float(pos[1]), float(pos[0]))])
+        keys += own
+        args += [pid, len(own)]
+    return list(await _expire_script(keys=keys, args=args))
+
+async def clear_presence(provider_id: str) -> None:
+    """ทำให้ offline ทันที (เช่น presence WebSocket หลุด) ไม่ต้องรอ TTL"""
+    await _remove_presence(get_redis(), [provider_id])
+
+# compare-and-delete ของ token connection แล้วทำ offline แบบเดียวกับ _remove_presence ใน round trip เดียว
+# KEYS: conn key, online zset, geo set, presence/loc TTL keys + search cache cell keys...
+# ARGV: token, id, channel, event json
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('ZREM', KEYS[3], ARGV[2])
+if #KEYS > 3 then
+    redis.call('DEL', unpack(KEYS, 4))
+end
+redis.call('PUBLISH', ARGV[3], ARGV[4])
+return 1
+"""
+
+_release_script = None
+
+async def claim_presence(provider_id: str) -> str:
+    """presence WebSocket ใหม่: บันทึก token ของ connection นี้ให้เป็นเจ้าของ presence (แทนที่ connection ก่อนหน้า)"""
+    token = secrets.token_hex(8)
+    await get_redis().set(_conn_key(provider_id), token, ex=_CONN_KEY_TTL_SECONDS)
+    return token
+
+async def release_presence(provider_id: str, token: str) -> bool:
+    """
+    presence WebSocket หลุด: offline ทันทีเฉพาะเมื่อ token ยังเป็นของ connection นี้
+    (reconnect ที่ claim ก่อน finally ของ connection เก่าทำงาน จะไม่ถูกล้าง presence)
+    คืน True ถ้าล้าง presence
+    """
+    global _release_script
+    r = get_redis()
+    if _release_script is None:
+        _release_script = r.register_script(_RELEASE_LUA)
+    cell_keys: List[str] = []
+    if SEARCH_CACHE_TTL_SECONDS > 0:
+        pos = (await r.geopos(_GEO_KEY, provider_id))[0]
+        if pos:
+            cell_keys = _search_cell_keys([(float(pos[1]), float(pos[0]))])
+    ttl_keys = [_presence_key(provider_id), _loc_key(provider_id)] if PRESENCE_TTL_KEYS else []
+    released = await _release_script(
+        keys=[_conn_key(provider_id), _ONLINE_KEY, _GEO_KEY, *ttl_keys, *cell_keys],
+        args=[token, provider_id, PRESENCE_CHANNEL, presence_event("down", ids=[provider_id])],
+    )
+    return bool(released)
+
+async def trim_presence() -> int:
+    """
+    ลบ senior ที่ presence หมดอายุออกจาก ZSET/GEO set และแจ้ง worker อื่น
+    เรียกเป็นระยะจาก presence_trimmer; คืนจำนวนที่ถูกลบจริง (ไม่นับคนที่ heartbeat เข้ามาระหว่างทาง)
+    """
+    r = get_redis()
+    now = time.time()
+    stale = await r.zrangebyscore(_ONLINE_KEY, "-inf", now)
+    if not stale:
+        return 0
+    return len(await _expire_presence(r, stale, now))
+
+async def presence_trimmer(interval: float = PRESENCE_TRIM_SECONDS) -> None:
+    """background task: trim_presence ทุก interval วินาที"""
+    while True:
+        try:
+            await trim_presence()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Presence trim failed: {e}")
+        await asyncio.sleep(interval)
+
+async def online_ids() -> List[str]:
+    """
+    คืนรายการ provider_id ที่ยังออนไลน์ (score ใน ZSET ยังไม่ถึงเวลาหมดอายุ)
+    ZRANGEBYSCORE now +inf คำสั่งเดียว ต้นทุนตามจำนวนคนออนไลน์ ไม่ใช่จำนวน key ทั้งหมด
+    """
+    r = get_redis()
+    return await r.zrangebyscore(_ONLINE_KEY, time.time(), "+inf")
+
 async def get_loc(pid: str) -> Optional[Dict]:
     """
     ดึงตำแหน่งล่าสุดของ provider ตาม pid
     คืนค่าเป็น {"id": pid, "lat": float, "lng": float} หรือ None ถ้าไม่มีข้อมูล/หมดอายุ
     """
-    r = get_redis()
-    raw = await r.get(_loc_key(pid))
-    if not raw:
-        return None
-    try:
-        obj = json.loads(raw)
-        # เติม id หาก payload เดิมไม่มี (เผื่อ backward compatibility)
-        if "id" not in obj:
-            obj["id"] = pid
-        # แปลงชนิดให้ชัดเจน
-        obj["id"] = obj["id"]
-        obj["lat"] = float(obj["lat"])
-        obj["lng"] = float(obj["lng"])
-        return obj
-    except Exception:
-        return None
+    return (await get_locations_batch([pid])).get(pid)
 
 async def get_locations_batch(pids: List[str]) -> Dict[str, Dict]:
     """
-    ดึงพิกัดของหลาย provider แบบ batch (pipeline) เพื่อประสิทธิภาพ
+    ดึงพิกัดของหลาย provider แบบ batch (GEOPOS คำสั่งเดียว) เพื่อประสิทธิภาพ
     """
     if not pids:
         return {}
     r = get_redis()
-    pipe = r.pipeline()
     res: Dict[str, Dict] = {}
-    for pid in pids:
-        pipe.get(_loc_key(pid))
-    vals = await pipe.execute()    
-    for pid, raw in zip(pids, vals):
-        if raw:
-            try:
-                res[pid] = json.loads(raw)
-            except Exception:
-                continue
-    return res
\ No newline at end of file
+    for pid, pos in zip(pids, await r.geopos(_GEO_KEY, *pids)):
+        if pos:
+            res[pid] = {"id": pid, "lat": float(pos[1]), "lng": float(pos[0])}
+    return res
@@ -1,10 +1,19 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import os
 
-from .database.db import db
+from .database.db import db, replica_monitor
+from .database.redis import presence_trimmer
+from .utils.embed_batcher import batcher
+from .utils.embedder import is_ready, warm_up
+from .utils.config import ONLINE_INDEX_ENABLED
+from .utils.deps import require_ops
+from .services.online_index import online_index
+from .services.principal_cache import principal_cache
 
 from .routes import auth_router, user_router, search_router, job_router, chat_router, file_router
 
@@ -12,7 +21,24 @@ from .routes import auth_router, user_router, search_router, job_router, chat_ro
 async def lifespan(app: FastAPI):
     db.init_extensions()
     db.create_all()
+    batcher.start()
+    # โหลดโมเดลเบื้องหลัง ให้ / ตอบได้ทันที; /ready จะเป็น 200 เมื่อโมเดลพร้อม
+    warmup = asyncio.create_task(run_in_threadpool(warm_up))
+    trimmer = asyncio.create_task(presence_trimmer())
+    replicas = asyncio.create_task(replica_monitor()) if db.replicas else None
+    principal_cache.start()
+    if ONLINE_INDEX_ENABLED:
+        online_index.start()
     yield
+    await online_index.stop()
+    await principal_cache.stop()
+    trimmer.cancel()
+    if replicas:
+        replicas.cancel()
+    if not warmup.done():
+        warmup.cancel()
+    batcher.stop()
+    await db.dispose()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -30,6 +56,16 @@ app.add_middleware(
 async def root():
     return {"message": "Hello World"}
 
+@app.get("/ready")
+async def ready():
+    if not is_ready():
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"ready": False})
+    return {"ready": True}
+
+@app.get("/stats/db", dependencies=[Depends(require_ops)])
+async def db_stats():
+    return db.pool_stats()
+
 @app.get("/chat-test", response_class=HTMLResponse)
 async def chat_test():
     """Serve the WebSocket chat test page"""
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from scipy import stats
 from sqlalchemy import select
 
-from ..utils.embedder import embed_query
+from ..utils.embed_batcher import embed_query_async
+from ..utils.embedder import ability_text
 
 from ..database.models.senior_users import SeniorAbilities, SeniorProfiles, SeniorUsers
 from ..database.models.users import UserProfiles, Users
@@ -78,7 +79,7 @@ async def verify_otp(payload: VerifyOTP, session=Depends(get_db)):
             session.add(profile)
             session.flush()
             
-            embedding = embed_query(" ".join([payload.career, payload.other_ability]))
+            embedding = await embed_query_async(ability_text(payload.career, payload.other_ability))
             ability = SeniorAbilities(
                 type=payload.type,
                 career=payload.career,
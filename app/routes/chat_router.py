@@ -1,6 +1,7 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
 from sqlalchemy import and_, select, desc, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import json
 import logging
@@ -9,7 +10,8 @@ from ..database.models.chats import ChatRooms, ChatMessages
 from ..database.models.jobs import Jobs
 from ..database.models.users import Users
 from ..database.models.senior_users import SeniorUsers
-from ..utils.deps import get_current_user, get_db
+from ..services.principal_cache import principal_cache
+from ..utils.deps import get_async_read_db, get_db, get_principal, get_read_db
 from ..utils.schemas import ChatMessageCreate, ChatMessageOut, ChatRoomOut, ChatRoomWithMessages
 from ..utils.websocket import manager
 from ..utils.jwt import decode_token
@@ -17,8 +19,8 @@ from ..utils.jwt import decode_token
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-async def get_user_from_token(token: str, session: Session):
-    """Get user from JWT token for WebSocket authentication"""
+async def get_user_from_token(token: str):
+    """Get user snapshot from JWT token for WebSocket authentication (ผ่าน principal cache ไม่เปิด session)"""
     try:
         payload = decode_token(token)
         user_id = payload.get("sub")
@@ -26,17 +28,9 @@ async def get_user_from_token(token: str, session: Session):
         
         if not user_id or not role:
             return None
-            
-        if role == "user":
-            user = session.get(Users, user_id)
-        elif role == "senior_user":
-            user = session.get(SeniorUsers, user_id)
-        else:
-            return None
-            
-        if user:
-            user.role = role
-        return user
+        
+        principal = await principal_cache.get(role, user_id)
+        return principal[0] if principal else None
     except Exception as e:
         logger.error(f"Token validation error: {e}")
         return None
@@ -56,20 +50,20 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
     user_role = None
     user_displayname = None
     
-    with DBInstance.session() as session:
-        # Authenticate user
-        user = await get_user_from_token(token, session)
-        if not user:
-            await websocket.close(code=4001, reason="Invalid token")
-            return
-        
-        # Store user info for later use
-        user_id = user.id
-        user_role = user.role
-        user_displayname = user.displayname
-        
+    # Authenticate user
+    user = await get_user_from_token(token)
+    if not user:
+        await websocket.close(code=4001, reason="Invalid token")
+        return
+    
+    # Store user info for later use
+    user_id = user.id
+    user_role = user.role
+    user_displayname = user.displayname
+    
+    async with DBInstance.async_session() as session:
         # Check if room exists and user has access
-        room = session.get(ChatRooms, room_id)
+        room = await session.get(ChatRooms, room_id)
         if not room:
             await websocket.close(code=4004, reason="Room not found")
             return
@@ -96,7 +90,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
             
             if message_type == "message":
                 # Save message to database
-                with DBInstance.session() as session:
+                async with DBInstance.async_session() as session:
                     message_content = message_data.get("message", "").strip()
                     if message_content:
                         # Create message record
@@ -108,7 +102,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
                             is_read=False
                         )
                         session.add(new_message)
-                        session.flush()
+                        await session.flush()
                         
                         # Prepare broadcast message
                         broadcast_message = {
@@ -135,9 +129,9 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
             
             elif message_type == "mark_read":
                 # Mark messages as read
-                with DBInstance.session() as session:
+                async with DBInstance.async_session() as session:
                     if user_role == "user":
-                        session.execute(
+                        await session.execute(
                             ChatMessages.__table__.update()
                             .where(and_(
                                 ChatMessages.room_id == room_id,
@@ -147,7 +141,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
                             .values(is_read=True)
                         )
                     elif user_role == "senior_user":
-                        session.execute(
+                        await session.execute(
                             ChatMessages.__table__.update()
                             .where(and_(
                                 ChatMessages.room_id == room_id,
@@ -156,7 +150,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
                             ))
                             .values(is_read=True)
                         )
-                    session.commit()
+                    await session.commit()
                     
                     # Notify other participants about read status
                     await manager.broadcast_to_room(room_id, {
@@ -207,7 +201,7 @@ async def create_chat_room_if_not_exists(job_id: int, session: Session) -> ChatR
     return chat_room
 
 @router.get("/rooms", response_model=List[ChatRoomOut])
-async def get_my_chat_rooms(ctx = Depends(get_current_user), session: Session = Depends(get_db)):
+async def get_my_chat_rooms(ctx = Depends(get_principal), session: AsyncSession = Depends(get_async_read_db)):
     """Get all chat rooms for current user"""
     user, _, _ = ctx
     
@@ -222,17 +216,17 @@ async def get_my_chat_rooms(ctx = Depends(get_current_user), session: Session =
     else:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid user role")
     
-    rooms = session.scalars(stmt).all()
+    rooms = (await session.scalars(stmt)).all()
     
     # Build response with additional info
     room_responses = []
     for room in rooms:
         # Get user and senior names
-        room_user = session.get(Users, room.user_id)
-        room_senior = session.get(SeniorUsers, room.senior_id)
+        room_user = await session.get(Users, room.user_id)
+        room_senior = await session.get(SeniorUsers, room.senior_id)
         
         # Get unread message count
-        unread_count = session.scalar(
+        unread_count = await session.scalar(
             select(func.count(ChatMessages.id))
             .where(and_(
                 ChatMessages.room_id == room.id,
@@ -248,7 +242,7 @@ async def get_my_chat_rooms(ctx = Depends(get_current_user), session: Session =
             .order_by(desc(ChatMessages.created_at))
             .limit(1)
         )
-        last_message = session.scalars(last_message_stmt).first()
+        last_message = (await session.scalars(last_message_stmt)).first()
         
         last_message_out = None
         if last_message:
@@ -280,11 +274,12 @@ async def get_my_chat_rooms(ctx = Depends(get_current_user), session: Session =
     return room_responses
 
 @router.get("/rooms/{room_id}", response_model=ChatRoomWithMessages)
-async def get_chat_room(room_id: str, ctx = Depends(get_current_user), session: Session = Depends(get_db)):
-    """Get chat room with messages"""
+async def get_chat_room(room_id: str, ctx = Depends(get_principal), read: Session = Depends(get_read_db),
+                        session: Session = Depends(get_db)):
+    """Get chat room with messages (อ่านจาก replica, mark-as-read เขียนที่ primary)"""
     user, _, _ = ctx
     
-    room = session.get(ChatRooms, room_id)
+    room = read.get(ChatRooms, room_id)
     if not room:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat room not found")
     
@@ -298,11 +293,11 @@ async def get_chat_room(room_id: str, ctx = Depends(get_current_user), session:
         .where(ChatMessages.room_id == room_id)
         .order_by(ChatMessages.created_at)
     )
-    messages = session.scalars(messages_stmt).all()
+    messages = read.scalars(messages_stmt).all()
     
     # Get user and senior names
-    room_user = session.get(Users, room.user_id)
-    room_senior = session.get(SeniorUsers, room.senior_id)
+    room_user = read.get(Users, room.user_id)
+    room_senior = read.get(SeniorUsers, room.senior_id)
     
     # Build message responses
     message_responses = []
@@ -359,7 +354,7 @@ async def get_chat_room(room_id: str, ctx = Depends(get_current_user), session:
 async def send_message(
     room_id: str,
     payload: ChatMessageCreate,
-    ctx = Depends(get_current_user),
+    ctx = Depends(get_principal),
     session: Session = Depends(get_db)
 ):
     """Send a message to chat room (REST API - also works with WebSocket)"""
@@ -421,7 +416,7 @@ async def send_message(
     return message_out
 
 @router.post("/jobs/{job_id}/room", response_model=ChatRoomOut)
-async def create_or_get_chat_room(job_id: int, ctx = Depends(get_current_user), session: Session = Depends(get_db)):
+async def create_or_get_chat_room(job_id: int, ctx = Depends(get_principal), session: Session = Depends(get_db)):
     """Create or get chat room for a job (when status is 1)"""
     user, _, _ = ctx
     
@@ -448,7 +443,7 @@ async def create_or_get_chat_room(job_id: int, ctx = Depends(get_current_user),
     )
 
 @router.get("/rooms/{room_id}/online-users")
-async def get_online_users(room_id: str, ctx = Depends(get_current_user), session: Session = Depends(get_db)):
+async def get_online_users(room_id: str, ctx = Depends(get_principal), session: Session = Depends(get_db)):
     """Get list of online users in a chat room"""
     user, _, _ = ctx
     
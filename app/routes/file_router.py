@@ -2,11 +2,12 @@ from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status,
 from fastapi.responses import FileResponse
 from sqlalchemy import update
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List
 import os
 from pathlib import Path
 
-from ..utils.deps import get_current_user, get_db
+from ..utils.deps import get_db, get_principal, get_read_db
+from ..services.principal_cache import principal_cache
 from ..utils.schemas import FileUploadResponse, FileOut
 from ..utils.file_upload import (
     validate_file, save_uploaded_file, delete_file, get_file_url, 
@@ -23,7 +24,7 @@ async def upload_file(
     file: UploadFile = File(...),
     is_profile_image: bool = Query(False, description="Set as profile image"),
     db: Session = Depends(get_db),
-    auth_data = Depends(get_current_user)
+    auth_data = Depends(get_principal)
 ):
     """Upload a file"""
     try:
@@ -85,6 +86,8 @@ async def upload_file(
                     senior_profile.profile_image_id = db_file.id
         
         db.commit()
+        if is_profile_image:
+            await principal_cache.invalidate(current_user.role, [current_user.id])
         
         # Generate file URL
         file_url = get_file_url(file_path)
@@ -124,8 +127,8 @@ async def upload_file(
 async def get_my_files(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db),
-    auth_data = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    auth_data = Depends(get_principal)
 ):
     """Get current user's files"""
     from sqlalchemy import select
@@ -157,8 +160,8 @@ async def get_my_files(
 @router.get("/{file_id}", response_model=FileOut)
 async def get_file_info(
     file_id: int,
-    db: Session = Depends(get_db),
-    auth_data = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    auth_data = Depends(get_principal)
 ):
     """Get file information"""
     current_user = auth_data[0]  # Extract user from tuple
@@ -200,7 +203,7 @@ async def get_file_info(
 async def download_file(
     category: str,
     filename: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Download/serve file"""
     file_path = UPLOAD_DIR / category / filename
@@ -238,7 +241,7 @@ async def download_file(
 async def delete_file_endpoint(
     file_id: int,
     db: Session = Depends(get_db),
-    auth_data = Depends(get_current_user)
+    auth_data = Depends(get_principal)
 ):
     """Delete a file"""
     current_user = auth_data[0]  # Extract user from tuple
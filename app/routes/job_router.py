@@ -7,7 +7,7 @@ from ..database.models.jobs import Jobs
 from ..database.models.chats import ChatRooms
 
 from ..utils.schemas import JobPayload
-from ..utils.deps import get_db, get_current_user
+from ..utils.deps import get_db, get_principal
 
 router = APIRouter(prefix="/job", tags=["job"])
 
@@ -28,13 +28,13 @@ async def auto_create_chat_room(job: Jobs, session: Session):
             session.flush()
 
 @router.get("/{job_id}")
-async def get_job(job_id: int, session: Session = Depends(get_db), ctx = Depends(get_current_user)):
+async def get_job(job_id: int, session: Session = Depends(get_db), ctx = Depends(get_principal)):
     q = session.query(Jobs).where(Jobs.id == job_id)
     rows = q.all()
     return rows
 
 @router.post("")
-async def create_job(payload: JobPayload, session: Session = Depends(get_db), ctx = Depends(get_current_user)):
+async def create_job(payload: JobPayload, session: Session = Depends(get_db), ctx = Depends(get_principal)):
     user, _, _ = ctx
     payload.user_id = user.id
     payload.updated_at = datetime.now()
@@ -61,7 +61,7 @@ async def create_job(payload: JobPayload, session: Session = Depends(get_db), ct
     return job
 
 @router.patch("")
-async def update_job(payload: JobPayload, session: Session = Depends(get_db), ctx = Depends(get_current_user)):
+async def update_job(payload: JobPayload, session: Session = Depends(get_db), ctx = Depends(get_principal)):
     user, _, _ = ctx
     payload.user_id = user.id
     payload.updated_at = datetime.now()
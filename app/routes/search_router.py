@@ -1,117 +1,307 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 
-from fastapi.concurrency import run_in_threadpool
-from numpy import sort
+import hashlib
+import numpy as np
+import time
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..utils.score import setScore
+from ..utils.ranking import RankProfile, fuse_rrf, get_profile, rank, ring_radii
 
-from ..services.user import getUser_by_ability_id, getUser_by_id
+from ..services.search import SearchFilters, lexical_candidates, matching_ids, vector_candidates
+from ..services.online_index import online_index
+from ..services import search_cache, search_pages
+from ..services.principal_cache import principal_cache
 
-from ..database.redis import get_loc, get_locations_batch, online_ids
+from ..database.db import DB
+from ..database.redis import nearby_online, nearby_online_rings, presence_stats
 
 from ..database.models.senior_users import SeniorAbilities, SeniorUsers
 
-from ..utils.embedder import embed_query
+from ..utils.embed_cache import cache_stats, cached_embed_many, query_key
+from ..utils.embed_batcher import batcher
 
-from ..utils.deps import get_current_user, get_db
-from ..utils.schemas import SearchOut, SearchPayload
+from ..utils.config import HYBRID_SEARCH, LEXICAL_K, ONLINE_INDEX_ENABLED
+from ..utils.deps import get_async_read_db, get_principal, require_ops
+from ..utils.schemas import BatchSearchOut, BatchSearchPayload, SearchOut, SearchPayload
 
 router = APIRouter(prefix="/search", tags=["search"])
 
-@router.post("")
-async def Search(payload: SearchPayload, ctx = Depends(get_current_user), session: Session = Depends(get_db)):
-    user, _, _ = ctx
+# จำนวนครั้งของ adaptive search แยกตามจำนวน ring ที่ค้น (ใช้ปรับ ADAPTIVE_RADII_M)
+_ring_stats: Dict[int, int] = {}
+
+def _vector_legs(session: Session, qvecs: List[List[float]], senior_ids: List[str], k: int, filters: Optional[SearchFilters]):
+    """
+    pgvector leg ของทุกคำค้นใน transaction เดียว (ANN settings แบบ SET LOCAL ใช้ร่วมกัน); เรียกผ่าน AsyncSession.run_sync
+    เรียงตาม sim อีกครั้งเพราะ iterative scan แบบ relaxed_order อาจคืนลำดับคลาดเล็กน้อย (RRF ใช้ลำดับนี้)
+    """
+    DB.apply_vector_search_settings(session, k)
+    return [
+        sorted(vector_candidates(session, qvec, senior_ids, k, filters), key=lambda r: r.sim, reverse=True)
+        for qvec in qvecs
+    ]
+
+async def _retrieve_many(session: AsyncSession, queries: List[str], lat: float, lng: float, range: int, k: int, adaptive: bool = False, filters: Optional[SearchFilters] = None):
+    """
+    ผู้สมัคร top-k ภายในรัศมีของแต่ละคำค้น: [[(record, sim, {"id", "lat", "lng", ...})], ...]
+    ทุกคำค้นใช้ชุด senior ออนไลน์ชุดเดียวกัน (ดึงครั้งเดียว) และ embed ใน forward pass เดียว
+    HYBRID_SEARCH: รวม vector leg กับ lexical leg (trigram) ด้วย RRF เพื่อเลือก top-k เท่านั้น; คะแนนยังเป็น cosine sim
+    adaptive: ขยายรัศมีเป็น ring (ring_radii) จนมี senior อย่างน้อย k คน แล้วส่งเฉพาะชุดนั้นไปคำนวณ similarity
+    filters: vehicle/offsite_work/type กรองก่อนเลือก top-k (ใน index หรือใน WHERE ของ SQL)
+    คืน (ผลต่อคำค้น, จำนวน ring ที่ค้น หรือ None ถ้าไม่ใช่ adaptive)
+    """
+    qvecs = await cached_embed_many(queries)
+    rings = None
     
+    if ONLINE_INDEX_ENABLED and online_index.ready:
+        # vector leg จาก index ใน process: ไม่แตะ Postgres/Redis
+        if adaptive:
+            range, rings = online_index.ring_radius(lat, lng, ring_radii(range), k, filters)
+        results = online_index.search_many(qvecs, lat, lng, range, k, filters)
+        if not HYBRID_SEARCH:
+            return results, rings
+        nearby = online_index.nearby(lat, lng, range, filters)
+    else:
+        if adaptive:
+            keep = None
+            if filters is not None and filters.active():
+                keep = lambda ids: session.run_sync(matching_ids, ids, filters)
+            found, range, rings = await nearby_online_rings(lat, lng, ring_radii(range), k, keep)
+        else:
+            found = await nearby_online(lat, lng, range)
+        nearby = {x['id']: x for x in found}
+        results = []
+        for rows in await session.run_sync(_vector_legs, qvecs, list(nearby), k, filters):
+            # พิกัดมาจาก GEOSEARCH แล้ว ไม่ต้อง GET ต่อคน
+            results.append([(r, r.sim, nearby[r.senior_id]) for r in rows if r.senior_id in nearby])
+        if not HYBRID_SEARCH:
+            return results, rings
+    
+    fused = []
+    for query, qvec, hits in zip(queries, qvecs, results):
+        rows = await session.run_sync(lexical_candidates, query, qvec, list(nearby), LEXICAL_K, filters)
+        lexical = [(r, r.sim, nearby[r.senior_id]) for r in rows if r.senior_id in nearby]
+        fused.append(fuse_rrf([hits, lexical], k))
+    return fused, rings
+
+async def _retrieve(session: AsyncSession, query: str, lat: float, lng: float, range: int, k: int, adaptive: bool = False, filters: Optional[SearchFilters] = None):
+    results, rings = await _retrieve_many(session, [query], lat, lng, range, k, adaptive, filters)
+    return results[0], rings
+
+def _record_rings(rings: Optional[int]) -> None:
+    if rings is not None:
+        _ring_stats[rings] = _ring_stats.get(rings, 0) + 1
+
+def _ranked(hits, lat: float, lng: float, range: int, profile: RankProfile, k: int) -> SearchOut:
+    """จัดอันดับผู้สมัครด้วยพิกัดจริงของผู้ค้นหาแล้วแปลงเป็น SearchOut"""
+    sims = np.fromiter((h[1] for h in hits), dtype=np.float64, count=len(hits))
+    lats = np.fromiter((h[2]['lat'] for h in hits), dtype=np.float64, count=len(hits))
+    lngs = np.fromiter((h[2]['lng'] for h in hits), dtype=np.float64, count=len(hits))
+    ratings = None
+    if profile.beta:
+        # rating มากับ row ของผู้สมัครแล้ว (outer join senior_ratings) ไม่ต้อง query เพิ่ม
+        ratings = np.fromiter((np.nan if h[0].rating is None else h[0].rating for h in hits), dtype=np.float64, count=len(hits))
+    order, scores, dists = rank(sims, lats, lngs, lat, lng, range, profile, k, ratings)
+    
+    out = []
+    for i in order:
+        r = hits[i][0]
+        out.append({
+            "id": r.senior_id,
+            "type": r.type,
+            "career": r.career,
+            "other_ability": r.other_ability,
+            "vehicle": r.vehicle,
+            "offsite_work": r.offsite_work,
+            "rating": r.rating,
+            "score": float(scores[i]),
+            "distance": float(dists[i])
+        })
+    return SearchOut(count=len(out), list=out)
+
+def _check_search(user, profile_name: Optional[str]) -> RankProfile:
     if user.role != "user":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Only user can use a search -> {user.role}")
+    try:
+        return get_profile(profile_name)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def _decode_cursor(cursor: str, qkey: str) -> dict:
+    try:
+        state = search_pages.decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if state.get("q") != qkey:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor does not belong to this query")
+    return state
+
+@router.post("")
+async def Search(payload: SearchPayload, ctx = Depends(get_principal), session: AsyncSession = Depends(get_async_read_db)):
+    """
+    page_size: แบ่งผลเป็นหน้า ผลที่จัดอันดับแล้วทั้งชุดถูกเก็บเป็น snapshot ใน Redis
+    cursor: หน้าถัดไปอ่านจาก snapshot โดยไม่ค้นใหม่ (snapshot หมดอายุ = จัดอันดับใหม่แล้วต่อหลัง (score/distance, id) สุดท้าย)
+    cursor ผูกกับคำค้นทั้งชุด (keyword, ตำแหน่ง, range, filters ฯลฯ) ใช้ข้ามคำค้นไม่ได้
+    """
+    user, _, _ = ctx
+    profile = _check_search(user, payload.profile)
+    
+    qkey = _search_qkey(payload)
+    if payload.cursor:
+        state = _decode_cursor(payload.cursor, qkey)
+        items = await search_pages.load(user.id, state.get("sid"))
+        if items is not None:
+            start = state["pos"]
+        else:
+            out = await _search(session, payload, profile)
+            items = search_pages.ordered(out.list)
+            start = search_pages.resume_index(items, state)
+            state["sid"] = await search_pages.save(user.id, items)
+            state["rings"] = out.rings
+        chunk, next_cursor = search_pages.page(items, start, state["size"], state)
+        return SearchOut(count=len(chunk), list=chunk, rings=state.get("rings"), next_cursor=next_cursor)
     
+    out = await _search(session, payload, profile)
+    if not payload.page_size:
+        return out
+    items = search_pages.ordered(out.list)
+    state = {"sid": await search_pages.save(user.id, items), "q": qkey, "rings": out.rings}
+    chunk, next_cursor = search_pages.page(items, 0, payload.page_size, state)
+    return SearchOut(count=len(chunk), list=chunk, rings=out.rings, next_cursor=next_cursor)
+
+def _search_qkey(payload: SearchPayload) -> str:
+    """ตัวระบุคำค้นของ cursor: keyword (หลัง normalize) + ตำแหน่ง + range/top_k/profile/adaptive + filters"""
+    filters = SearchFilters(payload.vehicle, payload.offsite_work, payload.type)
+    raw = (f"{query_key(payload.keyword)}|{payload.lat:.6f},{payload.lng:.6f}|{payload.range}|{payload.top_k}"
+           f"|{payload.profile or ''}|{int(payload.adaptive)}|{filters.key()}")
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+async def _search(session: AsyncSession, payload: SearchPayload, profile: RankProfile) -> SearchOut:
     query = payload.keyword
     lat = payload.lat
     lng = payload.lng
     k = payload.top_k
     range = payload.range
     
-    online_list = await online_ids()
-    q = session.query(SeniorUsers).where(SeniorUsers.id.in_(online_list))
-    rows = q.all()
+    adaptive = payload.adaptive
+    filters = SearchFilters(payload.vehicle, payload.offsite_work, payload.type)
     
-    qvec = embed_query(query)
-    q = (
-            session.query(
-                SeniorAbilities, 
-                1 - SeniorAbilities.embedding.cosine_distance(qvec).label("sim")
-            )
-            .where(SeniorAbilities.id.in_([x.ability_id for x in rows]))
-            .order_by(SeniorAbilities.embedding.cosine_distance(qvec))
-            .limit(k)
-        )
-    rows = q.all()
+    t0 = time.perf_counter()
+    hits = await search_cache.get(query, lat, lng, range, k, profile, adaptive, filters)
+    cached = hits is not None
+    rings = 0 if adaptive else None
+    if not cached:
+        hits, rings = await _retrieve(session, query, lat, lng, range, k, adaptive, filters)
+        await search_cache.put(query, lat, lng, range, k, profile, hits, adaptive, filters)
+        _record_rings(rings)
+    search_cache.record(cached, (time.perf_counter() - t0) * 1e3)
     
-    print(rows)
+    out = _ranked(hits, lat, lng, range, profile, k)
+    out.rings = rings
+    return out
+
+@router.post("/batch")
+async def search_batch(payload: BatchSearchPayload, ctx = Depends(get_principal), session: AsyncSession = Depends(get_async_read_db)):
+    """
+    หลายคำค้น (เช่น tile หมวดหมู่บนหน้าแรก) ที่ตำแหน่ง/รัศมีเดียวกันใน request เดียว
+    คืน SearchOut ต่อคำค้นตามลำดับของ keywords
+    """
+    user, _, _ = ctx
+    profile = _check_search(user, payload.profile)
     
-    out = []
-    for r,sim in rows:
-        print(r)
-        user = getUser_by_ability_id(r.id, session)
-        location = await get_loc(user.id)
-        
-        if location is None:
-            pass
-        
-        from haversine import haversine
-        
-        dist = haversine((lat, lng),(location['lat'], location['lng']), unit="m")
-        
-        score = setScore(sim, dist, 0.7, range)
-        data = {
-            "id": user.id,
-            "type": r.type,
-            "career": r.career,
-            "other_ability": r.other_ability,
-            "vehicle": r.vehicle,
-            "offsite_work": r.offsite_work,
-            "score": score,
-            "distance": dist
-        }
-        
-        
-        out.append(data)
-    def over05(x):
-        return x['score'] >= 0.5
-    def below05(x):
-        return x['score'] < 0.5
-    def range_filter(x):
-        return x['distance'] <= range
-    filtered_out = list(filter(range_filter, out))
-    out_over05 = sorted(list(filter(over05, filtered_out)), key=lambda x: x['score'], reverse=True)
-    out_below05 = sorted(list(filter(below05, filtered_out)), key=lambda x: x['distance'])
-    out = [*out_over05, *out_below05]
-    return SearchOut(count=len(out), list=out)
+    lat = payload.lat
+    lng = payload.lng
+    k = payload.top_k
+    range = payload.range
+    
+    adaptive = payload.adaptive
+    filters = SearchFilters(payload.vehicle, payload.offsite_work, payload.type)
+    
+    t0 = time.perf_counter()
+    results = await search_cache.get_many(payload.keywords, lat, lng, range, k, profile, adaptive, filters)
+    misses = [i for i, hits in enumerate(results) if hits is None]
+    rings = 0 if adaptive else None
+    if misses:
+        fetched, rings = await _retrieve_many(session, [payload.keywords[i] for i in misses], lat, lng, range, k, adaptive, filters)
+        for i, hits in zip(misses, fetched):
+            results[i] = hits
+        await search_cache.put_many({payload.keywords[i]: results[i] for i in misses}, lat, lng, range, k, profile, adaptive, filters)
+        _record_rings(rings)
+    # เวลาเฉลี่ยต่อคำค้น เพื่อให้เทียบกับ /search เดี่ยวได้
+    elapsed = (time.perf_counter() - t0) * 1e3 / max(len(results), 1)
+    missed = set(misses)
+    for i, _ in enumerate(results):
+        search_cache.record(i not in missed, elapsed)
+    
+    return BatchSearchOut(
+        count=len(results),
+        results=[_ranked(hits, lat, lng, range, profile, k) for hits in results],
+        rings=rings,
+    )
+
+@router.get("/stats", dependencies=[Depends(require_ops)])
+async def search_stats():
+    return {
+        "embedding_cache": cache_stats(),
+        "embedding_batcher": batcher.stats(),
+        "online_index": online_index.stats(),
+        "presence": presence_stats(),
+        "result_cache": search_cache.stats(),
+        "adaptive_rings": dict(sorted(_ring_stats.items())),
+        "principal_cache": principal_cache.stats(),
+    }
 
 @router.get("/nearby")
-async def search_nearby(lat: float, lng: float, range: int = 10000,ctx = Depends(get_current_user), session: Session = Depends(get_db)):
-    out = []
+async def search_nearby(lat: float, lng: float, range: int = 10000, limit: Optional[int] = Query(None, ge=1, le=500),
+                        cursor: Optional[str] = None, ctx = Depends(get_principal), session: AsyncSession = Depends(get_async_read_db)):
+    """
+    senior ออนไลน์ในรัศมีเรียงตามระยะทาง
+    limit: แบ่งเป็นหน้า (มี next_cursor); cursor: หน้าถัดไปจาก snapshot เดิม (ไม่มี limit = คืนทั้งหมดแบบเดิม)
+    """
     user, _, _ = ctx
     
     if user.role != "user":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Only user can use a search -> {user.role}")
     
-    online_list = await online_ids()
-    online_loc_lst = [await get_loc(x) for x in online_list]
+    qkey = f"nearby:{lat:.6f},{lng:.6f},{range}"
+    if cursor:
+        state = _decode_cursor(cursor, qkey)
+        items = await search_pages.load(user.id, state.get("sid"))
+        if items is not None:
+            start = state["pos"]
+        else:
+            items = search_pages.ordered(await _nearby(session, lat, lng, range))
+            start = search_pages.resume_index(items, state)
+            state["sid"] = await search_pages.save(user.id, items)
+        chunk, next_cursor = search_pages.page(items, start, state["size"], state)
+        return SearchOut(count=len(chunk), list=chunk, next_cursor=next_cursor)
     
-    q = session.query(SeniorUsers).where(SeniorUsers.id.in_(online_list))
-    rows = q.all()
+    out = await _nearby(session, lat, lng, range)
+    if not limit:
+        return SearchOut(count=len(out), list=out)
+    out = search_pages.ordered(out)
+    state = {"sid": await search_pages.save(user.id, out), "q": qkey}
+    chunk, next_cursor = search_pages.page(out, 0, limit, state)
+    return SearchOut(count=len(chunk), list=chunk, next_cursor=next_cursor)
+
+async def _nearby(session: AsyncSession, lat: float, lng: float, range: int) -> list:
+    out = []
+    nearby = await nearby_online(lat, lng, range)
     
-    from haversine import haversine
-    def filter_by_range(x):
-        return haversine((lat,lng), (x['lat'], x['lng']), unit="m") <= range
-    filterd_lst = list(filter(filter_by_range, online_loc_lst))
+    q = (
+            select(SeniorUsers.id, SeniorAbilities)
+            .join(SeniorAbilities, SeniorAbilities.id == SeniorUsers.ability_id)
+            .where(SeniorUsers.id.in_([x['id'] for x in nearby]))
+        )
+    abilities = {uid: a for uid, a in (await session.execute(q)).all()}
     
-    ids: list[str] = [x.ability_id for x in rows]
-    q = session.query(SeniorAbilities).where(SeniorAbilities.id.in_(ids))
-    rows = q.all()
-    for r, usr in zip(rows, filterd_lst):
+    # nearby เรียงตามระยะทางจาก GEOSEARCH แล้ว
+    for usr in nearby:
+        r = abilities.get(usr['id'])
+        if r is None:
+            continue
         data = {
             "id": usr['id'],
             "type": r.type,
@@ -119,8 +309,7 @@ async def search_nearby(lat: float, lng: float, range: int = 10000,ctx = Depends
             "other_ability": r.other_ability,
             "vehicle": r.vehicle,
             "offsite_work": r.offsite_work,
-            "distance": haversine((lat,lng), (usr['lat'], usr['lng']), unit="m")
+            "distance": usr['distance']
         }
         out.append(data)
-    out = sorted(out, key=lambda x: x['distance'])
-    return SearchOut(count=len(out), list=out)
\ No newline at end of file
+    return out
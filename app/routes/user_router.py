@@ -1,19 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+import json
+import logging
 
-from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from ..database.models.senior_users import SeniorAbilities, SeniorProfiles, SeniorUsers
 
-from ..services.user import getAbility_by_id, getProfile_by_id, getUser_by_id, set_online
+from ..database.redis import claim_presence, set_presence_and_loc
+from ..services.principal_cache import principal_cache
+from ..services.user import getUser_by_id, set_offline, set_online
 
-from ..utils.deps import get_current_user, get_db
+from ..utils.config import PRESENCE_TTL_SECONDS
+from ..utils.deps import get_current_user, get_db, get_principal, get_read_db
+from .chat_router import get_user_from_token
 from ..utils.schemas import AbilityOut, HeartbeatIn, UserResponse, ProfileOut, UserOut
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/user", tags=["user"])
 
 @router.get("/me",  response_model=UserResponse)
-def get_me(ctx = Depends(get_current_user), session: Session = Depends(get_db)):
+def get_me(ctx = Depends(get_principal)):
     user, profile, ability = ctx
     return UserResponse(
         user=UserOut(
@@ -90,8 +96,12 @@ async def update_me(
             if payload.profile.phone:
                 db_profile.phone = payload.profile.phone
 
+    # commit ก่อน invalidate ไม่ให้ request อื่นโหลดค่าเดิมกลับเข้า principal cache
+    session.commit()
+    await principal_cache.invalidate(user.role, [user.id])
+
 @router.get("/{user_id}")
-async def get_user(user_id: str, ctx = Depends(get_current_user), session: Session = Depends(get_db)):
+async def get_user(user_id: str, ctx = Depends(get_principal), session: Session = Depends(get_read_db)):
     user: SeniorUsers | None = getUser_by_id(user_id, session)
     if user is None : raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     profile: SeniorProfiles = user.profile
@@ -131,14 +141,59 @@ async def get_user(user_id: str, ctx = Depends(get_current_user), session: Sessi
 @router.post("/set-online", status_code=status.HTTP_204_NO_CONTENT)
 async def heartbeat(
     payload: HeartbeatIn,
-    ctx = Depends(get_current_user),
+    ctx = Depends(get_principal),
 ):
     user, _, _ = ctx
     if user.role != "senior_user":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only senior_user can send heartbeat")
     
-    from ..database.redis import PRESENCE_TTL_SECONDS
     await set_online(user, payload.lat, payload.lng, PRESENCE_TTL_SECONDS)
 
     return
 
+def _parse_location_frame(data: str) -> HeartbeatIn:
+    """frame แบบย่อ "lat,lng" หรือ JSON {"lat": .., "lng": ..}"""
+    if data.lstrip().startswith("{"):
+        return HeartbeatIn.model_validate(json.loads(data))
+    lat, lng = data.split(",")
+    return HeartbeatIn(lat=float(lat), lng=float(lng))
+
+@router.websocket("/ws/presence")
+async def presence_ws(websocket: WebSocket):
+    """
+    presence channel ของ senior: ยืนยันตัวตนครั้งเดียวตอนเชื่อมต่อ แล้วส่ง frame ตำแหน่งต่อเนื่อง
+    แต่ละ frame = presence refresh 1 ครั้ง (Redis write เดียว); หลุดการเชื่อมต่อ = offline ทันที
+    """
+    token = websocket.query_params.get("token")
+    if not token:
+        await websocket.close(code=4001, reason="Missing token")
+        return
+    
+    user = await get_user_from_token(token)
+    if not user:
+        await websocket.close(code=4001, reason="Invalid token")
+        return
+    if user.role != "senior_user":
+        await websocket.close(code=4003, reason="Only senior_user can send heartbeat")
+        return
+    user_id = user.id
+    
+    await websocket.accept()
+    conn_token = None
+    try:
+        conn_token = await claim_presence(user_id)
+        while True:
+            data = await websocket.receive_text()
+            try:
+                loc = _parse_location_frame(data)
+                await set_presence_and_loc(user_id, loc.lat, loc.lng, PRESENCE_TTL_SECONDS)
+            except ValueError:
+                await websocket.send_text(json.dumps({"type": "error", "detail": "Invalid location frame"}))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Presence WebSocket error for senior {user_id}: {e}")
+    finally:
+        # reconnect อาจ claim ไปแล้ว: ล้าง presence เฉพาะเมื่อ connection นี้ยังเป็นเจ้าของ
+        if conn_token is not None:
+            await set_offline(user_id, conn_token)
@@ -0,0 +1,299 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from ..database.db import db as DBInstance
+from ..database.redis import PRESENCE_CHANNEL, get_locations_batch, get_redis, online_ids
+from ..utils.config import ONLINE_INDEX_SYNC_SECONDS
+from ..utils.embedder import STORE_DIM, as_float32
+from ..utils.ranking import haversine_m
+from .search import IndexedSenior, SearchFilters, load_abilities
+
+logger = logging.getLogger(__name__)
+
+Hit = Tuple[IndexedSenior, float, Dict]
+
+def _load(senior_ids: Sequence[str]) -> List[Tuple[IndexedSenior, np.ndarray]]:
+    with DBInstance.session() as session:
+        rows = load_abilities(session, senior_ids)
+        return [(IndexedSenior(*row[:-1]), as_float32(row[-1])) for row in rows]
+
+class OnlineIndex:
+    """
+    index ใน process ของ senior ที่ออนไลน์อยู่เท่านั้น
+    เก็บ embedding (normalized) เป็น float32 matrix ต่อเนื่อง + พิกัด เพื่อหา top-k ด้วย matrix-vector product ครั้งเดียว
+    ซิงก์ระหว่าง worker ผ่าน Redis pub/sub (PRESENCE_CHANNEL) และ reconcile กับ presence เป็นระยะ
+    ทุกการแก้ไขเกิดบน event loop จึงไม่ต้องใช้ lock
+    """
+    def __init__(self, dim: int = STORE_DIM, capacity: int = 1024):
+        self.dim = dim
+        self._emb = np.zeros((capacity, dim), dtype=np.float32)
+        self._lat = np.zeros(capacity, dtype=np.float64)
+        self._lng = np.zeros(capacity, dtype=np.float64)
+        self._meta: List[IndexedSenior] = []
+        self._pos: Dict[str, int] = {}
+        self._pending: Dict[str, Tuple[float, float]] = {}
+        # pid ที่กำลังโหลดจาก DB และ pid ที่ offline ระหว่างโหลด (ห้าม upsert กลับเข้า index)
+        self._loading: set = set()
+        self._dropped: set = set()
+        self._wake = asyncio.Event()
+        self._reconcile_now = False
+        self._tasks: List[asyncio.Task] = []
+        self._errors = 0
+        self._last_error: Optional[str] = None
+        self.ready = False
+
+    @property
+    def size(self) -> int:
+        return len(self._meta)
+
+    def __contains__(self, pid: str) -> bool:
+        return pid in self._pos
+
+    # -------- mutation --------
+    def _grow(self) -> None:
+        cap = self._emb.shape[0] * 2
+        self._emb = np.resize(self._emb, (cap, self.dim))
+        self._lat = np.resize(self._lat, cap)
+        self._lng = np.resize(self._lng, cap)
+
+    def upsert(self, meta: IndexedSenior, emb: np.ndarray, lat: float, lng: float) -> None:
+        i = self._pos.get(meta.senior_id)
+        if i is None:
+            if self.size == self._emb.shape[0]:
+                self._grow()
+            i = self.size
+            self._pos[meta.senior_id] = i
+            self._meta.append(meta)
+        else:
+            self._meta[i] = meta
+        norm = np.linalg.norm(emb)
+        self._emb[i] = emb / norm if norm else emb
+        self._lat[i] = lat
+        self._lng[i] = lng
+
+    def move(self, pid: str, lat: float, lng: float) -> bool:
+        i = self._pos.get(pid)
+        if i is None:
+            return False
+        self._lat[i] = lat
+        self._lng[i] = lng
+        return True
+
+    def remove(self, pid: str) -> None:
+        """ลบแบบ swap-with-last ให้ matrix ต่อเนื่องเสมอ"""
+        i = self._pos.pop(pid, None)
+        if i is None:
+            return
+        last = self.size - 1
+        if i != last:
+            self._emb[i] = self._emb[last]
+            self._lat[i] = self._lat[last]
+            self._lng[i] = self._lng[last]
+            self._meta[i] = self._meta[last]
+            self._pos[self._meta[i].senior_id] = i
+        self._meta.pop()
+
+    # -------- query --------
+    def _loc(self, i: int, dist: float) -> Dict:
+        return {"id": self._meta[i].senior_id, "lat": float(self._lat[i]), "lng": float(self._lng[i]), "distance": float(dist)}
+
+    def _filter(self, idx: np.ndarray, filters: Optional[SearchFilters]) -> np.ndarray:
+        if filters is None or not filters.active():
+            return idx
+        keep = np.fromiter((filters.matches(self._meta[i]) for i in idx), dtype=bool, count=idx.size)
+        return idx[keep]
+
+    def nearby(self, lat: float, lng: float, range_m: float, filters: Optional[SearchFilters] = None) -> Dict[str, Dict]:
+        """senior ในรัศมี range_m: {senior_id: {"id", "lat", "lng", "distance"}} (รูปแบบเดียวกับ nearby_online)"""
+        n = self.size
+        if n == 0:
+            return {}
+        dists = haversine_m(lat, lng, self._lat[:n], self._lng[:n])
+        idx = self._filter(np.flatnonzero(dists <= range_m), filters)
+        return {self._meta[i].senior_id: self._loc(i, dists[i]) for i in idx}
+
+    def ring_radius(self, lat: float, lng: float, radii: Sequence[float], k: int, filters: Optional[SearchFilters] = None) -> Tuple[float, int]:
+        """
+        adaptive radius: ring แรกตาม radii ที่มี senior (ที่ผ่าน filters) อย่างน้อย k คน (หรือ ring สุดท้าย)
+        คืน (รัศมี, จำนวน ring ที่ตรวจ)
+        """
+        n = self.size
+        if n:
+            dists = haversine_m(lat, lng, self._lat[:n], self._lng[:n])
+            dists = dists[self._filter(np.arange(n), filters)]
+            for rings, radius in enumerate(radii, start=1):
+                if np.count_nonzero(dists <= radius) >= k:
+                    return radius, rings
+        return radii[-1], len(radii)
+
+    def search(self, qvec: Sequence[float], lat: float, lng: float, range_m: float, k: int, filters: Optional[SearchFilters] = None) -> List[Hit]:
+        """
+        top-k ตาม cosine similarity ของ senior ที่อยู่ในรัศมี range_m (และผ่าน filters)
+        คืน [(IndexedSenior, sim, {"id", "lat", "lng", "distance"})] เรียงตาม sim มากไปน้อย
+        """
+        return self.search_many([qvec], lat, lng, range_m, k, filters)[0]
+
+    def search_many(self, qvecs: Sequence[Sequence[float]], lat: float, lng: float, range_m: float, k: int, filters: Optional[SearchFilters] = None) -> List[List[Hit]]:
+        """
+        search หลายคำค้นที่ใช้ตำแหน่ง/รัศมีเดียวกัน: คำนวณระยะทางครั้งเดียว และ similarity ด้วย matrix product ครั้งเดียว
+        """
+        n = self.size
+        out: List[List[Hit]] = [[] for _ in qvecs]
+        if n == 0 or k <= 0 or not qvecs:
+            return out
+        dists = haversine_m(lat, lng, self._lat[:n], self._lng[:n])
+        idx = self._filter(np.flatnonzero(dists <= range_m), filters)
+        if idx.size == 0:
+            return out
+        q = np.asarray(qvecs, dtype=np.float32)
+        norms = np.linalg.norm(q, axis=1, keepdims=True)
+        q = q / np.where(norms == 0, 1.0, norms)
+        sims = self._emb[idx] @ q.T
+        for col, hits in enumerate(out):
+            s = sims[:, col]
+            if k < idx.size:
+                part = np.argpartition(-s, k - 1)[:k]
+            else:
+                part = np.arange(idx.size)
+            part = part[np.argsort(-s[part], kind="stable")]
+            for j in part:
+                i = idx[j]
+                hits.append((self._meta[i], float(s[j]), self._loc(i, dists[i])))
+        return out
+
+    # -------- sync --------
+    def apply_event(self, event: Dict) -> None:
+        op = event.get("op")
+        if op == "up":
+            pid = event["id"]
+            if not self.move(pid, event["lat"], event["lng"]):
+                self._pending[pid] = (event["lat"], event["lng"])
+                self._wake.set()
+        elif op == "down":
+            for pid in event.get("ids", []):
+                self.remove(pid)
+                self._pending.pop(pid, None)
+                if pid in self._loading:
+                    self._dropped.add(pid)
+        elif op == "refresh":
+            # ability/embedding เปลี่ยน: โหลดใหม่ถ้ายังออนไลน์
+            for pid in event.get("ids", []):
+                i = self._pos.get(pid)
+                if i is not None:
+                    self._pending[pid] = (float(self._lat[i]), float(self._lng[i]))
+            self._wake.set()
+
+    async def _load_pending(self) -> None:
+        """
+        โหลด embedding ของ pid ที่รออยู่ ระหว่างรอ DB event ยังเข้ามาได้:
+        down ระหว่างโหลด = ไม่ upsert, up ระหว่างโหลด = ใช้พิกัดล่าสุดแทนของเดิม
+        """
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        self._loading, self._dropped = set(pending), set()
+        try:
+            loaded = await run_in_threadpool(_load, list(pending))
+        finally:
+            dropped, self._loading, self._dropped = self._dropped, set(), set()
+        for meta, emb in loaded:
+            pid = meta.senior_id
+            if pid in dropped:
+                continue
+            lat, lng = self._pending.pop(pid, pending[pid])
+            self.upsert(meta, emb, lat, lng)
+
+    async def reconcile(self) -> None:
+        """เทียบกับ presence ใน Redis: ลบคนที่หมดอายุ เติมคนที่ยังไม่มีใน index"""
+        online = set(await online_ids())
+        for pid in [pid for pid in self._pos if pid not in online]:
+            self.remove(pid)
+        missing = [pid for pid in online if pid not in self._pos]
+        if missing:
+            locs = await get_locations_batch(missing)
+            for pid, loc in locs.items():
+                self._pending.setdefault(pid, (float(loc["lat"]), float(loc["lng"])))
+        await self._load_pending()
+        self.ready = True
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.subscribe(PRESENCE_CHANNEL)
+                if not self.ready:
+                    # เพิ่งต่อใหม่หลังหลุด: event ระหว่างนั้นหายไป จึง reconcile ทันทีไม่ต้องรอรอบ
+                    self._reconcile_now = True
+                    self._wake.set()
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "message":
+                        continue
+                    try:
+                        self.apply_event(json.loads(msg["data"]))
+                    except Exception as e:
+                        logger.warning(f"Bad presence event {msg.get('data')!r}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # ขาดการเชื่อมต่อ: reconcile รอบถัดไปจะเติมส่วนที่พลาด
+                logger.warning(f"Presence listener error: {e}")
+                self.ready = False
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def _sync(self) -> None:
+        """
+        โหลด pid ที่รออยู่ทุกครั้งที่ถูกปลุก และ reconcile ตามกำหนดเวลาคงที่ทุก ONLINE_INDEX_SYNC_SECONDS
+        (การปลุกจาก event "up" ถี่ๆ เลื่อนรอบ reconcile ไม่ได้)
+        """
+        loop = asyncio.get_running_loop()
+        next_reconcile = loop.time()
+        while True:
+            if self._reconcile_now or loop.time() >= next_reconcile:
+                self._reconcile_now = False
+                try:
+                    await self.reconcile()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._errors += 1
+                    self._last_error = f"reconcile: {e!r}"
+                    logger.warning(f"Online index reconcile failed: {e}")
+                next_reconcile = loop.time() + ONLINE_INDEX_SYNC_SECONDS
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(next_reconcile - loop.time(), 0))
+                self._wake.clear()
+                await self._load_pending()
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._errors += 1
+                self._last_error = f"sync: {e!r}"
+                logger.warning(f"Online index sync failed: {e}")
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._sync())]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.ready = False
+
+    def stats(self) -> Dict:
+        return {"ready": self.ready, "size": self.size, "pending": len(self._pending),
+                "errors": self._errors, "last_error": self._last_error}
+
+# Global online index instance
+online_index = OnlineIndex()
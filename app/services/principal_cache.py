@@ -0,0 +1,186 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import inspect as sa_inspect
+
+from ..database.db import db as DBInstance
+from ..database.redis import get_redis
+from ..utils.config import PRINCIPAL_CACHE_REDIS, PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS
+from ..utils.embed_cache import LRUCache
+from .user import getPrincipal_by_id
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_CHANNEL = "principal:invalidate"
+
+# คอลัมน์ที่ไม่เก็บใน snapshot (ใหญ่และ handler ไม่ได้ใช้)
+_SKIP_COLUMNS = {"embedding", "search_text"}
+
+class Snapshot:
+    """สำเนาคอลัมน์ของแถว ORM แบบอ่านอย่างเดียว ไม่ผูกกับ session; อ่าน attribute ได้ชื่อเดียวกับ ORM object"""
+    __slots__ = ("_values",)
+
+    def __init__(self, values: Dict[str, Any]):
+        object.__setattr__(self, "_values", values)
+
+    @classmethod
+    def of(cls, obj: Any, **extra: Any) -> "Snapshot":
+        values = {a.key: getattr(obj, a.key) for a in sa_inspect(obj).mapper.column_attrs if a.key not in _SKIP_COLUMNS}
+        values.update(extra)
+        return cls(values)
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Snapshot is read-only: {name}")
+
+    def __repr__(self) -> str:
+        return f"Snapshot({self._values!r})"
+
+Principal = Tuple[Snapshot, Optional[Snapshot], Optional[Snapshot]]
+
+def principal_key(role: str, sub: str) -> str:
+    return f"principal:{role}:{sub}"
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    raise TypeError(f"Unserializable {type(value).__name__}")
+
+def _json_hook(obj: Dict) -> Any:
+    if len(obj) == 1 and "$dt" in obj:
+        return datetime.fromisoformat(obj["$dt"])
+    return obj
+
+def _dumps(principal: Principal) -> str:
+    return json.dumps([s._values if s is not None else None for s in principal], default=_json_default)
+
+def _loads(raw: str) -> Principal:
+    return tuple(Snapshot(v) if v is not None else None for v in json.loads(raw, object_hook=_json_hook))
+
+def _load(role: str, sub: str) -> Optional[Principal]:
+    with DBInstance.session() as session:
+        user = getPrincipal_by_id(role, sub, session)
+        if user is None:
+            return None
+        profile = user.profile
+        ability = user.ability if role == "senior_user" else None
+        return (
+            Snapshot.of(user, role=role),
+            Snapshot.of(profile) if profile is not None else None,
+            Snapshot.of(ability) if ability is not None else None,
+        )
+
+class PrincipalCache:
+    """
+    cache ของ (user, profile, ability) ต่อ (role, sub) ของ token เป็น Snapshot อ่านอย่างเดียว
+    L1 = LRU + TTL ใน process, L2 (PRINCIPAL_CACHE_REDIS) = Redis JSON ร่วมกันระหว่าง worker
+    invalidate() ลบทั้งสองชั้นและแจ้ง worker อื่นผ่าน pub/sub (PRINCIPAL_CHANNEL); TTL จำกัดความเก่าเมื่อ pub/sub หลุด
+    """
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: int = PRINCIPAL_CACHE_TTL_SECONDS, redis_tier: bool = PRINCIPAL_CACHE_REDIS):
+        self.ttl = ttl
+        self.redis_tier = redis_tier and ttl > 0
+        self._l1 = LRUCache(maxsize if ttl > 0 else 0, ttl)
+        # นับการ invalidate: ผลที่โหลดคร่อมการ invalidate จะไม่ถูกเก็บ (อาจเป็นค่าก่อน commit)
+        self._generation = 0
+        self._stats: Dict[str, int] = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "invalidations": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, role: str, sub: str) -> Optional[Principal]:
+        """snapshot ของผู้ใช้ (None ถ้าไม่พบในฐานข้อมูล)"""
+        key = principal_key(role, sub)
+        principal = self._l1.get(key)
+        if principal is not None:
+            self._stats["l1_hits"] += 1
+            return principal
+
+        generation = self._generation
+        if self.redis_tier:
+            try:
+                raw = await get_redis().get(key)
+            except Exception as e:
+                logger.warning(f"Principal cache read failed: {e}")
+                raw = None
+            if raw:
+                self._stats["l2_hits"] += 1
+                principal = _loads(raw)
+                if generation == self._generation:
+                    self._l1.put(key, principal)
+                return principal
+
+        self._stats["misses"] += 1
+        principal = await run_in_threadpool(_load, role, sub)
+        if principal is None or generation != self._generation:
+            return principal
+        self._l1.put(key, principal)
+        if self.redis_tier:
+            try:
+                await get_redis().set(key, _dumps(principal), ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"Principal cache write failed: {e}")
+        return principal
+
+    def _drop(self, keys: Iterable[str]) -> None:
+        self._generation += 1
+        for key in keys:
+            self._l1.pop(key)
+
+    async def invalidate(self, role: str, subs: Iterable[str]) -> None:
+        """เรียกหลัง commit การแก้ไข users/profiles/abilities ของผู้ใช้เหล่านี้"""
+        keys = [principal_key(role, sub) for sub in subs]
+        if not keys:
+            return
+        self._stats["invalidations"] += len(keys)
+        self._drop(keys)
+        try:
+            r = get_redis()
+            if self.redis_tier:
+                await r.delete(*keys)
+            await r.publish(PRINCIPAL_CHANNEL, json.dumps({"keys": keys}))
+        except Exception as e:
+            logger.warning(f"Principal cache invalidation failed: {e}")
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.subscribe(PRINCIPAL_CHANNEL)
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "message":
+                        continue
+                    try:
+                        self._drop(json.loads(msg["data"])["keys"])
+                    except Exception as e:
+                        logger.warning(f"Bad principal event {msg.get('data')!r}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Principal listener error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def start(self) -> None:
+        if self._task is None and self.ttl > 0:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {**self._stats, "size": len(self._l1)}
+
+# Global principal cache instance
+principal_cache = PrincipalCache()
@@ -0,0 +1,130 @@
+from typing import List, NamedTuple, Optional, Sequence, Set
+
+from sqlalchemy import Text, any_, bindparam, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from ..database.models.reviews import SeniorRatings
+from ..database.models.senior_users import SeniorAbilities, SeniorUsers
+
+class IndexedSenior(NamedTuple):
+    """field เดียวกับ row จาก vector_candidates (ไม่รวม sim)"""
+    senior_id: str
+    id: str
+    type: Optional[str]
+    career: Optional[str]
+    other_ability: Optional[str]
+    vehicle: Optional[bool]
+    offsite_work: Optional[bool]
+    rating: Optional[float] = None # Bayesian score จาก senior_ratings (None = ยังไม่มีรีวิว)
+
+class SearchFilters(NamedTuple):
+    """ตัวกรองแบบ structured ของ /search (None = ไม่กรอง field นั้น)"""
+    vehicle: Optional[bool] = None
+    offsite_work: Optional[bool] = None
+    type: Optional[str] = None
+
+    def active(self) -> bool:
+        return any(v is not None for v in self)
+
+    def clauses(self):
+        """เงื่อนไข SQL บน SeniorAbilities (ใช้ก่อน LIMIT)"""
+        return [getattr(SeniorAbilities, f) == v for f, v in self._asdict().items() if v is not None]
+
+    def matches(self, r) -> bool:
+        return all(getattr(r, f) == v for f, v in self._asdict().items() if v is not None)
+
+    def key(self) -> str:
+        return ",".join("" if v is None else str(v) for v in self)
+
+def _ability_columns():
+    return (
+        SeniorUsers.id.label("senior_id"),
+        SeniorAbilities.id,
+        SeniorAbilities.type,
+        SeniorAbilities.career,
+        SeniorAbilities.other_ability,
+        SeniorAbilities.vehicle,
+        SeniorAbilities.offsite_work,
+        SeniorRatings.bayes.label("rating"),
+    )
+
+def _select_abilities(*extra):
+    """select senior + ability + rating summary (outer join จึงไม่ต้อง query แยก)"""
+    return (
+        select(*_ability_columns(), *extra)
+        .join(SeniorAbilities, SeniorAbilities.id == SeniorUsers.ability_id)
+        .outerjoin(SeniorRatings, SeniorRatings.senior_id == SeniorUsers.id)
+    )
+
+def _ids_param(senior_ids: Sequence[str]):
+    return any_(bindparam("senior_ids", list(senior_ids), type_=ARRAY(Text)))
+
+def vector_candidates(session: Session, qvec: List[float], senior_ids: Sequence[str], k: int, filters: Optional[SearchFilters] = None):
+    """
+    ดึง ability + similarity + senior id ของ senior ใน senior_ids ด้วย SQL เดียว
+    (join senior_users/senior_abilities, ids ส่งเป็น array parameter ตัวเดียว)
+    filters ถูกใส่ใน WHERE ก่อน ORDER BY/LIMIT
+    คืน rows ที่มี senior_id, id, type, career, other_ability, vehicle, offsite_work, rating, sim
+    """
+    if not senior_ids:
+        return []
+    distance = SeniorAbilities.embedding.cosine_distance(qvec)
+    stmt = (
+        _select_abilities((1 - distance).label("sim"))
+        .where(SeniorUsers.id == _ids_param(senior_ids))
+        .where(SeniorAbilities.embedding.is_not(None))
+        .where(*(filters.clauses() if filters else ()))
+        .order_by(distance)
+        .limit(k)
+    )
+    return session.execute(stmt).all()
+
+def matching_ids(session: Session, senior_ids: Sequence[str], filters: SearchFilters) -> Set[str]:
+    """senior ใน senior_ids ที่ ability ผ่าน filters (ใช้นับผู้สมัครต่อ ring ของ adaptive search)"""
+    if not senior_ids:
+        return set()
+    stmt = (
+        select(SeniorUsers.id)
+        .join(SeniorAbilities, SeniorAbilities.id == SeniorUsers.ability_id)
+        .where(SeniorUsers.id == _ids_param(senior_ids))
+        .where(*filters.clauses())
+    )
+    return set(session.execute(stmt).scalars())
+
+def lexical_candidates(session: Session, keyword: str, qvec: List[float], senior_ids: Sequence[str], k: int,
+                       filters: Optional[SearchFilters] = None):
+    """
+    lexical leg ของ hybrid search: trigram word similarity บน search_text (career/other_ability/type)
+    ILIKE ช่วยคำค้นภาษาไทยสั้นๆ ที่ได้ trigram น้อย; ทั้งสองเงื่อนไขใช้ GIN trigram index
+    คืน rows แบบเดียวกับ vector_candidates (sim ต่อ qvec, 0 ถ้ายังไม่มี embedding) บวก lex ที่ใช้เรียง
+    """
+    keyword = keyword.strip()
+    if not senior_ids or not keyword:
+        return []
+    pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    lex = func.word_similarity(keyword, SeniorAbilities.search_text)
+    sim = func.coalesce(1 - SeniorAbilities.embedding.cosine_distance(qvec), 0.0)
+    stmt = (
+        _select_abilities(sim.label("sim"), lex.label("lex"))
+        .where(SeniorUsers.id == _ids_param(senior_ids))
+        .where(or_(
+            literal(keyword).op("<%")(SeniorAbilities.search_text),
+            SeniorAbilities.search_text.ilike(pattern),
+        ))
+        .where(*(filters.clauses() if filters else ()))
+        .order_by(lex.desc())
+        .limit(k)
+    )
+    return session.execute(stmt).all()
+
+def load_abilities(session: Session, senior_ids: Sequence[str]):
+    """ability + embedding ของ senior หลายคนใน SQL เดียว (ใช้เติม online index)"""
+    if not senior_ids:
+        return []
+    stmt = (
+        _select_abilities(SeniorAbilities.embedding)
+        .where(SeniorUsers.id == _ids_param(senior_ids))
+        .where(SeniorAbilities.embedding.is_not(None))
+    )
+    return session.execute(stmt).all()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..database.redis import get_redis, search_cell_key
+from ..utils.config import SEARCH_CACHE_TTL_SECONDS, SEARCH_CACHE_PRECISION, SEARCH_CACHE_MAX_RANGE_M
+from ..utils.embed_cache import normalize_query
+from ..utils.geohash import encode
+from ..utils.ranking import RankProfile
+from .search import IndexedSenior, SearchFilters
+
+logger = logging.getLogger(__name__)
+
+Hit = Tuple[IndexedSenior, float, Dict]
+
+_stats: Dict[str, float] = {"hits": 0, "misses": 0, "hit_ms": 0.0, "miss_ms": 0.0}
+
+def _field(keyword: str, range_m: int, k: int, profile: RankProfile, adaptive: bool, filters: Optional[SearchFilters]) -> str:
+    raw = (f"{normalize_query(keyword)}|{range_m}|{k}|{profile.alpha}|{profile.scale_m}|{int(adaptive)}"
+           f"|{filters.key() if filters else ''}")
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _decode(raw) -> Optional[List[Hit]]:
+    if not raw:
+        return None
+    entry = json.loads(raw)
+    if time.time() - entry["ts"] > SEARCH_CACHE_TTL_SECONDS:
+        return None
+    return [
+        (IndexedSenior(*rec), sim, {"id": rec[0], "lat": s_lat, "lng": s_lng})
+        for rec, sim, s_lat, s_lng in entry["hits"]
+    ]
+
+def _encode(hits: List[Hit]) -> str:
+    return json.dumps({
+        "ts": time.time(),
+        "hits": [
+            [[getattr(r, f) for f in IndexedSenior._fields], float(sim), loc["lat"], loc["lng"]]
+            for r, sim, loc in hits
+        ],
+    })
+
+async def get(keyword: str, lat: float, lng: float, range_m: int, k: int, profile: RankProfile, adaptive: bool = False, filters: Optional[SearchFilters] = None) -> Optional[List[Hit]]:
+    """
+    ผู้สมัคร (ก่อน ranking) ที่ cache ไว้ของ cell ที่ (lat, lng) อยู่
+    ผู้เรียกต้อง rank ใหม่ด้วยพิกัดจริงของตัวเอง เพื่อให้ระยะทาง/คะแนนถูกต้อง
+    range เกิน SEARCH_CACHE_MAX_RANGE_M ไม่ใช้ cache (presence ที่เปลี่ยนล้าง cell แค่ในรัศมีนั้น)
+    """
+    return (await get_many([keyword], lat, lng, range_m, k, profile, adaptive, filters))[0]
+
+async def get_many(keywords: List[str], lat: float, lng: float, range_m: int, k: int, profile: RankProfile, adaptive: bool = False, filters: Optional[SearchFilters] = None) -> List[Optional[List[Hit]]]:
+    """เหมือน get หลายคำค้นที่ตำแหน่ง/รัศมีเดียวกัน: ทุกคำค้นอยู่ใน hash ของ cell เดียวจึงอ่านด้วย HMGET ครั้งเดียว"""
+    if SEARCH_CACHE_TTL_SECONDS <= 0 or range_m > SEARCH_CACHE_MAX_RANGE_M or not keywords:
+        return [None] * len(keywords)
+    key = search_cell_key(encode(lat, lng, SEARCH_CACHE_PRECISION))
+    try:
+        raws = await get_redis().hmget(key, [_field(q, range_m, k, profile, adaptive, filters) for q in keywords])
+    except Exception as e:
+        logger.warning(f"Search cache read failed: {e}")
+        return [None] * len(keywords)
+    return [_decode(raw) for raw in raws]
+
+async def put(keyword: str, lat: float, lng: float, range_m: int, k: int, profile: RankProfile, hits: List[Hit], adaptive: bool = False, filters: Optional[SearchFilters] = None) -> None:
+    await put_many({keyword: hits}, lat, lng, range_m, k, profile, adaptive, filters)
+
+async def put_many(results: Dict[str, List[Hit]], lat: float, lng: float, range_m: int, k: int, profile: RankProfile, adaptive: bool = False, filters: Optional[SearchFilters] = None) -> None:
+    """เขียนผลหลายคำค้น (keyword -> hits) ลง hash ของ cell ใน HSET + EXPIRE pipeline เดียว"""
+    if SEARCH_CACHE_TTL_SECONDS <= 0 or range_m > SEARCH_CACHE_MAX_RANGE_M or not results:
+        return
+    key = search_cell_key(encode(lat, lng, SEARCH_CACHE_PRECISION))
+    mapping = {_field(q, range_m, k, profile, adaptive, filters): _encode(hits) for q, hits in results.items()}
+    try:
+        pipe = get_redis().pipeline()
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, SEARCH_CACHE_TTL_SECONDS)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Search cache write failed: {e}")
+
+def record(hit: bool, elapsed_ms: float) -> None:
+    if hit:
+        _stats["hits"] += 1
+        _stats["hit_ms"] += elapsed_ms
+    else:
+        _stats["misses"] += 1
+        _stats["miss_ms"] += elapsed_ms
+
+def stats() -> Dict[str, float]:
+    hits, misses = _stats["hits"], _stats["misses"]
+    avg_hit = _stats["hit_ms"] / hits if hits else 0.0
+    avg_miss = _stats["miss_ms"] / misses if misses else 0.0
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "avg_hit_ms": avg_hit,
+        "avg_miss_ms": avg_miss,
+        "saved_ms": max(avg_miss - avg_hit, 0.0) * hits,
+    }
@@ -0,0 +1,106 @@
+from __future__ import annotations
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+from typing import Dict, List, Optional, Tuple
+
+from ..database.redis import get_redis, search_page_key
+from ..utils.config import JWT_SECRET, SEARCH_PAGE_TTL_SECONDS
+from ..utils.ranking import SCORE_TIER
+
+logger = logging.getLogger(__name__)
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(body: str) -> str:
+    return _b64(hmac.new(JWT_SECRET.encode(), body.encode(), hashlib.sha256).digest()[:12])
+
+def encode_cursor(state: Dict) -> str:
+    """
+    cursor แบบ opaque: state (snapshot id, query key, ตำแหน่ง, score/distance/id สุดท้าย, page size, rings)
+    เป็น JSON base64url + HMAC กันแก้ไข
+    """
+    body = _b64(json.dumps(state, separators=(",", ":")).encode())
+    return f"{body}.{_sign(body)}"
+
+def decode_cursor(cursor: str) -> Dict:
+    """คืน state ของ cursor หรือ ValueError ถ้ารูปแบบ/ลายเซ็นไม่ถูกต้อง"""
+    body, _, sig = cursor.partition(".")
+    if not body or not hmac.compare_digest(sig, _sign(body)):
+        raise ValueError("Invalid cursor")
+    try:
+        return json.loads(_unb64(body))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+async def save(owner: str, items: List[Dict]) -> Optional[str]:
+    """
+    เก็บผลลัพธ์ที่จัดอันดับแล้วทั้งชุดไว้ใน Redis ช่วงสั้นๆ (SEARCH_PAGE_TTL_SECONDS)
+    หน้าถัดไปอ่านจาก snapshot นี้โดยไม่ต้องคำนวณผู้สมัครใหม่; คืน snapshot id (None ถ้าเก็บไม่ได้)
+    """
+    if SEARCH_PAGE_TTL_SECONDS <= 0:
+        return None
+    sid = secrets.token_urlsafe(12)
+    try:
+        await get_redis().set(search_page_key(sid), json.dumps({"owner": owner, "items": items}), ex=SEARCH_PAGE_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Search page snapshot write failed: {e}")
+        return None
+    return sid
+
+async def load(owner: str, sid: Optional[str]) -> Optional[List[Dict]]:
+    """snapshot ของ sid (None ถ้าหมดอายุ/ไม่ใช่ของ owner)"""
+    if not sid:
+        return None
+    try:
+        raw = await get_redis().get(search_page_key(sid))
+    except Exception as e:
+        logger.warning(f"Search page snapshot read failed: {e}")
+        return None
+    if not raw:
+        return None
+    entry = json.loads(raw)
+    return entry["items"] if entry.get("owner") == owner else None
+
+def sort_key(item: Dict) -> Tuple:
+    """
+    ลำดับเดียวกับ rank(): กลุ่ม score >= SCORE_TIER เรียงตาม score มากไปน้อย ตามด้วยกลุ่มที่เหลือเรียงตามระยะทาง
+    (/search/nearby ไม่มี score จึงเรียงตามระยะทางอย่างเดียว); ค่าเท่ากันตัดสินด้วย id ให้ลำดับคงที่ทุกครั้งที่จัดอันดับ
+    """
+    score = item.get("score")
+    if score is not None and score >= SCORE_TIER:
+        return (0, -score, item["id"])
+    return (1, item["distance"], item["id"])
+
+def ordered(items: List[Dict]) -> List[Dict]:
+    """เรียง items ตาม sort_key (ต่างจากผลของ rank() แค่ลำดับในกลุ่มที่ค่าเท่ากัน) ก่อนแบ่งหน้า"""
+    return sorted(items, key=sort_key)
+
+def resume_index(items: List[Dict], state: Dict) -> int:
+    """
+    ตำแหน่งแรกที่อยู่หลัง (score/distance, id) สุดท้ายของหน้าก่อนแบบ strict ใช้เมื่อ snapshot หมดอายุและต้องจัดอันดับใหม่
+    items ต้องผ่าน ordered() แล้ว; ตัวที่ค่าเท่ากับตัวสุดท้ายแต่ id มาทีหลังจึงไม่หลุด
+    """
+    last = sort_key({"id": state.get("id", ""), "score": state.get("score"), "distance": state["distance"]})
+    for i, item in enumerate(items):
+        if sort_key(item) > last:
+            return i
+    return len(items)
+
+def page(items: List[Dict], start: int, size: int, state: Dict) -> Tuple[List[Dict], Optional[str]]:
+    """ตัดหน้า items[start:start+size] และสร้าง cursor ของหน้าถัดไป (None ถ้าเป็นหน้าสุดท้าย)"""
+    chunk = items[start:start + size]
+    end = start + len(chunk)
+    if not chunk or end >= len(items):
+        return chunk, None
+    last = chunk[-1]
+    return chunk, encode_cursor({
+        **state, "pos": end, "size": size, "score": last.get("score"), "distance": last["distance"], "id": last["id"],
+    })
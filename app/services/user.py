@@ -1,14 +1,39 @@
+from typing import Optional
+
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
-from ..database.redis import set_presence_and_loc
+from ..database.redis import clear_presence, release_presence, set_presence_and_loc
 
+from ..database.models.users import Users
 from ..database.models.senior_users import SeniorAbilities, SeniorProfiles, SeniorUsers
 
+def senior_details():
+    """
+    loader options: senior + profile + ability ใน SELECT เดียว (LEFT OUTER JOIN แทน lazy load ทีละ relationship)
+    ไม่โหลด embedding/search_text ของ ability ซึ่งใหญ่และไม่ได้ใช้ในการแสดงผล (อ่านเมื่อไรค่อย load)
+    """
+    return (
+        joinedload(SeniorUsers.profile),
+        joinedload(SeniorUsers.ability).defer(SeniorAbilities.embedding).defer(SeniorAbilities.search_text),
+    )
+
+def user_details():
+    """loader options: user + profile ใน SELECT เดียว"""
+    return (joinedload(Users.profile),)
+
 def getUser_by_id(user_id: str, session: Session):
-    user = session.execute(select(SeniorUsers).where(SeniorUsers.id == user_id)).scalars().first()
+    user = session.execute(select(SeniorUsers).where(SeniorUsers.id == user_id).options(*senior_details())).scalars().first()
     return user
 
+def getPrincipal_by_id(role: str, user_id: str, session: Session) -> Users | SeniorUsers | None:
+    """user ตาม role ของ token พร้อม profile (และ ability ของ senior) ใน round trip เดียว"""
+    if role == "user":
+        return session.get(Users, user_id, options=user_details())
+    if role == "senior_user":
+        return session.get(SeniorUsers, user_id, options=senior_details())
+    return None
+
 def getUser_by_ability_id(ability_id: str, session: Session):
     user = session.execute(select(SeniorUsers).where(SeniorUsers.ability_id == ability_id)).scalars().first()
     return user
@@ -32,4 +57,15 @@ async def set_online(user: SeniorUsers, lat: float, lng: float, ttl: int):
         )
     except Exception as e:
         print(e)
-    return
\ No newline at end of file
+    return
+
+async def set_offline(user_id: str, conn_token: Optional[str] = None):
+    # conn_token: จาก presence WebSocket (claim_presence) ล้างเฉพาะเมื่อยังเป็น connection ล่าสุดของ senior
+    try:
+        if conn_token is not None:
+            await release_presence(user_id, conn_token)
+        else:
+            await clear_presence(user_id)
+    except Exception as e:
+        print(e)
+    return
@@ -9,14 +9,105 @@ PG_USER = os.getenv("PG_USER", "waiwan_admin")
 PG_PASSWORD = os.getenv("PG_PASSWORD", "1234")
 PG_DBNAME = os.getenv("PG_DBNAME", "waiwan_db")
 
+# Connection pool, per engine and per worker (sync psycopg2 + async asyncpg)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+# Recycle connections older than this (seconds, -1 = never)
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+# always (every checkout) | idle (only connections idle > DB_PRE_PING_IDLE_SECONDS) | off
+DB_PRE_PING = os.getenv("DB_PRE_PING", "always")
+DB_PRE_PING_IDLE_SECONDS = float(os.getenv("DB_PRE_PING_IDLE_SECONDS", "30"))
+# Per-statement timeout in ms (0 = server default)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# 1 = behind a transaction-mode pooler (e.g. PgBouncer): no prepared-statement caching,
+# statement_timeout via SET LOCAL per transaction instead of a startup parameter
+DB_TRANSACTION_POOLER = os.getenv("DB_TRANSACTION_POOLER", "0") == "1"
+# Read replicas (comma separated postgresql:// URLs) for read-only routes; reads fall back to
+# the primary when no replica answered the last lag check within DB_REPLICA_MAX_LAG_SECONDS
+DB_REPLICA_URLS = [u.strip() for u in os.getenv("DB_REPLICA_URLS", "").split(",") if u.strip()]
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "5"))
+
+# ANN index on senior_abilities.embedding (hnsw | ivfflat | none)
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "hnsw")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+# pgvector >= 0.8: off | strict_order | relaxed_order (keeps scanning when filters drop rows; ignored on older pgvector)
+# ef_search is raised to top_k per query (max 1000) since HNSW returns at most ef_search rows per scan
+HNSW_ITERATIVE_SCAN = os.getenv("HNSW_ITERATIVE_SCAN", "relaxed_order")
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "100"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+# Extra partial ANN indexes for boolean /search filters (comma separated: vehicle, offsite_work)
+FILTER_VECTOR_INDEXES = [x.strip() for x in os.getenv("FILTER_VECTOR_INDEXES", "").split(",") if x.strip()]
+
+# Embedding storage: vector (float32) | halfvec (float16, pgvector >= 0.7)
+EMBED_STORAGE = os.getenv("EMBED_STORAGE", "vector")
+# Stored dimension (0 = model dimension). Smaller values keep the first N dims,
+# or project with EMBED_PCA_FILE (.npz from scripts/bench_vector_storage.py --fit-pca)
+EMBED_STORE_DIM = int(os.getenv("EMBED_STORE_DIM", "0"))
+EMBED_PCA_FILE = os.getenv("EMBED_PCA_FILE", "")
+
 # For Redis connection
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
 PRESENCE_TTL_SECONDS = int(os.getenv("PRESENCE_TTL_SECONDS", "60"))
+# Compatibility: also write senior:{id}:presence / senior:{id}:loc TTL keys
+PRESENCE_TTL_KEYS = os.getenv("PRESENCE_TTL_KEYS", "0") == "1"
+PRESENCE_TRIM_SECONDS = float(os.getenv("PRESENCE_TRIM_SECONDS", "10"))
+# Heartbeats that moved less than this (meters) only refresh TTLs
+PRESENCE_MOVE_THRESHOLD_M = float(os.getenv("PRESENCE_MOVE_THRESHOLD_M", "25"))
+
+# In-process vector index of online seniors (app/services/online_index.py)
+ONLINE_INDEX_ENABLED = os.getenv("ONLINE_INDEX_ENABLED", "1") == "1"
+ONLINE_INDEX_SYNC_SECONDS = float(os.getenv("ONLINE_INDEX_SYNC_SECONDS", "5"))
 
 MODEL_NAME = os.getenv("MODEL_NAME", "")
+# torch | onnx | int8 (see app/utils/embedder.py load_model)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "")
+
+# Embedding micro-batching (max texts per forward pass / max wait before flush)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+
+# Search result cache per geohash cell (0 = disabled)
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", "5"))
+SEARCH_CACHE_PRECISION = int(os.getenv("SEARCH_CACHE_PRECISION", "5"))
+# Largest search range served from the cache; presence changes clear every cell within this radius
+SEARCH_CACHE_MAX_RANGE_M = int(os.getenv("SEARCH_CACHE_MAX_RANGE_M", "10000"))
+# Ranked result snapshots behind /search and /search/nearby cursors (seconds, 0 = re-rank every page)
+SEARCH_PAGE_TTL_SECONDS = int(os.getenv("SEARCH_PAGE_TTL_SECONDS", "120"))
+
+# Query embedding cache (L1 = in-process LRU, L2 = Redis shared across workers)
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_CACHE_TTL_SECONDS = int(os.getenv("EMBED_CACHE_TTL_SECONDS", "86400"))
+
+# Authenticated principal cache (user/profile/ability snapshot per token subject)
+# L1 = in-process LRU with TTL, PRINCIPAL_CACHE_REDIS=1 adds a Redis tier shared across workers
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_REDIS = os.getenv("PRINCIPAL_CACHE_REDIS", "0") == "1"
+
+# Search ranking profile (see app/utils/ranking.py PROFILES)
+RANK_PROFILE = os.getenv("RANK_PROFILE", "default")
+
+# Senior rating summary: Bayesian prior (mean on the 1..RATING_MAX scale, weight in reviews)
+RATING_MAX = float(os.getenv("RATING_MAX", "5"))
+RATING_PRIOR_MEAN = float(os.getenv("RATING_PRIOR_MEAN", "3.5"))
+RATING_PRIOR_WEIGHT = float(os.getenv("RATING_PRIOR_WEIGHT", "5"))
+
+# Hybrid search: trigram lexical leg fused with the vector leg via reciprocal-rank fusion
+# (RRF only picks the top_k candidates; scores stay cosine similarity)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+LEXICAL_K = int(os.getenv("LEXICAL_K", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Adaptive-radius search: ring radii (meters) tried in order until top_k seniors are found; range is always the last ring
+ADAPTIVE_RADII_M = [float(x) for x in os.getenv("ADAPTIVE_RADII_M", "1000,2500,5000,10000,20000").split(",") if x.strip()]
 
 # AUTH JWT
 JWT_SECRET = os.getenv("JWT_SECRET", "change-this-in-production")
@@ -24,3 +115,6 @@ JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_EXPIRES_MINUTES = int(os.getenv("JWT_EXPIRES_MINUTES", "43200"))
 JWT_ISSUER = os.getenv("JWT_ISSUER", "waiwan-app")
 
+# Bearer token for operational endpoints (/stats/db, /search/stats); empty = endpoints disabled (404)
+OPS_TOKEN = os.getenv("OPS_TOKEN", "")
+
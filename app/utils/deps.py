@@ -1,12 +1,17 @@
 from __future__ import annotations
-from typing import Generator, Optional, Tuple
+import hmac
+from typing import AsyncGenerator, Generator, Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from ..database.db import db as DBInstance
+from .config import OPS_TOKEN
 from .jwt import decode_token
+from ..services.principal_cache import Principal, principal_cache
+from ..services.user import getPrincipal_by_id
 from ..database.models.users import Users, UserProfiles
 from ..database.models.senior_users import SeniorUsers, SeniorProfiles, SeniorAbilities
 
@@ -16,25 +21,54 @@ def get_db() -> Generator[Session, None, None]:
     with DBInstance.session() as session:
         yield session
 
-def get_current_user(
-    cred: HTTPAuthorizationCredentials = Depends(security),
-    session: Session = Depends(get_db),
-) -> Tuple[Users | SeniorUsers, Optional[UserProfiles | SeniorUsers], Optional[SeniorAbilities]]:
-    token = cred.credentials
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with DBInstance.async_session() as session:
+        yield session
+
+def get_read_db() -> Generator[Session, None, None]:
+    """session อ่านอย่างเดียว (replica ถ้ามี) สำหรับ route ที่ opt-in; ไม่ commit"""
+    with DBInstance.read_session() as session:
+        yield session
+
+async def get_async_read_db() -> AsyncGenerator[AsyncSession, None]:
+    async with DBInstance.async_read_session() as session:
+        yield session
+
+def require_ops(cred: HTTPAuthorizationCredentials = Depends(security)) -> None:
+    """endpoint ปฏิบัติการ (stats): ต้องส่ง Bearer OPS_TOKEN; ไม่ตั้ง OPS_TOKEN = ปิด endpoint (404)"""
+    if not OPS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not hmac.compare_digest(cred.credentials.encode(), OPS_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+def _token_payload(cred: HTTPAuthorizationCredentials) -> dict:
     try:
-        payload = decode_token(token)
+        payload = decode_token(cred.credentials)
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    sub = payload.get("sub")
-    if not sub:
+    if not payload.get("sub"):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
+    return payload
+
+async def get_principal(cred: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    """
+    เหมือน get_current_user แต่คืน Snapshot อ่านอย่างเดียวจาก principal_cache (ไม่เปิด session เมื่อ cache hit)
+    ใช้กับ handler ที่แค่อ่าน user/profile/ability; handler ที่แก้ไขแถวเหล่านี้ใช้ get_current_user
+    """
+    payload = _token_payload(cred)
+    principal = await principal_cache.get(payload.get("role"), payload["sub"])
+    if principal is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    return principal
+
+def get_current_user(
+    cred: HTTPAuthorizationCredentials = Depends(security),
+    session: Session = Depends(get_db),
+) -> Tuple[Users | SeniorUsers, Optional[UserProfiles | SeniorUsers], Optional[SeniorAbilities]]:
+    payload = _token_payload(cred)
+    sub = payload["sub"]
 
-    user: Users | SeniorUsers | None = None
-    if payload.get("role") == "user":
-        user = session.get(Users, sub)
-    elif payload.get("role") == "senior_user":
-        user = session.get(SeniorUsers, sub)
+    user: Users | SeniorUsers | None = getPrincipal_by_id(payload.get("role"), sub, session)
         
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
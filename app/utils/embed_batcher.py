@@ -0,0 +1,139 @@
+from __future__ import annotations
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import EMBED_BATCH_SIZE, EMBED_BATCH_WAIT_MS
+from .embedder import embed_batch
+
+logger = logging.getLogger(__name__)
+
+_Item = Tuple[str, asyncio.Future, asyncio.AbstractEventLoop]
+
+def _resolve(fut: asyncio.Future, value) -> None:
+    if not fut.done():
+        fut.set_result(value)
+
+def _reject(fut: asyncio.Future, exc: BaseException) -> None:
+    if not fut.done():
+        fut.set_exception(exc)
+
+class EmbeddingBatcher:
+    """
+    รวมข้อความจากหลาย request แล้ว encode เป็น batch เดียวใน worker thread
+    flush เมื่อครบ max_batch หรือเมื่อรอครบ max_wait_ms นับจากข้อความแรกของ batch
+    event loop ของ uvicorn จึงไม่ถูก block ระหว่าง forward pass
+    """
+    def __init__(self, encode: Callable[[Sequence[str]], np.ndarray], max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.encode = encode
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Optional[_Item]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopped = False
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_thread(self) -> None:
+        # ผู้เรียกถือ self._lock; thread ใหม่ได้คิวใหม่ thread เก่าที่กำลังหยุดจึงไม่แย่งงานของคิวใหม่
+        if self._thread is None or not self._thread.is_alive():
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name="embed-batcher", daemon=True)
+            self._thread.start()
+
+    def start(self) -> None:
+        with self._lock:
+            self._stopped = False
+            self._ensure_thread()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """หยุดรับงานใหม่; งานที่ค้างในคิวหลัง batch สุดท้ายได้ RuntimeError("batcher stopped")"""
+        with self._lock:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join(timeout)
+
+    async def submit(self, text: str) -> List[float]:
+        """ส่งข้อความเข้าคิวแล้วรอผล embedding (normalized); หลัง stop() ได้ RuntimeError"""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("batcher stopped")
+            self._ensure_thread()
+            self._queue.put((text, fut, loop))
+        return await fut
+
+    async def submit_many(self, texts: Sequence[str]) -> List[List[float]]:
+        return list(await asyncio.gather(*(self.submit(t) for t in texts)))
+
+    def _collect(self, q: "queue.Queue[Optional[_Item]]", first: _Item) -> Tuple[List[_Item], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self, q: "queue.Queue[Optional[_Item]]") -> None:
+        stopping = False
+        while not stopping:
+            first = q.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(q, first)
+            try:
+                vecs = self.encode([text for text, _, _ in batch])
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(batch)} failed: {e}")
+                for _, fut, loop in batch:
+                    loop.call_soon_threadsafe(_reject, fut, e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, fut, loop), vec in zip(batch, vecs):
+                loop.call_soon_threadsafe(_resolve, fut, vec.tolist())
+        # หลัง sentinel: ไม่ให้ผู้รอค้างตลอดไป
+        while True:
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                _, fut, loop = item
+                loop.call_soon_threadsafe(_reject, fut, RuntimeError("batcher stopped"))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": self.items / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+# Global batcher instance
+batcher = EmbeddingBatcher(embed_batch, EMBED_BATCH_SIZE, EMBED_BATCH_WAIT_MS)
+
+async def embed_query_async(text: str) -> List[float]:
+    return await batcher.submit(text)
+
+async def embed_many_async(texts: Sequence[str]) -> List[List[float]]:
+    """ส่งหลายข้อความเข้าคิวพร้อมกัน: ถ้าไม่เกิน max_batch จะถูก encode ใน forward pass เดียว"""
+    return await batcher.submit_many(texts)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .config import EMBED_BACKEND, EMBED_CACHE_SIZE, EMBED_CACHE_TTL_SECONDS, EMBED_ONNX_FILE, EMBED_PCA_FILE, MODEL_NAME
+from .embed_batcher import embed_many_async
+from .embedder import EMBEDDING_DIM, STORE_DIM
+from ..database.redis import get_redis_raw
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """LRU แบบจำกัดขนาด ใช้ได้จากหลาย thread; ttl > 0 ให้ entry หมดอายุหลัง ttl วินาที"""
+    def __init__(self, maxsize: int, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, Any] = OrderedDict()
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                return None
+            if self.ttl > 0 and self._expires[key] <= time.monotonic():
+                del self._data[key]
+                del self._expires[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.ttl > 0:
+                self._expires[key] = time.monotonic() + self.ttl
+            while len(self._data) > self.maxsize:
+                old, _ = self._data.popitem(last=False)
+                self._expires.pop(old, None)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+_l1 = LRUCache(EMBED_CACHE_SIZE)
+_stats: Dict[str, int] = {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+
+# dtype ของ vector ที่ pack ลง Redis
+_DTYPE = np.float32
+
+def normalize_query(text: str) -> str:
+    """
+    NFC + ตัดช่องว่างซ้ำ + casefold ให้คำค้นที่ต่างกันแค่รูปแบบใช้ cache ร่วมกัน
+    ใช้ทำ key เท่านั้น model ได้ข้อความเดิม
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split()).casefold()
+
+def _cache_key(norm: str) -> str:
+    digest = hashlib.sha1(norm.encode("utf-8")).hexdigest()
+    # vector ต่างกันตาม backend (onnx/int8 ให้ค่าไม่เท่า torch) และผ่าน reduce_embeddings แล้ว (dimension/PCA ที่เก็บ)
+    backend = f"{EMBED_BACKEND}-{EMBED_ONNX_FILE}" if EMBED_BACKEND == "onnx" and EMBED_ONNX_FILE else EMBED_BACKEND
+    reduced = f":{STORE_DIM}{'p' if EMBED_PCA_FILE else ''}" if STORE_DIM != EMBEDDING_DIM or EMBED_PCA_FILE else ""
+    return f"emb:{MODEL_NAME}:{backend}:{np.dtype(_DTYPE).name}{reduced}:{digest}"
+
+def pack(vec: List[float]) -> bytes:
+    return np.asarray(vec, dtype=_DTYPE).tobytes()
+
+def unpack(raw: bytes) -> List[float]:
+    return np.frombuffer(raw, dtype=_DTYPE).tolist()
+
+def query_key(text: str) -> str:
+    """key ของ embedding ของคำค้น (หลัง normalize) ใช้ระบุตัวคำค้นใน cursor ได้ด้วย"""
+    return _cache_key(normalize_query(text))
+
+async def cached_embed_query(text: str) -> List[float]:
+    """
+    embed_query ที่ผ่าน cache 2 ชั้น: LRU ใน process -> Redis (float32 bytes + TTL) -> model
+    Redis ล่มจะ fallback ไปใช้ model ตามปกติ
+    """
+    return (await cached_embed_many([text]))[0]
+
+async def cached_embed_many(texts: Sequence[str]) -> List[List[float]]:
+    """
+    เหมือน cached_embed_query แต่หลายข้อความพร้อมกัน
+    L2 อ่านด้วย MGET ครั้งเดียว และข้อความที่ไม่อยู่ใน cache ถูกส่งเข้า batcher พร้อมกันจึง encode ใน forward pass เดียว
+    """
+    keys = [query_key(t) for t in texts]
+    vecs: Dict[str, List[float]] = {}
+
+    for key in keys:
+        vec = _l1.get(key)
+        if vec is not None:
+            _stats["l1_hits"] += 1
+            vecs[key] = vec
+
+    r = get_redis_raw()
+    l2_keys = list(dict.fromkeys(k for k in keys if k not in vecs))
+    if l2_keys:
+        try:
+            raws = await r.mget(l2_keys)
+        except Exception as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            raws = [None] * len(l2_keys)
+        for key, raw in zip(l2_keys, raws):
+            if raw:
+                vecs[key] = unpack(raw)
+                _stats["l2_hits"] += 1
+                _l1.put(key, vecs[key])
+
+    # key เดียวกัน (ต่างแค่รูปแบบ) encode ครั้งเดียวด้วยข้อความเดิมตัวแรก
+    first_text: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in vecs:
+            first_text.setdefault(key, text)
+    missing = list(first_text.items())
+    if missing:
+        _stats["misses"] += len(missing)
+        encoded = await embed_many_async([t for _, t in missing])
+        for (key, _), vec in zip(missing, encoded):
+            vecs[key] = vec
+            _l1.put(key, vec)
+        try:
+            pipe = r.pipeline()
+            for (key, _), vec in zip(missing, encoded):
+                pipe.set(key, pack(vec), ex=EMBED_CACHE_TTL_SECONDS)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+    return [vecs[key] for key in keys]
+
+def cache_stats() -> Dict[str, float]:
+    total = _stats["l1_hits"] + _stats["l2_hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "l1_size": len(_l1),
+        "hit_rate": (total - _stats["misses"]) / total if total else 0.0,
+    }
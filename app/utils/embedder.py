@@ -1,7 +1,115 @@
-from sentence_transformers import SentenceTransformer
-from .config import MODEL_NAME
+import logging
+import threading
+import time
+from typing import Sequence
 
-model = SentenceTransformer(MODEL_NAME)
+import numpy as np
+from .config import MODEL_NAME, EMBED_BACKEND, EMBED_ONNX_FILE, EMBED_PCA_FILE, EMBED_STORE_DIM
+
+logger = logging.getLogger(__name__)
+
+# dimension ที่โมเดลให้ออกมา
+EMBEDDING_DIM = 384
+# dimension ที่เก็บใน SeniorAbilities.embedding (EMBED_STORE_DIM=0 คือเท่ากับโมเดล)
+STORE_DIM = EMBED_STORE_DIM or EMBEDDING_DIM
+
+BACKENDS = ("torch", "onnx", "int8")
+
+_model = None
+_pca = None
+_lock = threading.Lock()
+_ready = threading.Event()
+
+def load_model(backend: str = EMBED_BACKEND):
+    """
+    โหลด SentenceTransformer ตาม backend
+    - torch: โมเดลเดิม
+    - onnx: ONNX Runtime บน CPU (ต้องติดตั้ง optimum[onnxruntime]); EMBED_ONNX_FILE เลือกไฟล์ เช่น onnx/model_qint8_avx2.onnx
+    - int8: dynamic quantization ของ nn.Linear เป็น int8 (torch, CPU)
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        model = SentenceTransformer(MODEL_NAME)
+    elif backend == "onnx":
+        model_kwargs = {"file_name": EMBED_ONNX_FILE} if EMBED_ONNX_FILE else None
+        model = SentenceTransformer(MODEL_NAME, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+    elif backend == "int8":
+        import torch
+        model = SentenceTransformer(MODEL_NAME, device="cpu")
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        raise ValueError(f"Unknown EMBED_BACKEND: {backend} (expected one of {BACKENDS})")
+
+    dim = model.get_sentence_embedding_dimension()
+    if dim != EMBEDDING_DIM:
+        raise RuntimeError(f"Model {MODEL_NAME} produces {dim}-dim embeddings, expected {EMBEDDING_DIM}")
+    if STORE_DIM > EMBEDDING_DIM:
+        raise RuntimeError(f"EMBED_STORE_DIM={STORE_DIM} is larger than the model dimension {EMBEDDING_DIM}")
+    return model
+
+def get_model():
+    """โหลดโมเดลครั้งแรกที่ถูกเรียก (lazy) แทนการโหลดตอน import"""
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                _model = load_model()
+    return _model
+
+def warm_up() -> None:
+    """โหลดโมเดลและรัน forward pass หนึ่งครั้ง แล้วตั้ง readiness flag"""
+    t0 = time.perf_counter()
+    try:
+        get_model().encode(["warm up"], normalize_embeddings=True)
+    except Exception:
+        logger.exception(f"Embedding model {MODEL_NAME} ({EMBED_BACKEND}) failed to load")
+        return
+    _ready.set()
+    logger.info(f"Embedding model {MODEL_NAME} ({EMBED_BACKEND}) ready in {time.perf_counter() - t0:.1f}s")
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+def as_float32(value) -> np.ndarray:
+    """embedding ที่อ่านจาก DB (ndarray/list ของ vector, HalfVector ของ halfvec) เป็น float32 ndarray"""
+    to_numpy = getattr(value, "to_numpy", None)
+    return np.asarray(to_numpy() if to_numpy is not None else value, dtype=np.float32)
+
+def ability_text(career, other_ability) -> str:
+    """ข้อความที่ใช้ embed ความสามารถของ senior (ต้องตรงกันทั้งตอนสมัครและตอน backfill)"""
+    return " ".join([career or "", other_ability or ""])
+
+def _load_pca():
+    global _pca
+    if _pca is None:
+        data = np.load(EMBED_PCA_FILE)
+        mean = data["mean"].astype(np.float32)
+        components = data["components"].astype(np.float32)
+        if components.shape != (STORE_DIM, EMBEDDING_DIM):
+            raise RuntimeError(f"{EMBED_PCA_FILE} projects to {components.shape}, expected {(STORE_DIM, EMBEDDING_DIM)}")
+        _pca = (mean, components)
+    return _pca
+
+def reduce_embeddings(x: np.ndarray) -> np.ndarray:
+    """
+    แปลง embedding ของโมเดล (n, EMBEDDING_DIM) เป็นรูปที่เก็บ (n, STORE_DIM)
+    ใช้ PCA ถ้ามี EMBED_PCA_FILE ไม่เช่นนั้นตัดเหลือ STORE_DIM มิติแรก แล้ว normalize ใหม่
+    ต้องใช้กับทั้ง embedding ที่เก็บและ query vector
+    """
+    if STORE_DIM == EMBEDDING_DIM and not EMBED_PCA_FILE:
+        return x
+    x = np.asarray(x, dtype=np.float32)
+    if EMBED_PCA_FILE:
+        mean, components = _load_pca()
+        x = (x - mean) @ components.T
+    else:
+        x = x[:, :STORE_DIM]
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.where(norms == 0, 1.0, norms)
 
 def embed_query(text: str):
-    return model.encode([text], normalize_embeddings=True)[0].tolist()
\ No newline at end of file
+    return reduce_embeddings(get_model().encode([text], normalize_embeddings=True))[0].tolist()
+
+def embed_batch(texts: Sequence[str]) -> np.ndarray:
+    return reduce_embeddings(get_model().encode(list(texts), batch_size=max(1, len(texts)), normalize_embeddings=True))
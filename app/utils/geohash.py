@@ -0,0 +1,60 @@
+import math
+from typing import Set, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def encode(lat: float, lng: float, precision: int = 6) -> str:
+    """geohash มาตรฐาน (base32) ของพิกัด"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    out = []
+    bits, ch, even = 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                ch = (ch << 1) | 1
+                lng_lo = mid
+            else:
+                ch <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """ขนาด cell (องศา lat, องศา lng) ที่ precision นี้"""
+    total = 5 * precision
+    lng_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+def cells_within(lat: float, lng: float, radius_m: float, precision: int) -> Set[str]:
+    """
+    cell ทุก cell ที่มีจุดใดจุดหนึ่งอยู่ในกรอบสี่เหลี่ยม radius_m รอบพิกัดนี้ (อย่างน้อย cell ตัวเอง + 8 cell รอบๆ)
+    สุ่มพิกัดเป็นตารางห่างเท่าขนาด cell จึงโดนทุก cell ในกรอบ
+    """
+    dlat, dlng = cell_size(precision)
+    span_lat = radius_m / 111_320.0
+    edge = min(abs(lat) + span_lat, 89.0)
+    span_lng = min(radius_m / (111_320.0 * math.cos(math.radians(edge))), 180.0)
+    n_lat = max(math.ceil(span_lat / dlat), 1)
+    n_lng = max(math.ceil(span_lng / dlng), 1)
+    cells = set()
+    for i in range(-n_lat, n_lat + 1):
+        for j in range(-n_lng, n_lng + 1):
+            la = min(max(lat + i * dlat, -90.0), 90.0)
+            ln = (lng + j * dlng + 180.0) % 360.0 - 180.0
+            cells.add(encode(la, ln, precision))
+    return cells
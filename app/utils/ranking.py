@@ -0,0 +1,122 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import ADAPTIVE_RADII_M, RANK_PROFILE, RATING_MAX, RATING_PRIOR_MEAN, RRF_K
+
+# รัศมีเฉลี่ยของโลก (เมตร) ค่าเดียวกับแพ็กเกจ haversine
+EARTH_RADIUS_M = 6371008.8
+
+# คะแนนตั้งแต่ค่านี้ขึ้นไปเรียงตาม score ที่เหลือเรียงตามระยะทาง
+SCORE_TIER = 0.5
+
+@dataclass(frozen=True)
+class RankProfile:
+    """
+    น้ำหนักของการจัดอันดับ: score = alpha*sim + (1-alpha-beta)*exp(-dist/scale_m) + beta*rating/RATING_MAX
+    scale_m=None หมายถึงใช้ range ของคำค้นเป็น scale (พฤติกรรมเดิมของ /search)
+    beta=0 ไม่ใช้ rating (พฤติกรรมเดิม)
+    """
+    alpha: float = 0.7
+    scale_m: Optional[float] = None
+    beta: float = 0.0
+
+PROFILES: Dict[str, RankProfile] = {
+    "default": RankProfile(alpha=0.7),
+    "similarity": RankProfile(alpha=0.85),
+    "proximity": RankProfile(alpha=0.5, scale_m=3000.0),
+    "quality": RankProfile(alpha=0.6, beta=0.15),
+}
+
+def get_profile(name: Optional[str] = None) -> RankProfile:
+    """คืน profile ตามชื่อ (ไม่ระบุ = RANK_PROFILE จาก config)"""
+    name = name or RANK_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown rank profile: {name}")
+    return PROFILES[name]
+
+def haversine_m(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """ระยะทาง (เมตร) จากจุด (lat, lng) ไปยังทุกจุดใน lats/lngs ในครั้งเดียว"""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - np.radians(lng)
+    a = np.sin(dlat * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng * 0.5) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+def ring_radii(range_m: float, schedule: Sequence[float] = ADAPTIVE_RADII_M) -> List[float]:
+    """รัศมีของแต่ละ ring สำหรับ adaptive search: ค่าใน schedule ที่เล็กกว่า range_m แล้วปิดด้วย range_m"""
+    return sorted(r for r in schedule if 0 < r < range_m) + [float(range_m)]
+
+def blend_scores(sims: np.ndarray, dists: np.ndarray, profile: RankProfile, range_m: float,
+                 ratings: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    เวอร์ชัน vectorized ของ setScore
+    ratings เป็น Bayesian score (NaN = ยังไม่มีรีวิว ใช้ RATING_PRIOR_MEAN)
+    """
+    scale = profile.scale_m or float(range_m)
+    scores = profile.alpha * sims + (1 - profile.alpha - profile.beta) * np.exp(-(dists / scale))
+    if profile.beta:
+        if ratings is None:
+            ratings = np.full(sims.shape, RATING_PRIOR_MEAN)
+        ratings = np.where(np.isnan(ratings), RATING_PRIOR_MEAN, ratings)
+        scores += profile.beta * np.clip(ratings / RATING_MAX, 0.0, 1.0)
+    return scores
+
+def _smallest(values: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """index ของ k ค่าที่น้อยที่สุดเรียงจากน้อยไปมาก (k=None คือทั้งหมด)"""
+    if k is not None and k < values.size:
+        part = np.argpartition(values, k - 1)[:k] if k > 0 else np.empty(0, dtype=np.intp)
+        return part[np.argsort(values[part], kind="stable")]
+    return np.argsort(values, kind="stable")
+
+def rank(
+    sims: np.ndarray,
+    lats: np.ndarray,
+    lngs: np.ndarray,
+    lat: float,
+    lng: float,
+    range_m: float,
+    profile: Optional[RankProfile] = None,
+    k: Optional[int] = None,
+    ratings: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    จัดอันดับผู้สมัครทั้งหมดในรอบเดียว
+    - คำนวณระยะทางและคะแนนแบบ vectorized
+    - ตัดผู้ที่อยู่นอก range_m
+    - กลุ่ม score >= SCORE_TIER เรียงตาม score มากไปน้อย ตามด้วยกลุ่มที่เหลือเรียงตามระยะทาง
+    คืน (order, scores, dists) โดย order เป็น index ของ input ตามลำดับผลลัพธ์ (ไม่เกิน k)
+    """
+    profile = profile or get_profile()
+    sims = np.asarray(sims, dtype=np.float64)
+    dists = haversine_m(lat, lng, np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64))
+    scores = blend_scores(sims, dists, profile, range_m, ratings)
+
+    in_range = np.flatnonzero(dists <= range_m)
+    high = in_range[scores[in_range] >= SCORE_TIER]
+    low = in_range[scores[in_range] < SCORE_TIER]
+
+    high = high[_smallest(-scores[high], k)]
+    remaining = None if k is None else max(k - high.size, 0)
+    low = low[_smallest(dists[low], remaining)]
+
+    return np.concatenate([high, low]), scores, dists
+
+def fuse_rrf(legs: Sequence[Sequence[Tuple]], k: Optional[int] = None, k0: int = RRF_K) -> List[Tuple]:
+    """
+    reciprocal-rank fusion ของผลหลาย leg (เช่น vector + lexical)
+    แต่ละ leg คือ [(record, sim, loc)] เรียงดีที่สุดก่อน; ระบุตัวตนด้วย loc["id"]
+    sum(1/(k0+rank)) ใช้เลือกและเรียง k ตัวแรกเท่านั้น แต่ละ hit คืนตามเดิม (sim ดิบ) ให้ setScore/tier ใช้สเกลเดียวกับ vector search
+    """
+    fused: Dict[str, float] = {}
+    first: Dict[str, Tuple] = {}
+    for leg in legs:
+        for pos, hit in enumerate(leg, start=1):
+            pid = hit[2]["id"]
+            fused[pid] = fused.get(pid, 0.0) + 1.0 / (k0 + pos)
+            first.setdefault(pid, hit)
+    ids = sorted(fused, key=fused.get, reverse=True)[:k]
+    return [first[pid] for pid in ids]
@@ -89,10 +89,36 @@ class SearchPayload(BaseModel):
     lng: float = Field(..., description="Longitude in decimal degrees")
     top_k: int = 20
     range: int = 10000 # 10km
+    profile: Optional[str] = Field(None, description="Ranking profile name (default from RANK_PROFILE)")
+    adaptive: bool = Field(False, description="Expand the radius in rings until top_k seniors are found (up to range)")
+    vehicle: Optional[bool] = Field(None, description="Only seniors with (true) / without (false) a vehicle")
+    offsite_work: Optional[bool] = Field(None, description="Only seniors who do (true) / don't (false) work offsite")
+    type: Optional[str] = Field(None, description="Only seniors of this ability type")
+    page_size: Optional[int] = Field(None, ge=1, le=100, description="Return results in pages of this size (with next_cursor)")
+    cursor: Optional[str] = Field(None, description="next_cursor from the previous page")
+
+class BatchSearchPayload(BaseModel):
+    keywords: List[str] = Field(..., min_length=1, max_length=16, description="Keywords sharing one location/range")
+    lat: float = Field(..., description="Latitude in decimal degrees")
+    lng: float = Field(..., description="Longitude in decimal degrees")
+    top_k: int = 20
+    range: int = 10000 # 10km
+    profile: Optional[str] = Field(None, description="Ranking profile name (default from RANK_PROFILE)")
+    adaptive: bool = Field(False, description="Expand the radius in rings until top_k seniors are found (up to range)")
+    vehicle: Optional[bool] = Field(None, description="Only seniors with (true) / without (false) a vehicle")
+    offsite_work: Optional[bool] = Field(None, description="Only seniors who do (true) / don't (false) work offsite")
+    type: Optional[str] = Field(None, description="Only seniors of this ability type")
 
 class SearchOut(BaseModel):
     count: int
     list: list
+    rings: Optional[int] = None # adaptive search: rings visited (0 = result cache hit)
+    next_cursor: Optional[str] = None
+
+class BatchSearchOut(BaseModel):
+    count: int
+    results: List[SearchOut]
+    rings: Optional[int] = None
     
 # ---------- Job ----------
 class JobPayload(BaseModel):
@@ -1,3 +1,13 @@
-def setScore(sim, dist_m, alpha=0.7, scale_m=5000.0) -> float:
-    import math
-    return alpha*sim + (1-alpha)*math.exp(-(dist_m/scale_m))
\ No newline at end of file
+import math
+
+from .config import RATING_PRIOR_MEAN
+
+def setScore(sim, dist_m, alpha=0.7, scale_m=5000.0, rating=None, beta=0.0, rating_max=5.0) -> float:
+    # beta > 0: เพิ่มคะแนนคุณภาพ (rating normalize เป็น 0..1) โดยลดน้ำหนักของระยะทางลง
+    # ยังไม่มีรีวิว (None) ใช้ RATING_PRIOR_MEAN เหมือน blend_scores
+    score = alpha*sim + (1-alpha-beta)*math.exp(-(dist_m/scale_m))
+    if beta:
+        if rating is None:
+            rating = RATING_PRIOR_MEAN
+        score += beta*min(max(rating/rating_max, 0.0), 1.0)
+    return score
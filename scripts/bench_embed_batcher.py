@@ -0,0 +1,39 @@
+"""
+วัด throughput ของ EmbeddingBatcher เมื่อมี request พร้อมกันจำนวนมาก ที่ batch size ต่างๆ
+
+    python -m scripts.bench_embed_batcher --concurrency 64 --batch-sizes 1,8,32
+"""
+import argparse
+import asyncio
+import time
+
+from app.utils.embed_batcher import EmbeddingBatcher
+from app.utils.embedder import embed_batch
+
+KEYWORDS = ["ทำอาหาร", "ขับรถ", "ซ่อมบ้าน", "ทำสวน", "ดูแลเด็ก", "สอนหนังสือ", "ตัดผม", "เย็บผ้า"]
+
+async def run(batch_size: int, concurrency: int, rounds: int, wait_ms: float) -> float:
+    b = EmbeddingBatcher(embed_batch, batch_size, wait_ms)
+    texts = [f"{KEYWORDS[i % len(KEYWORDS)]} {i}" for i in range(concurrency)]
+    await b.submit_many(texts[:1])  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        await b.submit_many(texts)
+    elapsed = time.perf_counter() - t0
+    b.stop()
+    return concurrency * rounds / elapsed
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--wait-ms", type=float, default=5.0)
+    ap.add_argument("--batch-sizes", default="1,8,32")
+    args = ap.parse_args()
+
+    for bs in [int(x) for x in args.batch_sizes.split(",")]:
+        qps = asyncio.run(run(bs, args.concurrency, args.rounds, args.wait_ms))
+        print(f"batch_size={bs:3d}: {qps:8.1f} texts/s")
+
+if __name__ == "__main__":
+    main()
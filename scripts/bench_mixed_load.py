@@ -0,0 +1,151 @@
+"""
+โหลดผสม chat + search กับ server ที่รันอยู่ แล้วรายงาน p50/p99 แยกตามประเภท
+- chat socket: /chat/ws/{room} ของทั้ง user และ senior ในแต่ละห้อง ส่งข้อความแล้ววัดเวลาจนได้ new_message ของตัวเองกลับมา
+- chat list: GET /chat/rooms วนต่อเนื่อง
+- search: POST /search (สุ่มพิกัดรอบ --lat/--lng ไม่ให้ตก cell เดิมของ result cache)
+ใช้เทียบก่อน/หลังย้าย route ไป AsyncSession: query ที่ block event loop ทำให้ p99 ของ chat socket พุ่งตาม search
+
+    uvicorn app.main:app --workers 1 &
+    python -m scripts.bench_mixed_load --rooms 10 --search-clients 16 --list-clients 8 --duration 30
+
+ข้อความที่ส่ง (ขึ้นต้นด้วย "bench ") ถูกลบหลังจบ ยกเว้นใส่ --keep-messages
+"""
+import argparse
+import asyncio
+import json
+import random
+import secrets
+import time
+
+import httpx
+import numpy as np
+import websockets
+from sqlalchemy import text
+
+from app.database.db import db
+from app.utils.jwt import create_access_token
+
+KEYWORDS = ["ทำอาหาร", "ขับรถ", "ซ่อมบ้าน", "ทำสวน", "ดูแลเด็ก", "สอนหนังสือ", "ตัดผม", "เย็บผ้า"]
+
+def load_rooms(n: int) -> list:
+    with db.engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT id, user_id, senior_id FROM chat_rooms WHERE is_active ORDER BY created_at DESC LIMIT :n"
+        ), {"n": n}).all()
+
+def token(sub: str, role: str) -> str:
+    return create_access_token(sub, {"role": role})
+
+async def chat_socket(ws_url: str, stop: asyncio.Event, lat: list, errors: list, interval: float) -> None:
+    async with websockets.connect(ws_url) as ws:
+        while not stop.is_set():
+            tag = f"bench {secrets.token_hex(4)}"
+            t0 = time.perf_counter()
+            try:
+                await ws.send(json.dumps({"type": "message", "message": tag}))
+                while True:
+                    msg = json.loads(await asyncio.wait_for(ws.recv(), timeout=10))
+                    if msg.get("type") == "new_message" and msg["message"]["message"] == tag:
+                        break
+                lat.append((time.perf_counter() - t0) * 1e3)
+            except Exception:
+                errors.append(1)
+            await asyncio.sleep(interval)
+
+async def http_worker(client: httpx.AsyncClient, stop: asyncio.Event, lat: list, errors: list, request) -> None:
+    while not stop.is_set():
+        method, path, kwargs = request()
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, path, **kwargs)
+            if r.status_code >= 400:
+                errors.append(r.status_code)
+                continue
+        except httpx.HTTPError:
+            errors.append(0)
+            continue
+        lat.append((time.perf_counter() - t0) * 1e3)
+
+async def run(args, rooms: list) -> dict:
+    stats = {name: ([], []) for name in ("chat socket", "chat list", "search")}
+    stop = asyncio.Event()
+    ws_base = args.base_url.replace("http", "ws", 1)
+    search_token = token(rooms[0].user_id, "user") if rooms else token(args.user_id, "user")
+    rng = random.Random(0)
+
+    def search_request():
+        return "POST", "/search", {
+            "headers": {"Authorization": f"Bearer {search_token}"},
+            "json": {
+                "keyword": rng.choice(KEYWORDS),
+                "lat": args.lat + rng.uniform(-args.jitter, args.jitter),
+                "lng": args.lng + rng.uniform(-args.jitter, args.jitter),
+                "top_k": args.k,
+                "range": args.range,
+            },
+        }
+
+    list_tokens = [token(r.user_id, "user") for r in rooms] + [token(r.senior_id, "senior_user") for r in rooms]
+
+    def list_request():
+        return "GET", "/chat/rooms", {"headers": {"Authorization": f"Bearer {rng.choice(list_tokens)}"}}
+
+    tasks = []
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30,
+                                 limits=httpx.Limits(max_connections=args.search_clients + args.list_clients)) as client:
+        for r in rooms:
+            for sub, role in ((r.user_id, "user"), (r.senior_id, "senior_user")):
+                url = f"{ws_base}/chat/ws/{r.id}?token={token(sub, role)}"
+                tasks.append(asyncio.create_task(chat_socket(url, stop, *stats["chat socket"], args.interval)))
+        if list_tokens:
+            tasks += [asyncio.create_task(http_worker(client, stop, *stats["chat list"], list_request)) for _ in range(args.list_clients)]
+        tasks += [asyncio.create_task(http_worker(client, stop, *stats["search"], search_request)) for _ in range(args.search_clients)]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return stats
+
+def cleanup(rooms: list) -> None:
+    with db.engine.begin() as conn:
+        n = conn.execute(text(
+            "DELETE FROM chat_messages WHERE room_id = ANY(:rooms) AND message LIKE 'bench %'"
+        ), {"rooms": [r.id for r in rooms]}).rowcount
+    print(f"removed {n} bench messages")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default="http://localhost:8000")
+    ap.add_argument("--rooms", type=int, default=10, help="active chat rooms to use (2 sockets each)")
+    ap.add_argument("--user-id", help="user id for search when there are no chat rooms")
+    ap.add_argument("--list-clients", type=int, default=8)
+    ap.add_argument("--search-clients", type=int, default=16)
+    ap.add_argument("--interval", type=float, default=0.2, help="seconds between messages per socket")
+    ap.add_argument("--duration", type=float, default=30)
+    ap.add_argument("--lat", type=float, default=13.7563)
+    ap.add_argument("--lng", type=float, default=100.5018)
+    ap.add_argument("--jitter", type=float, default=0.2, help="random offset in degrees around --lat/--lng")
+    ap.add_argument("--range", type=int, default=10000)
+    ap.add_argument("--k", type=int, default=20)
+    ap.add_argument("--keep-messages", action="store_true")
+    args = ap.parse_args()
+
+    rooms = load_rooms(args.rooms)
+    if not rooms and not args.user_id:
+        raise SystemExit("no active chat rooms; pass --user-id to run search only")
+    print(f"{len(rooms)} rooms, {2 * len(rooms)} sockets, {args.list_clients} list clients, "
+          f"{args.search_clients} search clients, {args.duration:.0f}s")
+
+    stats = asyncio.run(run(args, rooms))
+    print(f"{'op':<12} {'count':>7} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, (lat, errors) in stats.items():
+        if not lat:
+            print(f"{name:<12} {0:7d} {len(errors):7d}")
+            continue
+        print(f"{name:<12} {len(lat):7d} {len(errors):7d} {np.percentile(lat, 50):8.1f} "
+              f"{np.percentile(lat, 99):8.1f} {max(lat):8.1f}")
+
+    if rooms and not args.keep_messages:
+        cleanup(rooms)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Micro-benchmark: ranking แบบเดิม (ทีละแถว: haversine + setScore + filter/sorted)
+เทียบกับ app.utils.ranking.rank (NumPy vectorized)
+
+    python -m scripts.bench_ranking --n 2000 --repeat 50
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from haversine import haversine
+
+from app.utils.ranking import PROFILES, rank
+from app.utils.score import setScore
+
+def per_row(cands, lat, lng, range_m, k):
+    out = []
+    for c in cands:
+        dist = haversine((lat, lng), (c['lat'], c['lng']), unit="m")
+        out.append({"id": c['id'], "score": setScore(c['sim'], dist, 0.7, range_m), "distance": dist})
+    filtered = list(filter(lambda x: x['distance'] <= range_m, out))
+    over = sorted(filter(lambda x: x['score'] >= 0.5, filtered), key=lambda x: x['score'], reverse=True)
+    below = sorted(filter(lambda x: x['score'] < 0.5, filtered), key=lambda x: x['distance'])
+    return [*over, *below][:k]
+
+def vectorized(sims, lats, lngs, lat, lng, range_m, k):
+    order, _, _ = rank(sims, lats, lngs, lat, lng, range_m, PROFILES["default"], k)
+    return order
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=2000, help="number of candidates")
+    ap.add_argument("--k", type=int, default=20)
+    ap.add_argument("--range", type=float, default=10000.0)
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    rnd = random.Random(0)
+    lat, lng = 13.7563, 100.5018  # Bangkok
+    cands = [
+        {"id": f"S{i:08x}", "sim": rnd.random(), "lat": lat + rnd.uniform(-0.15, 0.15), "lng": lng + rnd.uniform(-0.15, 0.15)}
+        for i in range(args.n)
+    ]
+    sims = np.array([c['sim'] for c in cands])
+    lats = np.array([c['lat'] for c in cands])
+    lngs = np.array([c['lng'] for c in cands])
+
+    # ผลต้องตรงกันก่อนวัดเวลา
+    expected = [c['id'] for c in per_row(cands, lat, lng, args.range, args.k)]
+    got = [cands[i]['id'] for i in vectorized(sims, lats, lngs, lat, lng, args.range, args.k)]
+    assert expected == got, "vectorized ranking differs from per-row path"
+
+    t_row = timeit(lambda: per_row(cands, lat, lng, args.range, args.k), args.repeat)
+    t_vec = timeit(lambda: vectorized(sims, lats, lngs, lat, lng, args.range, args.k), args.repeat)
+    print(f"n={args.n} k={args.k}")
+    print(f"per-row    : {t_row * 1e3:8.3f} ms")
+    print(f"vectorized : {t_vec * 1e3:8.3f} ms  ({t_row / t_vec:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+เทียบการเก็บ embedding แบบ vector (float32) / halfvec (float16) / ลด dimension
+วัดขนาด heap + HNSW index, buffer hit ratio (EXPLAIN BUFFERS) และ recall@k เทียบ exact float32
+
+    python -m scripts.bench_vector_storage --variants vector:384,halfvec:384,halfvec:256,halfvec:256:pca
+    python -m scripts.bench_vector_storage --source table        # ใช้ embedding จริงใน senior_abilities
+    python -m scripts.bench_vector_storage --fit-pca pca256.npz --dim 256   # สร้างไฟล์สำหรับ EMBED_PCA_FILE
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from app.database.db import db
+from app.utils.config import HNSW_M, HNSW_EF_CONSTRUCTION
+from scripts.bench_vector_index import synthetic, vec_literal
+
+def fit_pca(x: np.ndarray, dim: int):
+    mean = x.mean(axis=0)
+    _, _, vt = np.linalg.svd(x - mean, full_matrices=False)
+    return mean.astype(np.float32), vt[:dim].astype(np.float32)
+
+def reduce(x: np.ndarray, dim: int, pca) -> np.ndarray:
+    x = (x - pca[0]) @ pca[1].T if pca is not None else x[:, :dim]
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+def table_embeddings() -> np.ndarray:
+    with db.engine.connect() as conn:
+        rows = conn.execute(text("SELECT embedding::text FROM senior_abilities WHERE embedding IS NOT NULL")).scalars()
+        x = np.array([json.loads(r) for r in rows], dtype=np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+def load(table: str, kind: str, data: np.ndarray) -> dict:
+    from psycopg2.extras import execute_values
+
+    dim = data.shape[1]
+    with db.engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        conn.execute(text(f"CREATE TABLE {table} (id serial PRIMARY KEY, embedding {kind}({dim}))"))
+    raw = db.engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        for i in range(0, len(data), 5000):
+            execute_values(cur, f"INSERT INTO {table} (embedding) VALUES %s",
+                           [(vec_literal(v),) for v in data[i:i + 5000]], template=f"(%s::{kind})")
+        raw.commit()
+    finally:
+        raw.close()
+    t0 = time.perf_counter()
+    with db.engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX {table}_idx ON {table} USING hnsw (embedding {kind}_cosine_ops) "
+                          f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"))
+        conn.execute(text(f"ANALYZE {table}"))
+        heap, index = conn.execute(text(
+            f"SELECT pg_table_size('{table}'), pg_relation_size('{table}_idx')"
+        )).one()
+    return {"build_s": time.perf_counter() - t0, "heap": heap, "index": index}
+
+def run(table: str, kind: str, queries: np.ndarray, k: int, ef: int):
+    sql = f"SELECT id FROM {table} ORDER BY embedding <=> CAST(:q AS {kind}) LIMIT :k"
+    ids, lat, hit, read = [], [], 0, 0
+    with db.engine.connect() as conn:
+        for q in queries:
+            with conn.begin():
+                conn.execute(text("SELECT set_config('hnsw.ef_search', :v, true)"), {"v": str(ef)})
+                params = {"q": vec_literal(q), "k": k}
+                plan = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), params).scalar()
+                top = (plan if isinstance(plan, list) else json.loads(plan))[0]["Plan"]
+                hit += top.get("Shared Hit Blocks", 0)
+                read += top.get("Shared Read Blocks", 0)
+                t0 = time.perf_counter()
+                # id เริ่มที่ 1 ตามลำดับที่ insert
+                ids.append([i - 1 for i in conn.execute(text(sql), params).scalars()])
+                lat.append((time.perf_counter() - t0) * 1e3)
+    return ids, lat, hit / max(hit + read, 1)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--variants", default="vector:384,halfvec:384,halfvec:256,halfvec:256:pca",
+                    help="comma separated type:dim[:pca]")
+    ap.add_argument("--source", choices=["synthetic", "table"], default="synthetic")
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=20)
+    ap.add_argument("--ef", type=int, default=40)
+    ap.add_argument("--fit-pca", metavar="PATH", help="fit PCA on senior_abilities.embedding and save it, then exit")
+    ap.add_argument("--dim", type=int, default=256)
+    args = ap.parse_args()
+
+    if args.fit_pca:
+        mean, components = fit_pca(table_embeddings(), args.dim)
+        np.savez(args.fit_pca, mean=mean, components=components)
+        print(f"saved {args.fit_pca}: {components.shape}; set EMBED_STORE_DIM={args.dim} EMBED_PCA_FILE={args.fit_pca}")
+        return
+
+    rng = np.random.default_rng(0)
+    if args.source == "table":
+        data = table_embeddings()
+        pick = data[rng.integers(0, len(data), args.queries)]
+        queries = pick + 0.05 * rng.normal(size=pick.shape).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    else:
+        data = synthetic(args.rows, 200, rng)
+        queries = synthetic(args.queries, 200, rng)
+
+    # ground truth: exact cosine บน float32 เต็ม dimension
+    exact = [list(np.argsort(-(data @ q), kind="stable")[:args.k]) for q in queries]
+
+    print(f"{'variant':<18} {'heap MB':>8} {'index MB':>9} {'build s':>8} {'hit %':>6} {'recall':>7} {'p50 ms':>7}")
+    for spec in args.variants.split(","):
+        kind, dim, *opt = spec.split(":")
+        dim = int(dim)
+        pca = fit_pca(data, dim) if "pca" in opt else None
+        stored = reduce(data, dim, pca) if dim != data.shape[1] or pca is not None else data
+        q = reduce(queries, dim, pca) if dim != data.shape[1] or pca is not None else queries
+        table = f"bench_storage_{kind}_{dim}{'_pca' if pca is not None else ''}"
+        size = load(table, kind, stored)
+        got, lat, hit_ratio = run(table, kind, q, args.k, args.ef)
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(got, exact)])
+        print(f"{spec:<18} {size['heap'] / 2**20:8.1f} {size['index'] / 2**20:9.1f} {size['build_s']:8.1f} "
+              f"{hit_ratio * 100:6.1f} {recall:7.3f} {np.percentile(lat, 50):7.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+สร้าง/ปรับ index บน senior_abilities (ANN index หลัก, partial ANN ของ FILTER_VECTOR_INDEXES, composite B-tree ของ filter, GIN trigram ของ lexical search)
+ให้ตรงกับ config ด้วย CREATE/DROP INDEX CONCURRENTLY จึงรันระหว่างที่ app ให้บริการอยู่ได้
+app ตอน startup แค่เตือนเมื่อ index ไม่ตรง config (DB.check_indexes) ไม่ build เอง
+
+    python -m scripts.build_indexes            # ทำตามแผน
+    python -m scripts.build_indexes --dry-run  # แสดงแผนอย่างเดียว
+
+build ที่ล้มกลางทางจะเหลือ index INVALID ซึ่งรอบถัดไปจะ drop แล้ว build ใหม่
+"""
+import argparse
+import logging
+
+from app.database.db import db
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dry-run", action="store_true", help="print the plan without changing anything")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    db.init_extensions()
+    with db.engine.connect() as conn:
+        plan = db.index_plan(conn)
+    for action, names in plan.items():
+        print(f"{action:<8} {', '.join(names) or '-'}")
+    if args.dry_run or not any(plan.values()):
+        return
+    db.build_indexes()
+    print("done")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+เทียบ backend ของ embedder (torch / onnx / int8) ด้าน accuracy และ latency
+- cosine ระหว่าง vector ของ backend กับ torch (ควรใกล้ 1)
+- overlap ของ top-k nearest neighbours เทียบกับ torch
+- latency ต่อ batch
+
+    python -m scripts.compare_embed_backends --backends torch,int8,onnx
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.utils.embedder import EMBEDDING_DIM, load_model
+
+QUERIES = ["ทำอาหาร", "ขับรถ", "ซ่อมบ้าน", "ซ่อมรถ", "ทำสวน", "ดูแลเด็ก", "ดูแลผู้ป่วย", "สอนหนังสือ",
+           "ตัดผม", "เย็บผ้า", "งานไม้", "ทำความสะอาด", "cooking", "driver", "gardening", "tutor"]
+DOCS = ["แม่ครัว ทำอาหารไทย", "คนขับรถ มีรถกระบะ", "ช่างไม้ ซ่อมเฟอร์นิเจอร์", "ช่างยนต์ ซ่อมรถจักรยานยนต์",
+        "ชาวสวน ปลูกผัก", "พี่เลี้ยงเด็ก", "พยาบาลเกษียณ ดูแลผู้สูงอายุ", "ครูเกษียณ สอนคณิตศาสตร์",
+        "ช่างตัดผมชาย", "ช่างเย็บผ้า แก้เสื้อผ้า", "แม่บ้าน ทำความสะอาด", "ช่างไฟฟ้า เดินสายไฟ",
+        "retired chef", "taxi driver", "landscape gardener", "english tutor"]
+
+def encode(model, texts):
+    return np.asarray(model.encode(texts, batch_size=len(texts), normalize_embeddings=True), dtype=np.float32)
+
+def latency_ms(model, texts, repeat):
+    encode(model, texts)
+    t = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        encode(model, texts)
+        t.append(time.perf_counter() - t0)
+    return float(np.median(t) * 1e3)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", default="torch,int8")
+    ap.add_argument("--k", type=int, default=3)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    base = load_model("torch")
+    base_q, base_d = encode(base, QUERIES), encode(base, DOCS)
+    base_top = np.argsort(-(base_q @ base_d.T), axis=1)[:, :args.k]
+
+    print(f"{'backend':8s} {'dim':>4s} {'cos(q)':>8s} {'cos(d)':>8s} {'top%d':>6s} {'1 (ms)':>8s} {'16 (ms)':>8s}" % args.k)
+    for name in args.backends.split(","):
+        model = base if name == "torch" else load_model(name)
+        q, d = encode(model, QUERIES), encode(model, DOCS)
+        assert q.shape[1] == EMBEDDING_DIM
+        top = np.argsort(-(q @ d.T), axis=1)[:, :args.k]
+        overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(top, base_top)])
+        print(f"{name:8s} {q.shape[1]:4d} {np.mean(np.sum(q * base_q, axis=1)):8.4f} {np.mean(np.sum(d * base_d, axis=1)):8.4f} "
+              f"{overlap:6.2f} {latency_ms(model, QUERIES[:1], args.repeat):8.2f} {latency_ms(model, QUERIES, args.repeat):8.2f}")
+
+if __name__ == "__main__":
+    main()
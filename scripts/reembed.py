@@ -0,0 +1,212 @@
+"""
+backfill / re-embed senior_abilities ทั้งตารางเป็น chunk
+- อ่านด้วย server-side cursor (stream_results) เรียงตาม id
+- encode ทีละ batch ใหญ่แล้วเขียนกลับด้วย UPDATE ... FROM (VALUES ...) ครั้งเดียวต่อ chunk
+- commit ทีละ chunk และบันทึก checkpoint (id ล่าสุด) จึงรันต่อจากจุดเดิมได้
+- --column เขียนลง shadow column แทน embedding เพื่อเปลี่ยน MODEL_NAME / EMBED_STORAGE / EMBED_STORE_DIM
+  แล้ว --swap สลับ shadow column กับ embedding (พร้อม ANN index) ใน transaction เดียว
+- trigger บน shadow column ล้างค่าเป็น NULL เมื่อ career/other_ability ถูกแก้ระหว่าง backfill
+  และ --swap re-embed แถว NULL เหล่านี้ (รอบสุดท้ายใต้ LOCK กันการเขียน) ก่อน rename
+
+    python -m scripts.reembed --missing-only                    # เติมแถวที่ embedding เป็น NULL
+    MODEL_NAME=new-model python -m scripts.reembed --column embedding_next
+    python -m scripts.reembed --column embedding_next --swap    # ทันทีหลัง deploy MODEL_NAME ใหม่
+
+ช่วงผสมโมเดล: ตั้งแต่ deploy MODEL_NAME ใหม่จนถึง --swap query ถูก embed ด้วยโมเดลใหม่แต่เทียบกับ embedding
+ของโมเดลเดิม ผลค้นหาคุณภาพตกจึงควรรัน --swap ต่อทันที ถ้า dimension/ชนิดที่เก็บเปลี่ยน (EMBED_STORE_DIM,
+EMBED_STORAGE) query จะ error ตลอดช่วงนี้ ต้อง deploy และ swap ใน maintenance window เดียวกัน
+ระหว่าง LOCK ของ --swap การเขียน senior_abilities จะรอจน re-embed แถวที่เหลือเสร็จ
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from app.database.db import VECTOR_INDEX_NAME, db, embedding_sql_type
+from app.database.redis import PRESENCE_CHANNEL, get_redis, online_ids, presence_event
+from app.services.principal_cache import principal_cache
+from app.utils.config import MODEL_NAME
+from app.utils.embedder import ability_text, get_model, reduce_embeddings
+
+_IDENT = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+def vec_literal(v: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.7g}" for x in v) + "]"
+
+def load_checkpoint(path: str, column: str) -> str:
+    if not os.path.exists(path):
+        return ""
+    with open(path) as f:
+        cp = json.load(f)
+    if cp.get("column") != column or cp.get("model") != MODEL_NAME or cp.get("type") != embedding_sql_type():
+        print(f"checkpoint {path} is for {cp.get('column')}/{cp.get('model')}/{cp.get('type')}, starting over")
+        return ""
+    return cp.get("last_id", "")
+
+def save_checkpoint(path: str, column: str, last_id: str) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"column": column, "model": MODEL_NAME, "type": embedding_sql_type(), "last_id": last_id}, f)
+    os.replace(tmp, path)
+
+def ensure_column(column: str) -> None:
+    """สร้าง shadow column และ trigger ที่ล้างค่าเป็น NULL เมื่อข้อความของ ability เปลี่ยน (swap จะ re-embed ให้)"""
+    if column == "embedding":
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE senior_abilities ADD COLUMN IF NOT EXISTS {column} {embedding_sql_type()}"))
+        conn.execute(text(f"""
+            CREATE OR REPLACE FUNCTION {column}_invalidate() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                IF NEW.career IS DISTINCT FROM OLD.career OR NEW.other_ability IS DISTINCT FROM OLD.other_ability THEN
+                    NEW.{column} := NULL;
+                END IF;
+                RETURN NEW;
+            END $$
+        """))
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {column}_invalidate ON senior_abilities"))
+        conn.execute(text(
+            f"CREATE TRIGGER {column}_invalidate BEFORE UPDATE OF career, other_ability ON senior_abilities "
+            f"FOR EACH ROW EXECUTE FUNCTION {column}_invalidate()"
+        ))
+
+def encode(model, rows, batch: int) -> np.ndarray:
+    texts = [ability_text(r.career, r.other_ability) for r in rows]
+    return np.asarray(reduce_embeddings(model.encode(texts, batch_size=batch, normalize_embeddings=True)), dtype=np.float32)
+
+def write_chunk(column: str, rows: list, vecs: np.ndarray, conn=None) -> None:
+    """
+    เขียน vector ของ rows ลง column เฉพาะแถวที่ career/other_ability ยังตรงกับตอนอ่าน
+    (แถวที่ถูกแก้ระหว่าง encode คงเป็น NULL ให้รอบถัดไปหรือ swap re-embed)
+    conn: เขียนใน transaction ของ connection นี้ (ไม่ commit) แทนการเปิด connection ใหม่
+    """
+    from psycopg2.extras import execute_values
+
+    raw = conn.connection.dbapi_connection if conn is not None else db.engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        execute_values(
+            cur,
+            f"UPDATE senior_abilities AS a SET {column} = v.embedding::{embedding_sql_type()} "
+            f"FROM (VALUES %s) AS v(id, career, other_ability, embedding) WHERE a.id = v.id "
+            f"AND a.career IS NOT DISTINCT FROM v.career AND a.other_ability IS NOT DISTINCT FROM v.other_ability",
+            [(r.id, r.career, r.other_ability, vec_literal(v)) for r, v in zip(rows, vecs)],
+            page_size=len(rows),
+        )
+        if conn is None:
+            raw.commit()
+    finally:
+        if conn is None:
+            raw.close()
+
+def missing_rows(conn, column: str) -> list:
+    return conn.execute(text(
+        f"SELECT a.id, a.career, a.other_ability, u.id AS senior_id FROM senior_abilities a "
+        f"LEFT JOIN senior_users u ON u.ability_id = a.id WHERE a.{column} IS NULL ORDER BY a.id"
+    )).all()
+
+async def publish_refresh(senior_ids: list) -> None:
+    """ให้ online index ของทุก worker โหลด embedding ใหม่ของ senior ที่ออนไลน์อยู่ และล้าง principal cache ของ senior เหล่านั้น"""
+    if senior_ids:
+        await get_redis().publish(PRESENCE_CHANNEL, presence_event("refresh", ids=senior_ids))
+        await principal_cache.invalidate("senior_user", senior_ids)
+
+async def backfill(args) -> None:
+    column = args.column
+    ensure_column(column)
+    after = "" if args.reset else load_checkpoint(args.checkpoint, column)
+    if after:
+        print(f"resuming after id {after}")
+
+    where = ["a.id > :after"]
+    if args.missing_only:
+        where.append(f"a.{column} IS NULL")
+    sql = text(
+        f"SELECT a.id, a.career, a.other_ability, u.id AS senior_id FROM senior_abilities a "
+        f"LEFT JOIN senior_users u ON u.ability_id = a.id "
+        f"WHERE {' AND '.join(where)} ORDER BY a.id"
+    )
+
+    model = get_model()
+    done, t0 = 0, time.perf_counter()
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=args.chunk).execute(sql, {"after": after})
+        for rows in result.partitions(args.chunk):
+            ids = [r.id for r in rows]
+            write_chunk(column, rows, encode(model, rows, args.batch))
+            save_checkpoint(args.checkpoint, column, ids[-1])
+            if column == "embedding":
+                await publish_refresh([r.senior_id for r in rows if r.senior_id])
+            done += len(rows)
+            elapsed = time.perf_counter() - t0
+            print(f"{done} rows  last_id={ids[-1]}  {done / elapsed:.0f} rows/s")
+    print(f"done: {done} rows into {column} with {MODEL_NAME}")
+
+async def swap(args) -> None:
+    """
+    สลับ shadow column เป็น embedding
+    1. สร้าง ANN index บน shadow แบบ CONCURRENTLY
+    2. re-embed แถวที่ shadow เป็น NULL (แถวใหม่ หรือถูกแก้หลัง backfill) โดยยังไม่ล็อก
+    3. transaction เดียว: LOCK กันการเขียน, re-embed แถวที่เพิ่งเปลี่ยนระหว่างข้อ 2, rename column/index
+       (ค่าเดิมเก็บไว้ใน embedding_prev) และลบ trigger ของ shadow
+    """
+    column = args.column
+    if column == "embedding":
+        raise SystemExit("--swap needs a shadow --column")
+    shadow_idx = f"{column}_idx"
+    ddl, _ = db.vector_index_ddl(name=shadow_idx, column=column, concurrently=True)
+    model = get_model()
+    with db.engine.connect() as conn:
+        missing = conn.execute(text(f"SELECT count(*) FROM senior_abilities WHERE {column} IS NULL")).scalar()
+        if missing > args.chunk and not args.force:
+            raise SystemExit(f"{missing} rows have no {column} yet; finish the backfill or pass --force")
+        if ddl:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text(ddl))
+    with db.engine.connect() as conn:
+        rows = missing_rows(conn, column)
+    if rows:
+        write_chunk(column, rows, encode(model, rows, args.batch))
+        print(f"re-embedded {len(rows)} rows changed since the backfill")
+    with db.engine.begin() as conn:
+        conn.execute(text("LOCK TABLE senior_abilities IN SHARE ROW EXCLUSIVE MODE"))
+        rows = missing_rows(conn, column)
+        if rows:
+            write_chunk(column, rows, encode(model, rows, args.batch), conn=conn)
+            print(f"re-embedded {len(rows)} rows under lock")
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {column}_invalidate ON senior_abilities"))
+        conn.execute(text(f"DROP FUNCTION IF EXISTS {column}_invalidate()"))
+        conn.execute(text("ALTER TABLE senior_abilities DROP COLUMN IF EXISTS embedding_prev"))
+        conn.execute(text("ALTER TABLE senior_abilities RENAME COLUMN embedding TO embedding_prev"))
+        conn.execute(text(f"ALTER TABLE senior_abilities RENAME COLUMN {column} TO embedding"))
+        # index เดิม (รวม partial index ของ filter) ชี้ไปที่ embedding_prev แล้ว; partial สร้างใหม่ด้านล่าง
+        for name in db._vector_index_names(conn):
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        if ddl:
+            conn.execute(text(f"ALTER INDEX {shadow_idx} RENAME TO {VECTOR_INDEX_NAME}"))
+    db.build_indexes()
+    await publish_refresh(await online_ids())
+    print(f"swapped {column} -> embedding (previous values in embedding_prev)")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--column", default="embedding", help="target column (shadow column is created if missing)")
+    ap.add_argument("--missing-only", action="store_true", help="only rows whose target column is NULL")
+    ap.add_argument("--chunk", type=int, default=1000, help="rows per cursor fetch / UPDATE")
+    ap.add_argument("--batch", type=int, default=128, help="texts per model forward pass")
+    ap.add_argument("--checkpoint", default=".reembed.checkpoint")
+    ap.add_argument("--reset", action="store_true", help="ignore the checkpoint and start from the first row")
+    ap.add_argument("--swap", action="store_true", help="promote --column to embedding")
+    ap.add_argument("--force", action="store_true", help="swap even if more than --chunk rows are still NULL (re-embedded during the swap)")
+    args = ap.parse_args()
+
+    if not _IDENT.match(args.column):
+        raise SystemExit(f"invalid column name: {args.column}")
+    asyncio.run(swap(args) if args.swap else backfill(args))
+
+if __name__ == "__main__":
+    main()
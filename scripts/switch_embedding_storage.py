@@ -0,0 +1,38 @@
+"""
+แปลงชนิดคอลัมน์ embedding ของ senior_abilities ให้ตรงกับ EMBED_STORAGE / EMBED_STORE_DIM
+(vector <-> halfvec หรือลด dimension แบบตัดมิติแรก) พร้อมสร้าง ANN index ใหม่ใน transaction เดียวกัน
+app ตอน startup แค่เตือนเมื่อชนิดไม่ตรง (DB.check_embedding_storage) ไม่ ALTER เอง
+
+    python -m scripts.switch_embedding_storage            # แปลงและ build index
+    python -m scripts.switch_embedding_storage --dry-run  # แสดงชนิดปัจจุบัน/ที่ต้องการอย่างเดียว
+
+ALTER COLUMN TYPE rewrite ทั้งตารางและล็อกทั้งอ่านและเขียนจนเสร็จ ควรรันใน maintenance window
+PCA หรือเพิ่ม dimension ต้อง re-embed ด้วย scripts.reembed --column ... --swap แทน
+"""
+import argparse
+import logging
+
+from app.database.db import db
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dry-run", action="store_true", help="print the change without altering anything")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    db.init_extensions()
+    with db.engine.connect() as conn:
+        change = db._embedding_storage_change(conn)
+    if change is None:
+        print("embedding storage already matches config")
+        return
+    current, target, using = change
+    print(f"{current} -> {target} using {using or '- (needs scripts.reembed --column ... --swap)'}")
+    if args.dry_run or using is None:
+        return
+    db.switch_embedding_storage()
+    db.build_indexes()
+    print("done")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+fixture ร่วมของ test: Postgres จริง (PG_* ใน env/.env; ข้ามถ้าเชื่อมต่อไม่ได้) + Redis ปลอมใน memory
+และตัวนับ SQL statement ผ่าน event before_cursor_execute; FakeSession สำหรับ test ที่ไม่ใช้ DB
+Lua script (register_script) รันจริงบน Lua 5.1 ผ่าน lupa เหมือน Redis
+"""
+import json
+import math
+import secrets
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+import pytest
+from sqlalchemy import event, exc
+from sqlalchemy.dialects import postgresql
+
+class FakeRedis:
+    """
+    Redis ใน memory เท่าที่ route ใช้ (key/value, hash, ZSET, GEO, pub/sub publish, Lua script)
+    calls เก็บชื่อคำสั่งทุกคำสั่ง (script นับเป็น evalsha คำสั่งเดียว); round_trips นับคำสั่งเดี่ยว + pipeline.execute() ละ 1
+    """
+    def __init__(self) -> None:
+        self.kv: Dict[str, object] = {}
+        self.hashes: Dict[str, Dict[str, object]] = defaultdict(dict)
+        self.zsets: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self.geo: Dict[str, Dict[str, tuple]] = defaultdict(dict)
+        self.published: List[tuple] = []
+        self.calls: List[str] = []
+        self.round_trips = 0
+
+    def mark_online(self, senior_id: str, lat: float, lng: float, ttl: float = 60) -> None:
+        """presence แบบที่ heartbeat script เขียน: ZSET score = เวลาหมดอายุ + GEO set"""
+        from app.database.redis import _GEO_KEY, _ONLINE_KEY
+        self.zsets[_ONLINE_KEY][senior_id] = time.time() + ttl
+        self.geo[_GEO_KEY][senior_id] = (lng, lat)
+
+    def reset_counts(self) -> None:
+        self.calls.clear()
+        self.round_trips = 0
+
+    async def _call(self, name: str, *args, **kwargs):
+        self.round_trips += 1
+        return self._run(name, *args, **kwargs)
+
+    def _run(self, name: str, *args, **kwargs):
+        self.calls.append(name)
+        return getattr(self, f"_{name}")(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        if hasattr(type(self), f"_{name}"):
+            return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+        raise AttributeError(name)
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    def register_script(self, source: str) -> "FakeScript":
+        return FakeScript(self, source)
+
+    # ---- commands ----
+    def _get(self, key):
+        return self.kv.get(key)
+
+    def _mget(self, keys):
+        return [self.kv.get(k) for k in keys]
+
+    def _set(self, key, value, ex=None):
+        self.kv[key] = value
+        return True
+
+    def _delete(self, *keys):
+        n = 0
+        for key in keys:
+            n += sum(key in d and d.pop(key) is not None for d in (self.kv, self.hashes, self.zsets, self.geo))
+        return n
+
+    def _expire(self, key, seconds):
+        return key in self.kv
+
+    def _hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def _hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(f) for f in fields]
+
+    def _hset(self, key, field=None, value=None, mapping=None):
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        self.hashes[key].update(items)
+        return len(items)
+
+    def _zadd(self, key, mapping):
+        self.zsets[key].update(mapping)
+        return len(mapping)
+
+    def _zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    def _zmscore(self, key, members):
+        return [self.zsets.get(key, {}).get(m) for m in members]
+
+    def _zrangebyscore(self, key, lo, hi):
+        lo = -math.inf if lo == "-inf" else float(lo)
+        hi = math.inf if hi == "+inf" else float(hi)
+        return [m for m, s in sorted(self.zsets.get(key, {}).items(), key=lambda x: x[1]) if lo <= s <= hi]
+
+    def _zrem(self, key, *members):
+        # GEO set ใน Redis คือ ZSET จึงลบด้วย ZREM ได้
+        zset = self.geo.get(key) if key in self.geo else self.zsets.get(key, {})
+        return sum(zset.pop(m, None) is not None for m in members)
+
+    def _geoadd(self, key, members):
+        for lng, lat, m in members:
+            self.geo[key][m] = (lng, lat)
+        return len(members)
+
+    def _geopos(self, key, *members):
+        return [self.geo.get(key, {}).get(m) for m in members]
+
+    def _geosearch(self, key, longitude, latitude, radius, unit="m", sort=None, withdist=False, withcoord=False, **_):
+        from app.utils.ranking import haversine_m
+        rows = []
+        for m, (lng, lat) in self.geo.get(key, {}).items():
+            d = float(haversine_m(latitude, longitude, np.array([lat]), np.array([lng]))[0])
+            if d <= radius:
+                rows.append((m, d, (lng, lat)))
+        rows.sort(key=lambda r: r[1], reverse=sort == "DESC")
+        return [[m, d, c] for m, d, c in rows]
+
+    def _publish(self, channel, message):
+        self.published.append((channel, message))
+        return 0
+
+    def _lua_call(self, cmd: str, *args):
+        """redis.call(...) จาก Lua: argument แบบ raw command -> method ข้างบน, คืนค่าแบบ RESP (ตัวเลข score เป็น string)"""
+        cmd = cmd.lower()
+        if cmd == "zadd":
+            key, score, member = args
+            return self._zadd(key, {member: float(score)})
+        if cmd == "zscore":
+            score = self._zscore(*args)
+            return None if score is None else repr(score)
+        if cmd == "set":
+            return self._set(args[0], args[1])
+        if cmd == "expire":
+            return int(self._expire(args[0], int(args[1])))
+        if cmd == "geoadd":
+            key, lng, lat, member = args
+            return self._geoadd(key, [(float(lng), float(lat), member)])
+        if cmd == "geopos":
+            return [[repr(p[0]), repr(p[1])] if p else None for p in self._geopos(*args)]
+        return getattr(self, f"_{'delete' if cmd == 'del' else cmd}")(*args)
+
+class FakeScript:
+    """register_script ของ FakeRedis: KEYS/ARGV เป็น string แบบที่ redis-py ส่ง, redis.call ไปที่ FakeRedis._lua_call"""
+    def __init__(self, redis: FakeRedis, source: str) -> None:
+        from lupa.lua51 import LuaRuntime, lua_type
+        self._redis = redis
+        self._source = source
+        self._lua = LuaRuntime(unpack_returned_tuples=True)
+        self._lua_type = lua_type
+        to_lua, from_lua = self._to_lua, self._from_lua
+        g = self._lua.globals()
+        g.redis = self._lua.table_from({"call": lambda cmd, *a: to_lua(redis._lua_call(cmd, *[from_lua(x) for x in a]))})
+        g.cjson = self._lua.table_from({"encode": lambda t: json.dumps(from_lua(t))})
+
+    def _to_lua(self, value):
+        if value is None:
+            return False
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, (list, tuple)):
+            return self._lua.table_from([self._to_lua(v) for v in value])
+        return value
+
+    def _from_lua(self, value):
+        if self._lua_type(value) != "table":
+            return None if value is False else value
+        keys = list(value.keys())
+        if keys == list(range(1, len(keys) + 1)):
+            return [self._from_lua(value[i]) for i in keys]
+        return {k: self._from_lua(v) for k, v in value.items()}
+
+    async def __call__(self, keys=(), args=()):
+        self._redis.round_trips += 1
+        self._redis.calls.append("evalsha")
+        g = self._lua.globals()
+        g.KEYS = self._lua.table_from([str(k) for k in keys])
+        g.ARGV = self._lua.table_from([repr(a) if isinstance(a, float) else str(a) for a in args])
+        result = self._from_lua(self._lua.execute(self._source))
+        return int(result) if isinstance(result, float) else result
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self._redis = redis
+        self._queued: List[tuple] = []
+
+    def __getattr__(self, name: str):
+        if hasattr(FakeRedis, f"_{name}"):
+            def queue(*args, **kwargs):
+                self._queued.append((name, args, kwargs))
+                return self
+            return queue
+        raise AttributeError(name)
+
+    async def execute(self):
+        self._redis.round_trips += 1
+        queued, self._queued = self._queued, []
+        return [self._redis._run(name, *args, **kwargs) for name, args, kwargs in queued]
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    from app.database import redis as redis_module
+    fake = FakeRedis()
+    monkeypatch.setattr(redis_module, "_redis", fake)
+    monkeypatch.setattr(redis_module, "_redis_raw", fake)
+    # script ที่ register ไว้กับ client ของ test ก่อนหน้า
+    for name in ("_heartbeat_script", "_release_script", "_expire_script"):
+        monkeypatch.setattr(redis_module, name, None)
+    return fake
+
+@pytest.fixture(scope="session")
+def database():
+    from app.database.db import db
+    try:
+        db.init_extensions()
+        db.create_all()
+    except exc.OperationalError as e:
+        pytest.skip(f"PostgreSQL is not reachable: {e.orig}")
+    return db
+
+class StatementCounter:
+    """statement ที่ส่งถึง Postgres ผ่าน engine ระหว่าง with block"""
+    def __init__(self, engine) -> None:
+        self.engine = engine
+        self.statements: List[str] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements.append(statement)
+
+    def __enter__(self) -> "StatementCounter":
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    def matching(self, needle: str) -> List[str]:
+        return [s for s in self.statements if needle in s]
+
+class FakeResult:
+    def __init__(self, rows) -> None:
+        self._rows = list(rows)
+
+    def all(self) -> list:
+        return list(self._rows)
+
+    def first(self):
+        return self._rows[0] if self._rows else None
+
+    def scalar(self):
+        row = self.first()
+        return row[0] if isinstance(row, tuple) else row
+
+    def scalars(self) -> "FakeResult":
+        return FakeResult(r[0] if isinstance(r, tuple) else r for r in self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+class FakeSession:
+    """
+    Session ที่ไม่ต่อ DB: บันทึก SQL ทุก statement (compile ด้วย dialect postgresql) และตอบด้วย respond(sql) -> rows
+    run_sync เรียก fn กับตัวเองจึงใช้แทน AsyncSession ของ route ได้
+    """
+    def __init__(self, respond=lambda sql: []) -> None:
+        self.respond = respond
+        self.statements: List[str] = []
+
+    def execute(self, stmt, params=None) -> FakeResult:
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        self.statements.append(sql)
+        return FakeResult(self.respond(sql))
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self, *args, **kwargs)
+
+    def matching(self, needle: str) -> List[str]:
+        return [s for s in self.statements if needle in s]
+
+    def commit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+@pytest.fixture
+def count_statements():
+    return StatementCounter
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+def unit_vector(seed: int, dim: int) -> List[float]:
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (v / np.linalg.norm(v)).tolist()
+
+@pytest.fixture
+def make_seniors(database):
+    """สร้าง senior + profile + ability (มี embedding) n คน คืน id; ลบทิ้งหลังจบ test"""
+    from sqlalchemy import delete
+    from app.database.models.senior_users import SeniorAbilities, SeniorProfiles, SeniorUsers
+    from app.utils.embedder import STORE_DIM
+
+    created = []
+
+    def make(n: int, **ability) -> List[str]:
+        with database.session() as session:
+            seniors = []
+            for i in range(n):
+                seniors.append(SeniorUsers(
+                    displayname=f"test senior {i}",
+                    profile=SeniorProfiles(phone=f"test-{secrets.token_hex(6)}", first_name="ทดสอบ"),
+                    ability=SeniorAbilities(**{
+                        "career": "ช่างไม้", "other_ability": "ซ่อมบ้าน", "type": "home",
+                        "vehicle": True, "offsite_work": True,
+                        "embedding": unit_vector(len(created) + i, STORE_DIM), **ability,
+                    }),
+                ))
+            session.add_all(seniors)
+            session.flush()
+            rows = [(s.id, s.profile_id, s.ability_id) for s in seniors]
+        created.extend(rows)
+        return [sid for sid, _, _ in rows]
+
+    yield make
+    if created:
+        sids, pids, aids = (list(x) for x in zip(*created))
+        with database.session() as session:
+            session.execute(delete(SeniorUsers).where(SeniorUsers.id.in_(sids)))
+            session.execute(delete(SeniorProfiles).where(SeniorProfiles.id.in_(pids)))
+            session.execute(delete(SeniorAbilities).where(SeniorAbilities.id.in_(aids)))
+
+@pytest.fixture
+def make_user(database):
+    """สร้าง user + profile คืน id; ลบทิ้งหลังจบ test"""
+    from sqlalchemy import delete
+    from app.database.models.users import UserProfiles, Users
+
+    created = []
+
+    def make() -> str:
+        with database.session() as session:
+            user = Users(displayname="test user", profile=UserProfiles(phone=f"test-{secrets.token_hex(6)}"))
+            session.add(user)
+            session.flush()
+            created.append((user.id, user.profile_id))
+            return user.id
+
+    yield make
+    if created:
+        uids, pids = (list(x) for x in zip(*created))
+        with database.session() as session:
+            session.execute(delete(Users).where(Users.id.in_(uids)))
+            session.execute(delete(UserProfiles).where(UserProfiles.id.in_(pids)))
@@ -0,0 +1,53 @@
+"""EmbeddingBatcher หลัง stop(): ไม่มี future ค้าง และไม่รับงานใหม่"""
+import asyncio
+import queue
+import threading
+
+import numpy as np
+import pytest
+
+from app.utils.embed_batcher import EmbeddingBatcher
+
+def _encode(texts):
+    return np.ones((len(texts), 3), dtype=np.float32)
+
+@pytest.mark.anyio
+async def test_stop_finishes_queued_work_then_rejects_submit():
+    release = threading.Event()
+
+    def slow_encode(texts):
+        release.wait(5)
+        return _encode(texts)
+
+    b = EmbeddingBatcher(slow_encode, max_batch=1, max_wait_ms=0)
+    b.start()
+    pending = [asyncio.ensure_future(b.submit(f"t{i}")) for i in range(3)]
+    await asyncio.sleep(0.05)
+    b.stop(timeout=0)
+    release.set()
+
+    assert await asyncio.wait_for(asyncio.gather(*pending), 2) == [[1.0, 1.0, 1.0]] * 3
+    with pytest.raises(RuntimeError, match="batcher stopped"):
+        await b.submit("late")
+
+@pytest.mark.anyio
+async def test_items_behind_sentinel_are_rejected():
+    b = EmbeddingBatcher(_encode)
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+    q = queue.Queue()
+    q.put(None)
+    q.put(("late", fut, loop))
+
+    await asyncio.to_thread(b._run, q)
+    with pytest.raises(RuntimeError, match="batcher stopped"):
+        await asyncio.wait_for(fut, 2)
+
+@pytest.mark.anyio
+async def test_start_after_stop_accepts_work():
+    b = EmbeddingBatcher(_encode)
+    b.start()
+    b.stop()
+    b.start()
+    assert await asyncio.wait_for(b.submit("again"), 2) == [1.0, 1.0, 1.0]
+    b.stop()
@@ -0,0 +1,34 @@
+"""embedding cache: key แยกตาม model/backend/dtype, normalize แค่ key ส่วน model ได้ข้อความเดิม"""
+import pytest
+
+from app.utils import embed_cache
+from app.utils.config import EMBED_BACKEND
+
+@pytest.fixture
+def encoded(fake_redis, monkeypatch):
+    """ข้อความที่ถูกส่งเข้า model"""
+    texts = []
+
+    async def embed_many(batch):
+        texts.extend(batch)
+        return [[float(len(t)), 0.0] for t in batch]
+
+    monkeypatch.setattr(embed_cache, "embed_many_async", embed_many)
+    monkeypatch.setattr(embed_cache, "_l1", embed_cache.LRUCache(16))
+    return texts
+
+def test_key_includes_backend_and_dtype():
+    key = embed_cache.query_key("ช่างไม้")
+    assert f":{EMBED_BACKEND}:float32" in key
+    assert embed_cache.query_key("  Plumber ") == embed_cache.query_key("plumber")
+
+@pytest.mark.anyio
+async def test_model_gets_original_text(encoded, fake_redis):
+    vecs = await embed_cache.cached_embed_many(["Fix  iPhone", "fix iphone", "ช่างไม้"])
+
+    assert encoded == ["Fix  iPhone", "ช่างไม้"]
+    assert vecs[0] == vecs[1]
+    assert embed_cache.query_key("fix iphone") in fake_redis.kv
+
+    assert await embed_cache.cached_embed_query("FIX IPHONE") == vecs[0]
+    assert encoded == ["Fix  iPhone", "ช่างไม้"]
@@ -0,0 +1,37 @@
+"""online index โหลด embedding จาก DB ได้ทั้ง vector (ndarray) และ halfvec (HalfVector)"""
+import numpy as np
+import pytest
+from pgvector import HalfVector
+
+from app.services import online_index as oi
+from app.services.search import IndexedSenior
+
+SENIOR = IndexedSenior("S00000001", "SA0000001", "home", "ช่างไม้", None, True, False, None)
+EMB = [0.6, 0.8, 0.0]
+
+@pytest.mark.parametrize("value", [np.array(EMB, dtype=np.float32), EMB, HalfVector(EMB)], ids=["vector", "list", "halfvec"])
+def test_load_converts_embedding(monkeypatch, value):
+    monkeypatch.setattr(oi, "load_abilities", lambda session, ids: [(*SENIOR, value)])
+    [(meta, emb)] = oi._load([SENIOR.senior_id])
+    assert meta == SENIOR
+    assert emb.dtype == np.float32
+    np.testing.assert_allclose(emb, EMB, atol=1e-3)
+
+@pytest.mark.anyio
+async def test_reconcile_loads_halfvec_rows(monkeypatch):
+    async def online_ids():
+        return [SENIOR.senior_id]
+
+    async def get_locations_batch(pids):
+        return {pid: {"id": pid, "lat": 13.75, "lng": 100.5} for pid in pids}
+
+    monkeypatch.setattr(oi, "online_ids", online_ids)
+    monkeypatch.setattr(oi, "get_locations_batch", get_locations_batch)
+    monkeypatch.setattr(oi, "load_abilities", lambda session, ids: [(*SENIOR, HalfVector(EMB))])
+
+    index = oi.OnlineIndex(dim=3)
+    await index.reconcile()
+
+    assert index.ready and SENIOR.senior_id in index
+    [(meta, sim, loc)] = index.search(EMB, 13.75, 100.5, 1000, 5)
+    assert meta.senior_id == SENIOR.senior_id and sim == pytest.approx(1.0, abs=1e-3)
@@ -0,0 +1,52 @@
+"""การลบ presence ที่หมดอายุ (trim / lazy prune) ต้องไม่ลบ senior ที่ heartbeat เข้ามาหลังการอ่านรายการ stale"""
+import json
+
+import pytest
+
+from app.database import redis as presence
+from app.database.redis import PRESENCE_CHANNEL, _GEO_KEY, _ONLINE_KEY
+
+LAT, LNG = 13.7563, 100.5018
+
+def _down_ids(fake_redis):
+    return [json.loads(m)["ids"] for ch, m in fake_redis.published if ch == PRESENCE_CHANNEL and json.loads(m)["op"] == "down"]
+
+def _heartbeat_after(fake_redis, monkeypatch, command: str, pid: str) -> None:
+    """ให้ senior heartbeat ทันทีหลังคำสั่ง command ตอบ (ก่อนขั้นลบ)"""
+    original = getattr(fake_redis, f"_{command}")
+
+    def run(*args, **kwargs):
+        result = original(*args, **kwargs)
+        fake_redis.mark_online(pid, LAT, LNG)
+        return result
+
+    monkeypatch.setattr(fake_redis, f"_{command}", run)
+
+@pytest.mark.anyio
+async def test_trim_removes_expired(fake_redis):
+    fake_redis.mark_online("S00000001", LAT, LNG, ttl=-1)
+    fake_redis.mark_online("S00000002", LAT, LNG)
+
+    assert await presence.trim_presence() == 1
+    assert set(fake_redis.zsets[_ONLINE_KEY]) == set(fake_redis.geo[_GEO_KEY]) == {"S00000002"}
+    assert _down_ids(fake_redis) == [["S00000001"]]
+
+@pytest.mark.anyio
+async def test_trim_keeps_senior_who_heartbeats_before_removal(fake_redis, monkeypatch):
+    fake_redis.mark_online("S00000001", LAT, LNG, ttl=-1)
+    _heartbeat_after(fake_redis, monkeypatch, "zrangebyscore", "S00000001")
+
+    assert await presence.trim_presence() == 0
+    assert "S00000001" in fake_redis.zsets[_ONLINE_KEY] and "S00000001" in fake_redis.geo[_GEO_KEY]
+    assert _down_ids(fake_redis) == []
+
+@pytest.mark.anyio
+async def test_prune_keeps_senior_who_heartbeats_before_removal(fake_redis, monkeypatch):
+    fake_redis.mark_online("S00000001", LAT, LNG, ttl=-1)
+    fake_redis.mark_online("S00000002", LAT, LNG, ttl=-1)
+    _heartbeat_after(fake_redis, monkeypatch, "zmscore", "S00000001")
+
+    # ผลของ request นี้อิง score ที่อ่านได้ (ทั้งคู่หมดอายุ) แต่ลบเฉพาะคนที่ยังหมดอายุตอนลบ
+    assert await presence.nearby_online(LAT, LNG, 1000) == []
+    assert set(fake_redis.zsets[_ONLINE_KEY]) == set(fake_redis.geo[_GEO_KEY]) == {"S00000001"}
+    assert _down_ids(fake_redis) == [["S00000002"]]
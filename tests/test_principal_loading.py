@@ -0,0 +1,122 @@
+"""user/senior พร้อม profile (+ ability) ต้องมาใน SELECT เดียว: นับ statement เพื่อจับการถอยกลับไป lazy load"""
+import pytest
+from fastapi.security import HTTPAuthorizationCredentials
+from httpx import ASGITransport, AsyncClient
+
+def _touch(user, role: str) -> None:
+    """อ่าน field ที่ handler ใช้ (lazy load จะเกิดตรงนี้ถ้า loader options หาย)"""
+    assert user.profile.phone
+    if role == "senior_user":
+        assert user.ability.career
+
+@pytest.mark.parametrize("role", ["user", "senior_user"])
+def test_get_principal_by_id_one_round_trip(role, database, make_user, make_seniors, count_statements):
+    from app.services.user import getPrincipal_by_id
+
+    sub = make_user() if role == "user" else make_seniors(1)[0]
+    with database.session() as session, count_statements(database.engine) as counter:
+        _touch(getPrincipal_by_id(role, sub, session), role)
+    assert len(counter.statements) == 1, counter.statements
+
+@pytest.mark.parametrize("role", ["user", "senior_user"])
+def test_get_current_user_one_round_trip(role, database, make_user, make_seniors, count_statements):
+    from app.utils.deps import get_current_user
+    from app.utils.jwt import create_access_token
+
+    sub = make_user() if role == "user" else make_seniors(1)[0]
+    cred = HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token(sub, {"role": role}))
+    with database.session() as session, count_statements(database.engine) as counter:
+        user, profile, ability = get_current_user(cred, session)
+        assert user.id == sub and profile.phone
+        assert (ability is not None) == (role == "senior_user")
+    assert len(counter.statements) == 1, counter.statements
+
+def test_principal_cache_load_one_round_trip(database, make_seniors, count_statements):
+    from app.services.principal_cache import _load
+
+    sub = make_seniors(1)[0]
+    with count_statements(database.engine) as counter:
+        user, profile, ability = _load("senior_user", sub)
+    assert (user.id, user.role) == (sub, "senior_user")
+    assert profile.phone and ability.career
+    assert len(counter.statements) == 1, counter.statements
+
+@pytest.mark.anyio
+async def test_get_user_route_one_round_trip(database, make_seniors, count_statements):
+    from app.main import app
+    from app.services.principal_cache import Snapshot
+    from app.utils.deps import get_principal
+
+    sub = make_seniors(1)[0]
+    app.dependency_overrides[get_principal] = lambda: (Snapshot({"id": "U00000000", "role": "user"}), None, None)
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            with count_statements(database.engine) as counter:
+                r = await client.get(f"/user/{sub}")
+    finally:
+        app.dependency_overrides.pop(get_principal, None)
+
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["user"]["id"] == sub and body["profile"]["phone"] and body["ability"]["career"] == "ช่างไม้"
+    assert len(counter.statements) == 1, counter.statements
+
+# ---- ไม่ต้องมี Postgres: SQL ที่ loader options สร้าง และ route ที่รันกับ FakeSession ----
+
+def _compiled(stmt) -> str:
+    from sqlalchemy.dialects import postgresql
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+def test_senior_details_compile_to_one_select():
+    import app.main  # noqa: F401  (configure mapper ของทุก model)
+    from sqlalchemy import select
+    from app.database.models.senior_users import SeniorUsers
+    from app.services.user import senior_details
+
+    sql = _compiled(select(SeniorUsers).options(*senior_details()))
+    assert "LEFT OUTER JOIN senior_profiles" in sql
+    assert "LEFT OUTER JOIN senior_abilities" in sql
+    assert "embedding" not in sql and "search_text" not in sql
+
+def test_user_details_compile_to_one_select():
+    import app.main  # noqa: F401
+    from sqlalchemy import select
+    from app.database.models.users import Users
+    from app.services.user import user_details
+
+    assert "LEFT OUTER JOIN user_profiles" in _compiled(select(Users).options(*user_details()))
+
+@pytest.mark.anyio
+async def test_get_user_route_one_statement_without_db():
+    from datetime import datetime, timezone
+
+    from app.database.models.senior_users import SeniorAbilities, SeniorProfiles, SeniorUsers
+    from app.main import app
+    from app.services.principal_cache import Snapshot
+    from app.utils.deps import get_principal, get_read_db
+    from conftest import FakeSession
+
+    senior = SeniorUsers(
+        id="S00000001", displayname="test senior", profile_id="SP0000001", ability_id="SA0000001",
+        created_at=datetime.now(timezone.utc),
+        profile=SeniorProfiles(id="SP0000001", phone="0800000000", first_name="ทดสอบ"),
+        ability=SeniorAbilities(id="SA0000001", career="ช่างไม้", type="home", vehicle=True, offsite_work=True),
+    )
+    session = FakeSession(lambda sql: [senior] if "FROM senior_users" in sql else [])
+
+    def fake_db():
+        yield session
+
+    app.dependency_overrides[get_principal] = lambda: (Snapshot({"id": "U00000000", "role": "user"}), None, None)
+    app.dependency_overrides[get_read_db] = fake_db
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            r = await client.get(f"/user/{senior.id}")
+    finally:
+        app.dependency_overrides.pop(get_principal, None)
+        app.dependency_overrides.pop(get_read_db, None)
+
+    assert r.status_code == 200, r.text
+    assert r.json()["ability"]["career"] == "ช่างไม้"
+    [sql] = session.statements
+    assert "LEFT OUTER JOIN senior_profiles" in sql and "LEFT OUTER JOIN senior_abilities" in sql
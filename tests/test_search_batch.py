@@ -0,0 +1,50 @@
+"""/search/batch อ่าน result cache ของทุกคำค้นใน round trip เดียว และเขียนผลที่ค้นใหม่ใน pipeline เดียว"""
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.services.search import IndexedSenior
+
+LAT, LNG = 13.7563, 100.5018
+
+@pytest.fixture
+def batch_app(fake_redis, monkeypatch):
+    """/search/batch ที่ดึงผู้สมัครจากรายการคงที่ (ไม่ใช้ DB/model) และนับคำค้นที่ต้องค้นจริง"""
+    from app.main import app
+    from app.routes import search_router
+    from app.services.principal_cache import Snapshot
+    from app.utils.deps import get_async_read_db, get_principal
+
+    retrieved = []
+
+    async def retrieve_many(session, queries, lat, lng, range, k, adaptive=False, filters=None):
+        retrieved.append(list(queries))
+        senior = IndexedSenior("S00000001", "SA0000001", "home", "ช่างไม้", None, True, False, None)
+        return [[(senior, 0.9, {"id": senior.senior_id, "lat": LAT, "lng": LNG})] for _ in queries], None
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(search_router, "_retrieve_many", retrieve_many)
+    app.dependency_overrides[get_principal] = lambda: (Snapshot({"id": "U00000000", "role": "user"}), None, None)
+    app.dependency_overrides[get_async_read_db] = no_db
+    yield app, retrieved
+    app.dependency_overrides.pop(get_principal, None)
+    app.dependency_overrides.pop(get_async_read_db, None)
+
+@pytest.mark.anyio
+async def test_batch_cache_round_trips(batch_app, fake_redis):
+    app, retrieved = batch_app
+    payload = {"keywords": ["ช่างไม้", "ช่างประปา", "ทำสวน"], "lat": LAT, "lng": LNG}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        r = await client.post("/search/batch", json=payload)
+        assert r.status_code == 200, r.text
+        assert retrieved == [payload["keywords"]]
+        # HMGET ครั้งเดียว + pipeline (HSET ทุกคำค้น + EXPIRE) ครั้งเดียว
+        assert fake_redis.calls == ["hmget", "hset", "expire"] and fake_redis.round_trips == 2
+
+        fake_redis.reset_counts()
+        r = await client.post("/search/batch", json={**payload, "keywords": ["ช่างไม้", "ทำสวน", "ขับรถ"]})
+        assert r.status_code == 200, r.text
+        assert retrieved[1:] == [["ขับรถ"]]
+        assert fake_redis.calls == ["hmget", "hset", "expire"] and fake_redis.round_trips == 2
+    assert [res["count"] for res in r.json()["results"]] == [1, 1, 1]
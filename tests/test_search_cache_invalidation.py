@@ -0,0 +1,52 @@
+"""presence ที่เปลี่ยน (ออนไลน์/ย้าย/หมดอายุ) ต้องล้าง search cache ของทุก cell ที่ค้นด้วย range ไม่เกิน SEARCH_CACHE_MAX_RANGE_M แล้วเจอ senior"""
+import math
+
+import pytest
+
+from app.database import redis as presence
+from app.database.redis import _search_cell_keys, search_cell_key
+from app.utils.config import SEARCH_CACHE_MAX_RANGE_M, SEARCH_CACHE_PRECISION
+from app.utils.geohash import encode
+
+LAT, LNG = 13.7563, 100.5018
+
+def _offset(lat: float, lng: float, dist_m: float, bearing_deg: float):
+    b = math.radians(bearing_deg)
+    return (lat + dist_m * math.cos(b) / 111_320.0,
+            lng + dist_m * math.sin(b) / (111_320.0 * math.cos(math.radians(lat))))
+
+def _cached_cell(fake_redis, lat: float, lng: float) -> str:
+    """ผลค้นหาที่ cache ไว้ของ cell ที่ (lat, lng) อยู่"""
+    key = search_cell_key(encode(lat, lng, SEARCH_CACHE_PRECISION))
+    fake_redis.hashes[key]["q"] = "{}"
+    return key
+
+@pytest.mark.parametrize("bearing", range(0, 360, 45))
+def test_cell_keys_cover_max_search_range(bearing):
+    searcher = _offset(LAT, LNG, SEARCH_CACHE_MAX_RANGE_M * 0.98, bearing)
+    assert search_cell_key(encode(*searcher, SEARCH_CACHE_PRECISION)) in _search_cell_keys([(LAT, LNG)])
+
+@pytest.mark.anyio
+async def test_heartbeat_move_clears_old_and_new_cells(fake_redis):
+    new = _offset(LAT, LNG, 30_000, 90)
+    await presence.set_presence_and_loc("S00000001", LAT, LNG, 60)
+    near_old = _cached_cell(fake_redis, *_offset(LAT, LNG, SEARCH_CACHE_MAX_RANGE_M * 0.9, 270))
+    near_new = _cached_cell(fake_redis, *_offset(*new, SEARCH_CACHE_MAX_RANGE_M * 0.9, 90))
+    far = _cached_cell(fake_redis, *_offset(LAT, LNG, 100_000, 0))
+
+    assert await presence.set_presence_and_loc("S00000001", *new, 60)
+    assert near_old not in fake_redis.hashes and near_new not in fake_redis.hashes
+    assert far in fake_redis.hashes
+
+@pytest.mark.anyio
+async def test_trim_and_release_clear_cells(fake_redis):
+    fake_redis.mark_online("S00000001", LAT, LNG, ttl=-1)
+    near = _cached_cell(fake_redis, *_offset(LAT, LNG, SEARCH_CACHE_MAX_RANGE_M * 0.9, 180))
+    assert await presence.trim_presence() == 1
+    assert near not in fake_redis.hashes
+
+    token = await presence.claim_presence("S00000002")
+    await presence.set_presence_and_loc("S00000002", LAT, LNG, 60)
+    near = _cached_cell(fake_redis, *_offset(LAT, LNG, SEARCH_CACHE_MAX_RANGE_M * 0.9, 0))
+    assert await presence.release_presence("S00000002", token)
+    assert near not in fake_redis.hashes
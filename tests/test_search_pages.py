@@ -0,0 +1,76 @@
+"""cursor pagination ของ /search: ต่อหลัง (score, id) แบบ strict, cursor ผูกกับคำค้นทั้งชุด และคืน rings ทุกหน้า"""
+import random
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.services import search_pages
+from app.utils.schemas import SearchOut
+
+def _item(sid: str, score: float, distance: float) -> dict:
+    return {"id": sid, "score": score, "distance": distance}
+
+# สามคนแรกคะแนนเท่ากัน (tier บน), สองคนท้ายอยู่ tier ล่างและระยะเท่ากัน
+ITEMS = [_item("S1", 0.8, 900), _item("S2", 0.8, 100), _item("S3", 0.8, 500),
+         _item("S4", 0.3, 700), _item("S5", 0.3, 700), _item("S6", 0.2, 300)]
+
+def _ids(items):
+    return [x["id"] for x in items]
+
+def test_resume_strictly_after_last_score_and_id():
+    items = search_pages.ordered(ITEMS)
+    assert _ids(items) == ["S1", "S2", "S3", "S6", "S4", "S5"]
+    for size in (1, 2, 4):
+        seen, start, state = [], 0, {}
+        while True:
+            chunk, cursor = search_pages.page(items, start, size, state)
+            seen += _ids(chunk)
+            if cursor is None:
+                break
+            state = search_pages.decode_cursor(cursor)
+            # snapshot หมดอายุ: จัดอันดับใหม่ (ลำดับ input ต่างไป) แล้วต่อจาก cursor
+            shuffled = random.Random(size).sample(ITEMS, len(ITEMS))
+            start = search_pages.resume_index(search_pages.ordered(shuffled), state)
+        assert seen == _ids(items)
+
+@pytest.fixture
+def paged_app(fake_redis, monkeypatch):
+    """/search ที่ _search คืนผลคงที่ (ไม่ใช้ DB/model)"""
+    from app.main import app
+    from app.routes import search_router
+    from app.services.principal_cache import Snapshot
+    from app.utils.deps import get_async_read_db, get_principal
+
+    async def search(session, payload, profile):
+        return SearchOut(count=len(ITEMS), list=[dict(x) for x in ITEMS], rings=2)
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(search_router, "_search", search)
+    app.dependency_overrides[get_principal] = lambda: (Snapshot({"id": "U00000000", "role": "user"}), None, None)
+    app.dependency_overrides[get_async_read_db] = no_db
+    yield app
+    app.dependency_overrides.pop(get_principal, None)
+    app.dependency_overrides.pop(get_async_read_db, None)
+
+@pytest.mark.anyio
+async def test_cursor_pages(paged_app, fake_redis):
+    payload = {"keyword": "ช่างไม้", "lat": 13.75, "lng": 100.5, "page_size": 2}
+    async with AsyncClient(transport=ASGITransport(app=paged_app), base_url="http://test") as client:
+        first = (await client.post("/search", json=payload)).json()
+        assert _ids(first["list"]) == ["S1", "S2"] and first["rings"] == 2
+
+        cursor = {**payload, "cursor": first["next_cursor"]}
+        second = (await client.post("/search", json=cursor)).json()
+        assert _ids(second["list"]) == ["S3", "S6"] and second["rings"] == 2
+
+        # snapshot หมดอายุ: จัดอันดับใหม่แล้วต่อหลัง (score, id) ของหน้าก่อน
+        for key in [k for k in fake_redis.kv if k.startswith("search:page:")]:
+            del fake_redis.kv[key]
+        resumed = (await client.post("/search", json=cursor)).json()
+        assert _ids(resumed["list"]) == ["S3", "S6"] and resumed["rings"] == 2
+
+        for changed in ({"lat": 13.80}, {"vehicle": True}, {"range": 5000}, {"keyword": "ช่างประปา"}):
+            r = await client.post("/search", json={**cursor, **changed})
+            assert r.status_code == 400, changed
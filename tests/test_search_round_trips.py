@@ -0,0 +1,111 @@
+"""จำนวน round trip ต่อ /search: presence อ่านจาก Redis ครั้งเดียว และผู้สมัครมาจาก SQL statement เดียว (ไม่มี N+1)"""
+from collections import namedtuple
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.services.search import IndexedSenior
+from conftest import FakeSession, unit_vector
+
+LAT, LNG = 13.7563, 100.5018
+
+# row ของ vector_candidates
+CandidateRow = namedtuple("CandidateRow", IndexedSenior._fields + ("sim",))
+
+@pytest.fixture
+def search_app(fake_redis, monkeypatch):
+    """app ที่ใช้ Redis ปลอม, ไม่ใช้ online index / hybrid / result cache และ embed คำค้นเป็น vector คงที่"""
+    from app.main import app
+    from app.routes import search_router
+    from app.services import search_cache
+    from app.services.principal_cache import Snapshot
+    from app.utils.deps import get_principal
+    from app.utils.embedder import STORE_DIM
+
+    async def embed(texts):
+        return [unit_vector(0, STORE_DIM) for _ in texts]
+
+    monkeypatch.setattr(search_router, "ONLINE_INDEX_ENABLED", False)
+    monkeypatch.setattr(search_router, "HYBRID_SEARCH", False)
+    monkeypatch.setattr(search_router, "cached_embed_many", embed)
+    monkeypatch.setattr(search_cache, "SEARCH_CACHE_TTL_SECONDS", 0)
+    app.dependency_overrides[get_principal] = lambda: (Snapshot({"id": "U00000000", "role": "user"}), None, None)
+    yield app
+    app.dependency_overrides.pop(get_principal, None)
+
+@pytest.mark.anyio
+async def test_search_round_trips(search_app, database, fake_redis, make_seniors, count_statements):
+    seniors = make_seniors(5)
+    for i, sid in enumerate(seniors):
+        fake_redis.mark_online(sid, LAT + i * 0.001, LNG)
+    payload = {"keyword": "ช่างไม้", "lat": LAT, "lng": LNG, "top_k": 10, "range": 5000}
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=search_app), base_url="http://test") as client:
+            # request แรกเปิด connection และให้ dialect initialize ก่อนเริ่มนับ
+            await client.post("/search", json=payload)
+            fake_redis.reset_counts()
+            with count_statements(database.async_engine.sync_engine) as counter:
+                r = await client.post("/search", json=payload)
+    finally:
+        await database.async_engine.dispose()
+
+    assert r.status_code == 200, r.text
+    assert {x["id"] for x in r.json()["list"]} == set(seniors)
+    # GEOSEARCH (พิกัด + ระยะ) + ZMSCORE (presence) ครั้งเดียว ไม่ GET/GEOPOS ต่อคน
+    assert fake_redis.calls == ["geosearch", "zmscore"]
+    assert fake_redis.round_trips == 2
+    # ANN settings (set_config) + candidate query เดียวที่ join senior_users/senior_abilities/senior_ratings
+    candidates = counter.matching("senior_abilities")
+    assert len(candidates) == 1
+    assert len(counter.matching("set_config")) <= 1
+    assert len(counter.statements) == len(candidates) + len(counter.matching("set_config"))
+
+@pytest.mark.anyio
+async def test_search_skips_offline_seniors(search_app, database, fake_redis, make_seniors):
+    online, offline = make_seniors(2)
+    fake_redis.mark_online(online, LAT, LNG)
+    fake_redis.mark_online(offline, LAT, LNG, ttl=-1)
+    payload = {"keyword": "ช่างไม้", "lat": LAT, "lng": LNG, "top_k": 10, "range": 5000}
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=search_app), base_url="http://test") as client:
+            r = await client.post("/search", json=payload)
+    finally:
+        await database.async_engine.dispose()
+
+    assert r.status_code == 200, r.text
+    assert [x["id"] for x in r.json()["list"]] == [online]
+
+@pytest.mark.anyio
+async def test_search_round_trips_without_db(search_app, fake_redis):
+    """รุ่นที่ไม่ต้องมี Postgres: นับ statement ที่ route ส่งผ่าน session (FakeSession) แทน cursor จริง"""
+    from app.utils.deps import get_async_read_db
+
+    seniors = [f"S0000000{i}" for i in range(5)]
+    for i, sid in enumerate(seniors):
+        fake_redis.mark_online(sid, LAT + i * 0.001, LNG)
+    rows = [CandidateRow(sid, f"SA000000{i}", "home", "ช่างไม้", None, True, True, None, 0.9 - i * 0.01)
+            for i, sid in enumerate(seniors)]
+    session = FakeSession(lambda sql: rows if "senior_abilities" in sql else [])
+
+    async def fake_db():
+        yield session
+
+    search_app.dependency_overrides[get_async_read_db] = fake_db
+    payload = {"keyword": "ช่างไม้", "lat": LAT, "lng": LNG, "top_k": 10, "range": 5000}
+    try:
+        async with AsyncClient(transport=ASGITransport(app=search_app), base_url="http://test") as client:
+            r = await client.post("/search", json=payload)
+    finally:
+        search_app.dependency_overrides.pop(get_async_read_db, None)
+
+    assert r.status_code == 200, r.text
+    assert {x["id"] for x in r.json()["list"]} == set(seniors)
+    assert fake_redis.calls == ["geosearch", "zmscore"]
+    assert fake_redis.round_trips == 2
+    # candidate query เดียว: ids ทั้งหมดเป็น array parameter ตัวเดียว ไม่ใช่ statement ต่อคน
+    [candidates] = session.matching("senior_abilities")
+    assert "ANY" in candidates
+    assert len(session.matching("set_config")) <= 1
+    assert len(session.statements) == 1 + len(session.matching("set_config"))